@@ -0,0 +1,172 @@
+"""
+Замер запросов к API: количество SQL-запросов, время в БД и время сериализации ответа.
+Данные копятся в памяти процесса по имени представления и доступны администратору по адресу /metrics/.
+"""
+
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+
+class RequestMetrics:
+    """ Счетчики одного запроса. """
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+
+class MetricsRegistry:
+    """ Накопленные по представлениям счетчики процесса. """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def add(self, view_name, metrics, total_time):
+        with self.lock:
+            stats = self.views.setdefault(
+                view_name,
+                {"requests": 0, "queries": 0, "max_queries": 0, "db_time": 0.0, "render_time": 0.0,
+                 "total_time": 0.0},
+            )
+            stats["requests"] += 1
+            stats["queries"] += metrics.queries
+            stats["max_queries"] = max(stats["max_queries"], metrics.queries)
+            stats["db_time"] += metrics.db_time
+            stats["render_time"] += metrics.render_time
+            stats["total_time"] += total_time
+
+    def report(self):
+        """ Средние значения по представлениям, время в миллисекундах. """
+        with self.lock:
+            return {
+                view_name: {
+                    "requests": stats["requests"],
+                    "avg_queries": round(stats["queries"] / stats["requests"], 2),
+                    "max_queries": stats["max_queries"],
+                    "avg_db_ms": round(stats["db_time"] * 1000 / stats["requests"], 3),
+                    "avg_render_ms": round(stats["render_time"] * 1000 / stats["requests"], 3),
+                    "avg_total_ms": round(stats["total_time"] * 1000 / stats["requests"], 3),
+                }
+                for view_name, stats in self.views.items()
+            }
+
+    def clear(self):
+        with self.lock:
+            self.views.clear()
+
+
+registry = MetricsRegistry()
+
+
+# Счетчики текущего запроса. Контекст передается и в потоки, где async-представления выполняют запросы к БД
+current_metrics = ContextVar("current_metrics", default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    """ execute_wrapper соединения: запрос учитывается в счетчиках текущего запроса к API, если они есть. """
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def install_query_counter(connection):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+@receiver(connection_created)
+def install_query_counter_on_connect(sender, connection, **kwargs):
+    # Под ASGI у каждого запроса свой поток для работы с БД и свое соединение
+    install_query_counter(connection)
+
+
+class QueryMetricsMiddleware:
+    """
+    Замер каждого запроса к API. Запросы к БД считаются через execute_wrapper, поэтому замер работает
+    и без DEBUG. В режиме DEBUG результаты добавляются в заголовки ответа X-DB-Queries, X-DB-Time
+    и X-Serialization-Time (время в миллисекундах).
+    Middleware работает и синхронно, и асинхронно, поэтому не переводит async-представления в поток.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        install_query_counter(connections["default"])
+        metrics, token, start = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics, start)
+
+    async def __acall__(self, request):
+        metrics, token, start = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics, start)
+
+    def start(self, request):
+        metrics = RequestMetrics()
+        request.metrics = metrics
+        return metrics, current_metrics.set(metrics), time.perf_counter()
+
+    def finish(self, request, response, metrics, start):
+        total_time = time.perf_counter() - start
+        if request.resolver_match:
+            registry.add(request.resolver_match.view_name, metrics, total_time)
+        if settings.DEBUG:
+            response["X-DB-Queries"] = metrics.queries
+            response["X-DB-Time"] = f"{metrics.db_time * 1000:.3f}"
+            response["X-Serialization-Time"] = f"{metrics.render_time * 1000:.3f}"
+        return response
+
+    def process_template_response(self, request, response):
+        """ Ответы DRF рендерятся после представления, время рендеринга замеряется отдельно. """
+        start = time.perf_counter()
+
+        def finish(rendered):
+            request.metrics.render_time += time.perf_counter() - start
+
+        response.add_post_render_callback(finish)
+        return response
+
+
+class MetricsAPIView(APIView):
+    """ Накопленные метрики запросов процесса по представлениям. Доступно только администраторам. """
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(registry.report())
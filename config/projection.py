@@ -0,0 +1,86 @@
+"""
+Выбор полей ответа параметрами запроса: ?fields=id,action - только перечисленные поля,
+?exclude=place,reward - все поля, кроме перечисленных. Из БД читаются только колонки выбранных полей.
+"""
+
+from functools import cached_property
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import ListSerializer
+
+
+def parse_field_names(value):
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+class SparseFieldsMixin:
+    """
+    Миксин представлений чтения. Лишние поля удаляются из сериализатора, а запрос к БД ограничивается
+    через .only() колонками выбранных полей и полей из projection_fields, нужных самому представлению,
+    например для проверки прав. Связи многие-ко-многим предзагружаются, только если их поле выбрано.
+    """
+
+    fields_param = "fields"
+    exclude_param = "exclude"
+    projection_fields = ()
+
+    @cached_property
+    def selected_fields(self):
+        """ Имена выбранных полей в порядке полей сериализатора или None, если выбор полей не задан. """
+        params = self.request.GET
+        if self.fields_param not in params and self.exclude_param not in params:
+            return None
+
+        available = [name for name, field in self.get_serializer_class()().fields.items() if not field.write_only]
+        fields = parse_field_names(params.get(self.fields_param, "")) or available
+        exclude = parse_field_names(params.get(self.exclude_param, ""))
+
+        errors = {}
+        for param, names in ((self.fields_param, fields), (self.exclude_param, exclude)):
+            unknown = [name for name in names if name not in available]
+            if unknown:
+                errors[param] = [f"Неизвестные поля: {', '.join(unknown)}."]
+        if errors:
+            raise ValidationError(errors)
+
+        selected = [name for name in available if name in fields and name not in exclude]
+        if not selected:
+            raise ValidationError({self.fields_param: ["Не выбрано ни одного поля."]})
+        return selected
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.selected_fields is None:
+            return queryset
+        return self.project_queryset(queryset)
+
+    def project_queryset(self, queryset):
+        """ Только колонки выбранных полей. Поля, не связанные с полем модели, отключают ограничение колонок. """
+        opts = queryset.model._meta
+        serializer_fields = self.get_serializer_class()().fields
+        columns = [opts.pk.name, *self.projection_fields]
+        relations = set()
+        for name in self.selected_fields:
+            try:
+                model_field = opts.get_field(serializer_fields[name].source)
+            except FieldDoesNotExist:
+                return queryset
+            if model_field.many_to_many or model_field.one_to_many:
+                relations.add(model_field.name)
+            else:
+                columns.append(model_field.name)
+
+        prefetches = [
+            lookup for lookup in queryset._prefetch_related_lookups
+            if getattr(lookup, "prefetch_to", lookup).split("__")[0] in relations
+        ]
+        return queryset.only(*columns).prefetch_related(None).prefetch_related(*prefetches)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if self.selected_fields is not None:
+            fields = serializer.child.fields if isinstance(serializer, ListSerializer) else serializer.fields
+            for name in set(fields) - set(self.selected_fields):
+                fields.pop(name)
+        return serializer
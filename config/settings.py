@@ -2,6 +2,7 @@ import os
 from datetime import timedelta
 from pathlib import Path
 
+from celery.schedules import crontab
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -32,6 +33,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "config.metrics.QueryMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -64,7 +66,7 @@ WSGI_APPLICATION = "config.wsgi.application"
 REST_FRAMEWORK = {
     "DEFAULT_FILTER_BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"],
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "users.authentication.CachedJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
@@ -82,6 +84,23 @@ DATABASES = {
     }
 }
 
+CACHE_URL = os.getenv("CACHE_URL")
+
+CACHES = {
+    "default": {
+        "BACKEND": (
+            "django.core.cache.backends.redis.RedisCache"
+            if CACHE_URL
+            else "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": CACHE_URL or "habit-tracker",
+    }
+}
+
+PUBLIC_HABITS_CACHE_TIMEOUT = int(os.getenv("PUBLIC_HABITS_CACHE_TIMEOUT") or 60)
+
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv("AUTH_USER_CACHE_TIMEOUT") or 60)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -123,8 +142,51 @@ CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND")
 
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
 
+CELERY_BEAT_SCHEDULE = {
+    "dispatch-due-reminders": {
+        "task": "habits.tasks.dispatch_due_reminders",
+        "schedule": crontab(minute="*"),
+    },
+    "send-due-reminders": {
+        "task": "habits.tasks.send_due_reminders",
+        "schedule": float(os.getenv("REMINDER_DELIVERY_INTERVAL") or 5),
+    },
+    "purge-reminder-deliveries": {
+        "task": "habits.tasks.purge_reminder_deliveries",
+        "schedule": crontab(minute="30", hour="3"),
+    },
+    "process-telegram-updates": {
+        "task": "habits.tasks.process_telegram_updates",
+        "schedule": float(os.getenv("TELEGRAM_UPDATES_INTERVAL") or 1),
+    },
+}
+
+REMINDER_CHUNK_SIZE = int(os.getenv("REMINDER_CHUNK_SIZE") or 500)
+# Окно в секундах, по которому расходятся напоминания разных пользователей с одинаковым расписанием
+REMINDER_JITTER_WINDOW = int(os.getenv("REMINDER_JITTER_WINDOW") or 600)
+# Ограничение частоты отправки напоминаний: в среднем в секунду и разом
+REMINDER_SEND_RATE = float(os.getenv("REMINDER_SEND_RATE") or 30)
+REMINDER_SEND_BURST = int(os.getenv("REMINDER_SEND_BURST") or REMINDER_CHUNK_SIZE)
+# Отставание рассылки в секундах, после которого в лог пишется предупреждение
+REMINDER_LAG_WARNING = int(os.getenv("REMINDER_LAG_WARNING") or 600)
+# Очередь отправки напоминаний: размер пачки, срок аренды захваченного напоминания в секундах,
+# количество попыток, пауза перед второй попыткой в секундах и срок хранения обработанных напоминаний в днях
+REMINDER_DELIVERY_BATCH_SIZE = int(os.getenv("REMINDER_DELIVERY_BATCH_SIZE") or 500)
+REMINDER_DELIVERY_LEASE = int(os.getenv("REMINDER_DELIVERY_LEASE") or 300)
+REMINDER_DELIVERY_MAX_ATTEMPTS = int(os.getenv("REMINDER_DELIVERY_MAX_ATTEMPTS") or 5)
+REMINDER_DELIVERY_BACKOFF = float(os.getenv("REMINDER_DELIVERY_BACKOFF") or 60)
+REMINDER_DELIVERY_RETENTION = int(os.getenv("REMINDER_DELIVERY_RETENTION") or 7)
+
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_URL = "https://api.telegram.org/bot"
+TELEGRAM_TIMEOUT = float(os.getenv("TELEGRAM_TIMEOUT") or 10)
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES") or 3)
+TELEGRAM_BACKOFF = float(os.getenv("TELEGRAM_BACKOFF") or 0.5)
+TELEGRAM_RATE_LIMIT = float(os.getenv("TELEGRAM_RATE_LIMIT") or 30)
+TELEGRAM_CHAT_RATE_LIMIT = float(os.getenv("TELEGRAM_CHAT_RATE_LIMIT") or 1)
+TELEGRAM_CONCURRENCY = int(os.getenv("TELEGRAM_CONCURRENCY") or 50)
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET") or ""
+TELEGRAM_UPDATES_BATCH_SIZE = int(os.getenv("TELEGRAM_UPDATES_BATCH_SIZE") or 500)
 
 CORS_ALLOWED_ORIGINS = [
     "http://127.0.0.1:8000",
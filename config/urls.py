@@ -4,6 +4,8 @@ from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 from rest_framework import permissions
 
+from config.metrics import MetricsAPIView
+
 schema_view = get_schema_view(
     openapi.Info(
         title="Materials API",
@@ -25,4 +27,5 @@ urlpatterns = [
         name="schema-swagger-ui",
     ),
     path("redoc/", schema_view.with_ui("redoc", cache_timeout=0), name="schema-redoc"),
+    path("metrics/", MetricsAPIView.as_view(), name="metrics"),
 ]
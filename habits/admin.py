@@ -1,9 +1,36 @@
 from django.contrib import admin
 
-from habits.models import Habit
+from habits.models import Habit, HabitCompletion, HabitStats, ReminderDelivery
+from habits.services import reschedule_habit, schedule_habit
 
 
 @admin.register(Habit)
 class HabitAdmin(admin.ModelAdmin):
+    readonly_fields = ("next_reminder_at",)
+
     class Meta:
         list_filter = ("id", "action")
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            schedule_habit(obj)
+        super().save_model(request, obj, form, change)
+        if change:
+            reschedule_habit(obj, form.changed_data)
+
+
+@admin.register(HabitCompletion)
+class HabitCompletionAdmin(admin.ModelAdmin):
+    list_display = ("habit", "user", "date", "status")
+    list_filter = ("status", "date")
+
+
+@admin.register(HabitStats)
+class HabitStatsAdmin(admin.ModelAdmin):
+    list_display = ("habit", "current_streak", "longest_streak", "total_done", "last_date")
+
+
+@admin.register(ReminderDelivery)
+class ReminderDeliveryAdmin(admin.ModelAdmin):
+    list_display = ("habit", "slot", "status", "attempts", "available_at", "sent_at")
+    list_filter = ("status",)
@@ -0,0 +1,105 @@
+import operator
+from datetime import timedelta
+from functools import reduce
+
+from django.db.models import Case, Count, IntegerField, Max, Q, Sum, Value, When
+from django.db.models.functions import ExtractIsoWeekDay
+from django.utils import timezone
+
+from habits.models import Habit, HabitStats, UserDailyStats
+from habits.services import REMINDER_SCHEDULES
+
+# Границы групп распределения текущих серий: (наименьшая длина серии, название группы)
+STREAK_BUCKETS = ((30, "30+"), (14, "14-29"), (7, "7-13"), (3, "3-6"), (1, "1-2"))
+
+# Количество дней в ряду выполнений по дням
+DAILY_SERIES_DAYS = 30
+
+
+def get_alive_streaks(today):
+    """ Условие непрерванной серии: с последнего выполнения прошло не больше периода привычки. """
+    periodicities = {}
+    for periodicity, schedule in REMINDER_SCHEDULES.items():
+        periodicities.setdefault(schedule.period_days, []).append(periodicity)
+
+    return reduce(operator.or_, (
+        Q(habit__periodicity__in=names, last_done_date__gte=today - timedelta(days=period_days))
+        for period_days, names in periodicities.items()
+    ))
+
+
+def get_habits_summary(habits, now):
+    """ Количество привычек и запланированных напоминаний, одним запросом. """
+    return habits.aggregate(
+        total=Count("id"),
+        active=Count("id", filter=Q(is_active=True)),
+        public=Count("id", filter=Q(is_public=True)),
+        scheduled=Count("id", filter=Q(is_active=True, next_reminder_at__isnull=False)),
+        due_24h=Count("id", filter=Q(is_active=True, next_reminder_at__lt=now + timedelta(days=1))),
+    )
+
+
+def get_streak_distribution(stats, today):
+    """ Распределение текущих серий по группам длины и самая длинная серия. """
+    alive = get_alive_streaks(today)
+    bucket = Case(
+        *(When(alive & Q(current_streak__gte=low), then=Value(name)) for low, name in STREAK_BUCKETS),
+        default=Value("0"),
+    )
+    distribution = {name: 0 for _, name in reversed(STREAK_BUCKETS)}
+    distribution["0"] = 0
+    for row in stats.annotate(bucket=bucket).values("bucket").annotate(count=Count("pk")).order_by():
+        distribution[row["bucket"]] = row["count"]
+    return {"distribution": distribution, **stats.aggregate(longest=Max("longest_streak"))}
+
+
+def get_completion_summary(days, today):
+    """ Отметки по дням: всего, по дням недели и за последние DAILY_SERIES_DAYS дней. """
+    totals = days.aggregate(done=Sum("done", default=0), skipped=Sum("skipped", default=0))
+
+    weekdays = {weekday: {"done": 0, "skipped": 0} for weekday in range(1, 8)}
+    heatmap = (
+        days.annotate(weekday=ExtractIsoWeekDay("date", output_field=IntegerField()))
+        .values("weekday")
+        .annotate(done=Sum("done"), skipped=Sum("skipped"))
+        .order_by()
+    )
+    for row in heatmap:
+        weekdays[row["weekday"]] = {"done": row["done"], "skipped": row["skipped"]}
+
+    start = today - timedelta(days=DAILY_SERIES_DAYS - 1)
+    series = {start + timedelta(days=offset): 0 for offset in range(DAILY_SERIES_DAYS)}
+    recent = days.filter(date__gte=start, date__lte=today).values("date").annotate(total=Sum("done")).order_by()
+    for row in recent:
+        series[row["date"]] = row["total"]
+
+    return {
+        **totals,
+        "weekdays": weekdays,
+        "daily": [{"date": day, "done": done} for day, done in series.items()],
+    }
+
+
+def get_user_stats(user=None):
+    """
+    Сводная статистика привычек пользователя или, если пользователь не указан, всех пользователей.
+    Все показатели считаются агрегацией в БД: отметки берутся из статистики по дням, а не из журнала отметок,
+    поэтому за два года истории читается не больше 730 строк на пользователя.
+    """
+    now = timezone.now()
+    today = timezone.localdate()
+    habits = Habit.objects.all()
+    stats = HabitStats.objects.all()
+    days = UserDailyStats.objects.all()
+    if user is not None:
+        habits = habits.filter(owner=user)
+        stats = stats.filter(habit__owner=user)
+        days = days.filter(user=user)
+
+    periodicity = habits.values("periodicity").annotate(count=Count("id")).order_by()
+    return {
+        "habits": get_habits_summary(habits, now),
+        "periodicity": {row["periodicity"]: row["count"] for row in periodicity},
+        "completions": get_completion_summary(days, today),
+        "streaks": get_streak_distribution(stats, today),
+    }
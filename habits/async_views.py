@@ -0,0 +1,180 @@
+"""
+Async-представления привычек для ASGI-сервера. Стек DRF синхронный, поэтому эти представления
+построены на асинхронных представлениях Django и асинхронном ORM: пока запрос ждет БД, кеш или клиента,
+цикл событий обслуживает другие запросы. Ответы совпадают по формату с синхронными представлениями.
+"""
+
+import json
+from math import ceil
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import JsonResponse
+from django.utils.crypto import constant_time_compare
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException, NotAuthenticated, NotFound, ParseError, PermissionDenied
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from habits.bot import write_update
+from habits.models import Habit
+from habits.paginators import CustomPaginator
+from habits.serializers import HabitSerializer, habit_rows
+from habits.services import schedule_habit
+from users.authentication import CachedJWTAuthentication
+
+
+def get_json(request):
+    try:
+        return json.loads(request.body or b"{}")
+    except ValueError:
+        raise ParseError()
+
+
+class AsyncAPIView(View):
+    """ Основа async-представлений: авторизация по JWT и ошибки в формате DRF. """
+
+    authentication = CachedJWTAuthentication()
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Авторизация только по токену, без сессии, поэтому проверка CSRF не нужна, как и в DRF
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            await self.authenticate(request)
+            return await super().dispatch(request, *args, **kwargs)
+        except APIException as error:
+            return self.get_error_response(request, error)
+
+    async def authenticate(self, request):
+        result = await self.authentication.aauthenticate(request)
+        request.user = result[0] if result else AnonymousUser()
+        if not request.user.is_authenticated:
+            raise NotAuthenticated()
+
+    def get_error_response(self, request, error):
+        data = error.detail if isinstance(error.detail, (list, dict)) else {"detail": error.detail}
+        response = get_json_response(data, status=error.status_code)
+        if error.status_code == 401:
+            response["WWW-Authenticate"] = self.authentication.authenticate_header(request)
+        return response
+
+
+def get_json_response(data, status=200):
+    return JsonResponse(data, status=status, safe=False, json_dumps_params={"ensure_ascii": False})
+
+
+async def paginate(request, queryset):
+    """ Страница привычек в формате CustomPaginator: count, next, previous и строки results. """
+    try:
+        page_size = int(request.GET[CustomPaginator.page_size_query_param])
+    except (KeyError, ValueError):
+        page_size = CustomPaginator.page_size
+    if page_size <= 0:
+        page_size = CustomPaginator.page_size
+    page_size = min(page_size, CustomPaginator.max_page_size)
+
+    count = await queryset.acount()
+    pages = max(ceil(count / page_size), 1)
+    page = request.GET.get(CustomPaginator.page_query_param, 1)
+    try:
+        page = pages if page in CustomPaginator.last_page_strings else int(page)
+    except ValueError:
+        raise NotFound(CustomPaginator.invalid_page_message)
+    if not 1 <= page <= pages:
+        raise NotFound(CustomPaginator.invalid_page_message)
+
+    if not queryset.ordered:
+        queryset = queryset.order_by("id")
+    offset = (page - 1) * page_size
+    rows = [row async for row in queryset.values(*habit_rows.fields)[offset:offset + page_size]]
+
+    url = request.build_absolute_uri()
+    param = CustomPaginator.page_query_param
+    return {
+        "count": count,
+        "next": replace_query_param(url, param, page + 1) if page < pages else None,
+        "previous": (
+            None if page == 1 else
+            remove_query_param(url, param) if page == 2 else
+            replace_query_param(url, param, page - 1)
+        ),
+        "results": habit_rows.to_representation(rows),
+    }
+
+
+class HabitListAsyncView(AsyncAPIView):
+    """
+    Async-вариант списка личных привычек: привычки текущего пользователя, для модератора и суперпользователя -
+    все привычки. Пагинация по номеру страницы, по 5 привычек на странице.
+    """
+
+    async def get(self, request):
+        user = request.user
+        if user.is_superuser or user.is_staff:
+            habits = Habit.objects.all()
+        else:
+            habits = Habit.objects.filter(owner=user, is_active=True)
+        return get_json_response(await paginate(request, habits))
+
+
+class HabitDetailAsyncView(AsyncAPIView):
+    """ Async-вариант просмотра привычки. Доступ - как в HabitRetrieveAPIView. """
+
+    async def get(self, request, pk):
+        try:
+            habit = await Habit.objects.values(*habit_rows.fields).aget(pk=pk)
+        except Habit.DoesNotExist:
+            raise NotFound()
+
+        user = request.user
+        if not (habit["is_public"] or habit["owner"] == user.id or user.is_staff or user.is_superuser):
+            raise PermissionDenied("У Вас нет прав просматривать информацию об этой привычке.")
+        return get_json_response(habit_rows.to_representation([habit])[0])
+
+
+def create_habit(request, data):
+    """ Проверка и сохранение привычки так же, как в HabitCreateAPIView. """
+    serializer = HabitSerializer(data=data, context={"request": request})
+    serializer.is_valid(raise_exception=True)
+    next_reminder_at = schedule_habit(Habit(owner=request.user, **serializer.validated_data))
+    serializer.save(owner=request.user, next_reminder_at=next_reminder_at)
+    return serializer.data
+
+
+class HabitCreateAsyncView(AsyncAPIView):
+    """
+    Async-вариант создания привычки. Проверка сериализатором обращается к БД синхронно,
+    поэтому выполняется в потоке, а цикл событий в это время обслуживает другие запросы.
+    """
+
+    async def post(self, request):
+        data = await sync_to_async(create_habit)(request, get_json(request))
+        return get_json_response(data, status=201)
+
+
+class TelegramWebhookView(AsyncAPIView):
+    """
+    Прием обновлений Telegram Bot API. Telegram передает секрет TELEGRAM_WEBHOOK_SECRET в заголовке
+    X-Telegram-Bot-Api-Secret-Token. Обновление подтверждается сразу после записи в очередь, обновления
+    одновременных запросов записываются вместе. Разбор и ответы бота - в периодической задаче
+    process_telegram_updates.
+    """
+
+    async def authenticate(self, request):
+        secret = settings.TELEGRAM_WEBHOOK_SECRET
+        if not secret or not constant_time_compare(
+            request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), secret
+        ):
+            raise PermissionDenied()
+
+    async def post(self, request):
+        update = get_json(request)
+        update_id = update.get("update_id") if isinstance(update, dict) else None
+        if not isinstance(update_id, int) or isinstance(update_id, bool):
+            raise ParseError("Обновление без update_id.")
+        await write_update(update)
+        return get_json_response({})
@@ -0,0 +1,867 @@
+"""
+Сценарии нагрузочного тестирования. Запуск: python manage.py benchmark <сценарий> --sizes 10000 100000.
+Данные создаются внутри транзакции, которая откатывается после замера. Сценарии, данные которых должны
+видеть другие соединения (outbox, asgi), фиксируют их и удаляют после замера.
+"""
+
+import asyncio
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from unittest.mock import patch
+from datetime import date, datetime, timedelta
+from urllib.parse import parse_qs, urlsplit
+from zoneinfo import ZoneInfo
+
+import httpx
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection, transaction
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from habits.bitmaps import load_history, set_day
+from habits.bot import get_link_token, process_update_queue
+from habits.dispatch import DISPATCH_INTERVAL, SendRateLimiter, dispatch_reminders, get_due_habits, get_reminder_slot
+from habits.fixtures import FakeTelegramServer
+from habits.imports import HabitImporter, read_ndjson
+from habits.models import (
+    Habit,
+    HabitCompletion,
+    HabitStats,
+    HabitYear,
+    ReminderDelivery,
+    TelegramUpdate,
+    UserDailyStats,
+)
+from habits.outbox import drain_deliveries, write_deliveries
+from habits.paginators import CustomCursorPaginator
+from habits.serializers import HabitSerializer, habit_rows
+from habits.services import schedule_habits
+from habits.streaks import record_completion
+from habits.telegram import SendResult, send_messages
+from habits.views import HabitListAPIView, PublicHabitListAPIView
+from rest_framework.pagination import Cursor
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+from users.authentication import CachedJWTAuthentication
+from users.models import User
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """ Регистрация сценария под именем name. """
+
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+
+    return decorator
+
+
+@contextmanager
+def rollback():
+    """ Транзакция, изменения в которой отменяются после выхода из блока. """
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+@contextmanager
+def timer():
+    """ Замер времени выполнения блока в секундах. """
+    result = {}
+    start = time.perf_counter()
+    yield result
+    result["seconds"] = time.perf_counter() - start
+
+
+def create_habits(count, batch_size=5000, **fields):
+    """ Быстрое создание count привычек тестового пользователя. """
+    owner = User.objects.create(
+        email=f"benchmark_{time.monotonic_ns()}@mail.ru", telegram_chat_id=str(time.monotonic_ns())
+    )
+    fields.setdefault("action", "Выпить стакан воды")
+    Habit.objects.bulk_create(
+        (Habit(owner=owner, **fields) for _ in range(count)), batch_size=batch_size
+    )
+    return owner
+
+
+@benchmark("dispatch")
+def dispatch_benchmark(sizes, stdout):
+    """ Скорость отбора наступивших напоминаний, раскладки их по пачкам и переноса на следующий раз. """
+    slot = get_reminder_slot(
+        timezone.make_aware(datetime(2025, 7, 14, 8, 0))
+    )
+    for size in sizes:
+        with rollback():
+            create_habits(size, periodicity=Habit.EVERY_DAY, next_reminder_at=slot)
+            chunks = []
+            with timer() as elapsed:
+                dispatched = dispatch_reminders(slot, lambda rows, delay: chunks.append(rows))
+            stdout.write(
+                f"{size} привычек: {dispatched} напоминаний в {len(chunks)} пачках за "
+                f"{elapsed['seconds']:.3f} с, {dispatched / elapsed['seconds']:.0f} напоминаний/с"
+            )
+
+
+@benchmark("telegram")
+def telegram_benchmark(sizes, stdout, latency=0.02):
+    """
+    Отправка напоминаний на локальный сервер-заглушку Telegram с задержкой ответа latency:
+    новое соединение на каждое сообщение и конкурентная асинхронная отправка через общий пул соединений.
+    """
+    with FakeTelegramServer(delay=latency) as server:
+        for size in sizes:
+            messages = [(str(chat_id), "Сегодня нужно выпить стакан воды.") for chat_id in range(size)]
+
+            with timer() as elapsed:
+                for chat_id, text in messages:
+                    httpx.post(f"{server.url}/sendMessage", json={"chat_id": chat_id, "text": text})
+            stdout.write(f"{size} сообщений, новое соединение: {size / elapsed['seconds']:.0f} сообщений/с")
+
+            with timer() as elapsed:
+                send_messages(messages, base_url=server.url, rate=100_000)
+            stdout.write(f"{size} сообщений, асинхронно: {size / elapsed['seconds']:.0f} сообщений/с")
+
+
+@benchmark("create")
+def create_benchmark(sizes, stdout):
+    """ Пропускная способность POST /habits/create/ и количество SQL-запросов на одну привычку. """
+    periodicities = [periodicity for periodicity, _ in Habit.PERIODICITY_IN_CHOICES]
+    url = reverse("habits:habit_create")
+
+    for size in sizes:
+        with rollback():
+            client = APIClient()
+            client.force_authenticate(create_habits(0))
+            with CaptureQueriesContext(connection) as queries, timer() as elapsed:
+                for number in range(size):
+                    response = client.post(
+                        url,
+                        {"action": "Убрать комнату", "periodicity": periodicities[number % len(periodicities)]},
+                        format="json",
+                    )
+                    assert response.status_code == 201, response.content
+            stdout.write(
+                f"{size} привычек: {size / elapsed['seconds']:.0f} запросов/с, "
+                f"{len(queries) / size:.1f} SQL-запросов на привычку"
+            )
+
+
+@benchmark("bulk_create")
+def bulk_create_benchmark(sizes, stdout, batch=50):
+    """ Скорость создания привычек: по одной через /habits/create/ и пачками через /habits/bulk/create/. """
+    periodicities = [periodicity for periodicity, _ in Habit.PERIODICITY_IN_CHOICES]
+    items = [
+        {"action": "Убрать комнату", "periodicity": periodicities[number % len(periodicities)]}
+        for number in range(batch)
+    ]
+
+    for size in sizes:
+        rates = {}
+        for name, url, requests in (
+            ("по одной", reverse("habits:habit_create"), [[item] for item in items] * (size // batch)),
+            ("пачками", reverse("habits:habits_bulk_create"), [items] * (size // batch)),
+        ):
+            with rollback():
+                client = APIClient()
+                client.force_authenticate(create_habits(0))
+                with timer() as elapsed:
+                    for data in requests:
+                        response = client.post(url, data if len(data) > 1 else data[0], format="json")
+                        assert response.status_code == 201, response.content
+                rates[name] = size // batch * batch / elapsed["seconds"]
+        stdout.write(
+            f"{size} привычек: по одной {rates['по одной']:.0f} привычек/с, пачками по {batch} "
+            f"{rates['пачками']:.0f} привычек/с ({rates['пачками'] / rates['по одной']:.1f}x)"
+        )
+
+
+def get_latencies(func, repeat):
+    """ Время выполнения func в миллисекундах для repeat запусков. """
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+@benchmark("public_feed")
+def public_feed_benchmark(sizes, stdout, repeat=1000):
+    """ Задержка ленты публичных привычек без кеша, из кеша и с ответом 304 (p50 и p99, мс). """
+    view = PublicHabitListAPIView.as_view()
+    factory = RequestFactory()
+
+    for size in sizes:
+        with rollback():
+            create_habits(size, is_public=True)
+            etag = view(factory.get("/habits/public/", {"page": 2})).render()["ETag"]
+
+            def miss():
+                cache.clear()
+                view(factory.get("/habits/public/", {"page": 2})).render()
+
+            def hit():
+                view(factory.get("/habits/public/", {"page": 2})).render()
+
+            def not_modified():
+                view(factory.get("/habits/public/", {"page": 2}, HTTP_IF_NONE_MATCH=etag)).render()
+
+            for name, func in (("без кеша", miss), ("из кеша", hit), ("304", not_modified)):
+                latencies = get_latencies(func, repeat)
+                stdout.write(
+                    f"{size} привычек, {name}: p50 {statistics.median(latencies):.3f} мс, "
+                    f"p99 {statistics.quantiles(latencies, n=100)[98]:.3f} мс"
+                )
+
+
+@benchmark("pagination")
+def pagination_benchmark(sizes, stdout, repeat=20):
+    """ Задержка глубокой страницы ленты публичных привычек: по номеру страницы и по курсору (p50 и p99, мс). """
+    view = PublicHabitListAPIView.as_view()
+    factory = RequestFactory()
+    page_size = CustomCursorPaginator.page_size
+
+    for size in sizes:
+        with rollback():
+            create_habits(size, is_public=True)
+            page = size // page_size - 1
+            position = Habit.objects.order_by("id").values_list("id", flat=True)[(page - 1) * page_size - 1]
+
+            paginator = CustomCursorPaginator()
+            paginator.base_url = "/habits/public/"
+            url = paginator.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+            cursor = parse_qs(urlsplit(url).query)["cursor"][0]
+
+            def by_number():
+                cache.clear()
+                assert view(factory.get("/habits/public/", {"page": page})).render().status_code == 200
+
+            def by_cursor():
+                cache.clear()
+                assert view(factory.get("/habits/public/", {"cursor": cursor})).render().status_code == 200
+
+            for name, func in (("по номеру страницы", by_number), ("по курсору", by_cursor)):
+                latencies = get_latencies(func, repeat)
+                stdout.write(
+                    f"{size} привычек, страница {page}, {name}: p50 {statistics.median(latencies):.3f} мс, "
+                    f"p99 {statistics.quantiles(latencies, n=100)[98]:.3f} мс"
+                )
+
+
+@benchmark("queries")
+def queries_benchmark(sizes, stdout):
+    """ Планы и время выполнения основных запросов к привычкам по EXPLAIN ANALYZE. """
+    for size in sizes:
+        with rollback():
+            owner = create_habits(size)
+            create_habits(size // 10, is_public=True)
+            due = timezone.now() + timedelta(days=30)
+            queries = {
+                "список пользователя": Habit.objects.filter(owner=owner, is_active=True).order_by("id")[:5],
+                "лента публичных": Habit.objects.filter(is_public=True).order_by("id")[:5],
+                "количество публичных": Habit.objects.filter(is_public=True).values_list("id"),
+                "наступившие напоминания": get_due_habits(due).order_by("next_reminder_at", "id")[:500],
+            }
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE habits_habit")
+
+            for name, queryset in queries.items():
+                plan = queryset.explain(analyze=True)
+                stdout.write(f"{size} привычек, {name}:\n{plan}\n")
+
+
+@benchmark("completion")
+def completion_benchmark(sizes, stdout, days=365):
+    """
+    Скорость записи отметок о выполнении: size отметок по size // days привычкам за days дней.
+    Для сравнения - расчет серии и доли выполнений по полной истории одной привычки.
+    """
+    start = timezone.localdate() - timedelta(days=days)
+    for size in sizes:
+        with rollback():
+            owner = create_habits(max(size // days, 1))
+            habits = list(Habit.objects.filter(owner=owner))
+            with timer() as elapsed:
+                for day in range(days):
+                    for habit in habits:
+                        record_completion(habit, start + timedelta(days=day), user=owner)
+            events = len(habits) * days
+            rate = events / elapsed["seconds"]
+            stdout.write(
+                f"{events} отметок: {elapsed['seconds']:.2f} с, {rate:.0f} отметок/с, "
+                f"{rate * 86400 / 1e6:.1f} млн в сутки"
+            )
+
+            with timer() as rescan:
+                dates = list(
+                    HabitCompletion.objects.filter(habit=habits[0], status=HabitCompletion.DONE)
+                    .order_by("date").values_list("date", flat=True)
+                )
+                streak = longest = 0
+                for previous, current in zip([None] + dates, dates):
+                    streak = streak + 1 if previous and (current - previous).days == 1 else 1
+                    longest = max(longest, streak)
+            with timer() as read:
+                habits[0].stats.refresh_from_db()
+            stdout.write(
+                f"серия по истории {days} дней: {rescan['seconds'] * 1000:.3f} мс, "
+                f"из статистики: {read['seconds'] * 1000:.3f} мс"
+            )
+
+
+@benchmark("stats")
+def stats_benchmark(sizes, stdout, days=730, repeat=50):
+    """
+    Задержка статистики пользователя с size привычками и историей отметок за days дней (p50 и p99, мс).
+    Журнал отметок заполняется целиком, статистика по дням и по привычкам - так, как ее ведет record_completion.
+    """
+    client = APIClient()
+    today = timezone.localdate()
+
+    for size in sizes:
+        with rollback():
+            owner = create_habits(size)
+            habits = list(Habit.objects.filter(owner=owner).values_list("id", flat=True))
+            for day in range(days):
+                HabitCompletion.objects.bulk_create(
+                    HabitCompletion(habit_id=habit_id, user=owner, date=today - timedelta(days=day))
+                    for habit_id in habits
+                )
+            UserDailyStats.objects.bulk_create(
+                UserDailyStats(user=owner, date=today - timedelta(days=day), done=size) for day in range(days)
+            )
+            HabitStats.objects.bulk_create(
+                HabitStats(
+                    habit_id=habit_id, current_streak=days, longest_streak=days, total_done=days,
+                    last_date=today, last_done_date=today,
+                )
+                for habit_id in habits
+            )
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+            client.force_authenticate(user=owner)
+            url = reverse("habits:habits_stats")
+            latencies = get_latencies(lambda: client.get(url), repeat)
+            stdout.write(
+                f"{size} привычек x {days} дней: p50 {statistics.median(latencies):.3f} мс, "
+                f"p99 {statistics.quantiles(latencies, n=100)[98]:.3f} мс"
+            )
+
+
+@benchmark("bitmap")
+def bitmap_benchmark(sizes, stdout, days=365, repeat=200):
+    """
+    Объем истории выполнений за год: строка на день в журнале отметок и биты по годам (байт на привычку в год).
+    Для сравнения - подсчет выполнений за год по журналу и по битам (p50, мс).
+    """
+    start = date(2025, 1, 1)
+    year_days = [start + timedelta(days=day) for day in range(days)]
+    bits = None
+    for day in year_days:
+        bits = set_day(bits, day)
+
+    for size in sizes:
+        with rollback():
+            owner = create_habits(size)
+            habits = list(Habit.objects.filter(owner=owner).values_list("id", flat=True))
+            HabitCompletion.objects.bulk_create(
+                (HabitCompletion(habit_id=habit_id, user=owner, date=day) for habit_id in habits for day in year_days),
+                batch_size=10000,
+            )
+            HabitYear.objects.bulk_create(
+                HabitYear(habit_id=habit_id, year=start.year, done=bits) for habit_id in habits
+            )
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+                sizes_by_table = {}
+                for model in (HabitCompletion, HabitYear):
+                    cursor.execute("SELECT pg_total_relation_size(%s)", [model._meta.db_table])
+                    sizes_by_table[model] = cursor.fetchone()[0] / size
+                cursor.execute("SELECT avg(pg_column_size(done)) FROM habits_habityear")
+                payload = cursor.fetchone()[0]
+
+            habit = Habit(id=habits[0])
+            end = year_days[-1]
+            by_rows = get_latencies(
+                lambda: HabitCompletion.objects.filter(habit=habit, date__gte=start, date__lte=end).count(), repeat
+            )
+            by_bits = get_latencies(lambda: load_history(habit, start, end).count(start, end), repeat)
+            stdout.write(
+                f"{size} привычек x {days} дней: журнал {sizes_by_table[HabitCompletion]:.0f} байт на привычку в год, "
+                f"биты {sizes_by_table[HabitYear]:.0f} байт (данные {payload:.0f} байт); подсчет за год: "
+                f"журнал {statistics.median(by_rows):.3f} мс, биты {statistics.median(by_bits):.3f} мс"
+            )
+
+
+@benchmark("serialize")
+def serialize_benchmark(sizes, stdout, repeat=5):
+    """
+    Скорость списка привычек (привычек в секунду, лучшая из repeat попыток) с чтением из БД:
+    модели и HabitSerializer против колонок из .values() и habit_rows.
+    """
+    for size in sizes:
+        with rollback():
+            owner = create_habits(
+                size, place="Дом", date_deadline=date(2030, 1, 1), time_deadline=datetime(2030, 1, 1, 8).time(),
+                next_reminder_at=timezone.now(),
+            )
+            habits = Habit.objects.filter(owner=owner).order_by("id")
+
+            def by_serializer():
+                return HabitSerializer(habits, many=True).data
+
+            def by_rows():
+                return habit_rows.to_representation(habits.values(*habit_rows.fields))
+
+            assert by_serializer() == by_rows()
+            rates = {}
+            for name, func in (("serializer", by_serializer), ("rows", by_rows)):
+                best = min(get_latencies(func, repeat)) / 1000
+                rates[name] = size / best
+            stdout.write(
+                f"{size} привычек: HabitSerializer {rates['serializer']:.0f} в секунду, "
+                f".values() {rates['rows']:.0f} в секунду ({rates['rows'] / rates['serializer']:.1f}x)"
+            )
+
+
+@benchmark("export")
+def export_benchmark(sizes, stdout):
+    """
+    Потоковая выгрузка всех привычек модератором: привычек в секунду и наибольший объем памяти Python
+    во время выгрузки (NDJSON, NDJSON с gzip и CSV).
+    """
+    client = APIClient()
+    url = reverse("habits:habits_export")
+
+    for size in sizes:
+        with rollback():
+            owner = create_habits(size, place="Дом", next_reminder_at=timezone.now())
+            owner.is_staff = True
+            owner.save()
+            client.force_authenticate(user=owner)
+
+            for name, params, headers in (
+                ("ndjson", {}, {}),
+                ("ndjson+gzip", {}, {"HTTP_ACCEPT_ENCODING": "gzip"}),
+                ("csv", {"output": "csv"}, {}),
+            ):
+                with timer() as result:
+                    response = client.get(url, params, **headers)
+                    length = sum(len(part) for part in response.streaming_content)
+
+                tracemalloc.start()
+                for _ in client.get(url, params, **headers).streaming_content:
+                    pass
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+                stdout.write(
+                    f"{size} привычек, {name}: {size / result['seconds']:.0f} в секунду, "
+                    f"{length / 2 ** 20:.2f} МБ, пик памяти {peak / 2 ** 20:.1f} МБ"
+                )
+
+
+@benchmark("import")
+def import_benchmark(sizes, stdout):
+    """
+    Загрузка файла NDJSON командой import_habits: привычек в секунду и наибольший объем памяти Python.
+    Каждая десятая привычка связана с приятной привычкой из файла.
+    """
+    with tempfile.TemporaryDirectory() as directory, rollback():
+        owner = User.objects.create(email=f"benchmark_{time.monotonic_ns()}@mail.ru")
+        for size in sizes:
+            path = os.path.join(directory, f"habits_{size}.ndjson")
+            with open(path, "w", encoding="utf-8") as file:
+                for habit_id in range(1, size + 1):
+                    row = {"id": habit_id, "action": "Выпить стакан воды", "time_deadline": "08:00:00"}
+                    if habit_id % 10 == 1:
+                        row["is_enjoyable"] = True
+                    elif habit_id % 10 == 2:
+                        row["associated_habit"] = habit_id - 1
+                    file.write(json.dumps(row) + "\n")
+
+            for measure_memory in (False, True):
+                with rollback():
+                    if measure_memory:
+                        tracemalloc.start()
+                    with timer() as result, open(path, encoding="utf-8") as file:
+                        importer = HabitImporter(owner).run(read_ndjson(file))
+                    if measure_memory:
+                        peak = tracemalloc.get_traced_memory()[1]
+                        tracemalloc.stop()
+                    else:
+                        rate = importer.created / result["seconds"]
+
+            stdout.write(
+                f"{size} привычек: {rate:.0f} в секунду, связанных {importer.linked}, "
+                f"пик памяти {peak / 2 ** 20:.1f} МБ"
+            )
+
+
+@benchmark("auth")
+def auth_benchmark(sizes, stdout):
+    """
+    Пропускная способность запросов к списку личных привычек с JWT (size запросов подряд):
+    загрузка пользователя из БД на каждый запрос и из кеша авторизации.
+    """
+    client = APIClient()
+    url = reverse("habits:habits_list")
+
+    for size in sizes:
+        with rollback():
+            owner = create_habits(5)
+            client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(owner)}")
+
+            for authentication in (JWTAuthentication, CachedJWTAuthentication):
+                cache.clear()
+                with patch.object(HabitListAPIView, "authentication_classes", [authentication]):
+                    client.get(url)
+                    with timer() as result, CaptureQueriesContext(connection) as queries:
+                        for _ in range(size):
+                            client.get(url)
+                stdout.write(
+                    f"{size} запросов, {authentication.__name__}: {size / result['seconds']:.0f} в секунду, "
+                    f"{len(queries) / size:.1f} запроса к БД на запрос"
+                )
+
+
+class SlowBody:
+    """ Тело запроса медленного клиента для WSGI: данные приходят через delay секунд. """
+
+    def __init__(self, body, delay):
+        self.body = io.BytesIO(body)
+        self.delay = delay
+
+    def wait(self):
+        if self.delay:
+            time.sleep(self.delay)
+            self.delay = 0
+
+    def read(self, size=-1):
+        self.wait()
+        return self.body.read(size)
+
+    def readline(self, size=-1):
+        self.wait()
+        return self.body.readline(size)
+
+
+async def call_asgi(application, path, headers, body, delay, method="POST"):
+    """ Запрос к ASGI-приложению от медленного клиента: тело приходит через delay секунд. """
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method, "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+        "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }
+    status = []
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    finished = asyncio.Event()
+
+    async def receive():
+        if messages:
+            await asyncio.sleep(delay)
+            return messages.pop()
+        # Клиент отключается только после ответа
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+        elif not message.get("more_body"):
+            finished.set()
+
+    await application(scope, receive, send)
+    return status[0]
+
+
+def call_wsgi(application, path, headers, body, delay, method="POST"):
+    """ Запрос к WSGI-приложению от медленного клиента: поток занят, пока тело не дочитано. """
+    environ = {
+        "REQUEST_METHOD": method, "PATH_INFO": path, "SCRIPT_NAME": "", "QUERY_STRING": "",
+        "SERVER_NAME": "testserver", "SERVER_PORT": "80", "SERVER_PROTOCOL": "HTTP/1.1",
+        "REMOTE_ADDR": "127.0.0.1", "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0), "wsgi.url_scheme": "http", "wsgi.input": SlowBody(body, delay),
+        "wsgi.errors": sys.stderr, "wsgi.multithread": True, "wsgi.multiprocess": False, "wsgi.run_once": False,
+    }
+    for name, value in headers.items():
+        key = name.upper().replace("-", "_")
+        environ[key if key == "CONTENT_TYPE" else f"HTTP_{key}"] = value
+    status = []
+    response = application(environ, lambda value, response_headers: status.append(int(value.split()[0])))
+    b"".join(response)
+    response.close()
+    return status[0]
+
+
+@benchmark("asgi")
+def asgi_benchmark(sizes, stdout, delay=0.5, threads=32):
+    """
+    size одновременных запросов к WSGI-серверу с пулом из threads потоков и к ASGI-приложению.
+    Список, карточка и создание привычки: под WSGI - синхронные представления DRF, под ASGI -
+    async-представления. Webhook Telegram - от быстрых клиентов и от медленных, у которых тело запроса
+    приходит через delay секунд: WSGI держит поток на все время чтения тела, ASGI ждет всех клиентов
+    в одном цикле событий, но каждый запрос несколько раз переходит в поток для синхронных middleware
+    и сигналов. Данные фиксируются, чтобы их видели потоки серверов, и удаляются после замера.
+    """
+    first_id = 10 ** 15 + time.time_ns() % 10 ** 12
+    update_ids = iter(range(first_id, first_id + 10 ** 9))
+
+    def get_update():
+        update = {"update_id": next(update_ids), "message": {"chat": {"id": 1}, "text": "/habits"}}
+        return json.dumps(update).encode()
+
+    def get_habit():
+        return json.dumps({"action": "Выпить стакан воды"}).encode()
+
+    async def run_asgi(path, method, headers, get_body, size, delay):
+        return await asyncio.gather(
+            *(call_asgi(asgi_application, path, headers, get_body(), delay, method) for _ in range(size))
+        )
+
+    def run_wsgi(path, method, headers, get_body, size, delay):
+        bodies = [get_body() for _ in range(size)]
+        with ThreadPoolExecutor(threads) as executor:
+            return list(executor.map(
+                lambda body: call_wsgi(wsgi_application, path, headers, body, delay, method), bodies
+            ))
+
+    asgi_application, wsgi_application = ASGIHandler(), WSGIHandler()
+    servers = (
+        ("WSGI", run_wsgi),
+        ("ASGI", lambda *args: asyncio.run(run_asgi(*args))),
+    )
+    owner = create_habits(20)
+    try:
+        habit_id = Habit.objects.filter(owner=owner).values_list("id", flat=True).first()
+        api_headers = {"Content-Type": "application/json", "Authorization": f"Bearer {AccessToken.for_user(owner)}"}
+        webhook = reverse("habits:telegram_webhook")
+        webhook_headers = {"Content-Type": "application/json", "X-Telegram-Bot-Api-Secret-Token": "benchmark"}
+        # Сценарий: название, метод, путь под WSGI и под ASGI, заголовки, тело запроса, задержки клиентов
+        scenarios = (
+            (
+                "список", "GET", reverse("habits:habits_list"), reverse("habits:habits_list_async"),
+                api_headers, bytes, (0,),
+            ),
+            (
+                "карточка", "GET", reverse("habits:habit_detail", args=(habit_id,)),
+                reverse("habits:habit_detail_async", args=(habit_id,)), api_headers, bytes, (0,),
+            ),
+            (
+                "создание", "POST", reverse("habits:habit_create"), reverse("habits:habit_create_async"),
+                api_headers, get_habit, (0,),
+            ),
+            ("webhook", "POST", webhook, webhook, webhook_headers, get_update, (0, delay)),
+        )
+        with override_settings(ALLOWED_HOSTS=["testserver"], TELEGRAM_WEBHOOK_SECRET="benchmark"):
+            for size in sizes:
+                for name, method, wsgi_path, asgi_path, headers, get_body, delays in scenarios:
+                    for client_delay in delays:
+                        for server, run in servers:
+                            path = asgi_path if server == "ASGI" else wsgi_path
+                            with timer() as result:
+                                statuses = run(path, method, headers, get_body, size, client_delay)
+                            stdout.write(
+                                f"{name}, {size} клиентов, задержка {client_delay} с, {server}: "
+                                f"{result['seconds']:.2f} с, {size / result['seconds']:.0f} запросов в секунду, "
+                                f"успешных {sum(200 <= status < 300 for status in statuses)}"
+                            )
+    finally:
+        TelegramUpdate.objects.filter(update_id__gte=first_id).delete()
+        Habit.objects.filter(owner=owner).delete()
+        owner.delete()
+
+
+@benchmark("telegram_updates")
+def telegram_updates_benchmark(sizes, stdout, users=1000):
+    """
+    Разбор очереди из size обновлений Telegram: 10% /start с кодом привязки, 30% /habits, 60% /done.
+    Обновления в секунду без отправки ответов и с отправкой в локальный сервер, отвечающий как Telegram.
+    """
+    for size in sizes:
+        for send_replies in (False, True):
+            with rollback():
+                owners = User.objects.bulk_create(
+                    User(email=f"bot_{index}_{time.monotonic_ns()}@mail.ru", telegram_chat_id=f"-{index + 1}")
+                    for index in range(users)
+                )
+                habits = Habit.objects.bulk_create(
+                    Habit(owner=owners[index % users], action="Выпить стакан воды") for index in range(size)
+                )
+                updates = []
+                for index, habit in enumerate(habits):
+                    owner = owners[index % users]
+                    if index % 10 == 0:
+                        text = f"/start {get_link_token(owner)}"
+                    elif index % 10 < 4:
+                        text = "/habits"
+                    else:
+                        text = f"/done {habit.id}"
+                    message = {"chat": {"id": int(owner.telegram_chat_id)}, "text": text}
+                    payload = {"update_id": index + 1, "message": message}
+                    updates.append(TelegramUpdate(update_id=index + 1, payload=payload))
+                TelegramUpdate.objects.bulk_create(updates)
+
+                with FakeTelegramServer() as server:
+                    def send(replies):
+                        if send_replies:
+                            send_messages(replies, base_url=server.url, rate=100000, chat_rate=100000)
+
+                    with timer() as result:
+                        processed = process_update_queue(send)
+
+            stdout.write(
+                f"{size} обновлений, {'с отправкой' if send_replies else 'без отправки'} ответов: "
+                f"{processed / result['seconds']:.0f} в секунду, отправлено {len(server.requests)}"
+            )
+
+
+@benchmark("timezones")
+def timezones_benchmark(sizes, stdout):
+    """
+    Напоминания о size ежедневных привычках без времени выполнения по минутам UTC: все владельцы
+    в часовом поясе проекта и владельцы, поровну распределенные по часовым поясам России.
+    Пик - наибольшее количество напоминаний в одну минуту. БД не используется.
+    """
+    zones = [
+        "Europe/Kaliningrad", "Europe/Moscow", "Europe/Samara", "Asia/Yekaterinburg", "Asia/Omsk",
+        "Asia/Krasnoyarsk", "Asia/Irkutsk", "Asia/Yakutsk", "Asia/Vladivostok", "Asia/Magadan", "Asia/Kamchatka",
+    ]
+    local_owners = [User(pk=pk, timezone=ZoneInfo(zone)) for pk, zone in enumerate(zones, 1)]
+    after = timezone.now()
+    for size in sizes:
+        for name, owners in (
+            ("часовой пояс проекта", [User(pk=1)]),
+            (f"{len(zones)} часовых поясов", local_owners),
+        ):
+            habits = [Habit(owner=owners[index % len(owners)], action="Выпить стакан воды") for index in range(size)]
+            with timer() as result, override_settings(REMINDER_JITTER_WINDOW=0):
+                schedule_habits(habits, after=after)
+            buckets = Counter(habit.next_reminder_at for habit in habits)
+            stdout.write(
+                f"{size} привычек, {name}: {len(buckets)} минут с напоминаниями, пик {max(buckets.values())} "
+                f"в минуту, расчет {result['seconds'] * 1000:.0f} мс"
+            )
+
+
+def simulate_dispatch(moments, limiter=None, chunk_size=500):
+    """
+    Рассылка напоминаний с моментами moments запусками раз в DISPATCH_INTERVAL секунд, как в dispatch_reminders.
+    Пачка уходит в момент первого напоминания в ней или позже, когда ее пропускает limiter.
+    Возвращает количество напоминаний по секундам отправки и наибольшее отставание отправки от момента в секундах.
+    """
+    moments = sorted(moment.timestamp() for moment in moments)
+    sent = Counter()
+    lag = 0.0
+    position = 0
+    run = moments[0] - moments[0] % DISPATCH_INTERVAL
+    while position < len(moments):
+        while position < len(moments) and moments[position] < run + DISPATCH_INTERVAL:
+            if limiter is not None and limiter.get_delay(1, run) >= DISPATCH_INTERVAL:
+                break
+            chunk = moments[position:position + chunk_size]
+            while chunk[-1] >= run + DISPATCH_INTERVAL:
+                chunk.pop()
+            start = max(run, chunk[0])
+            sent_at = start + (limiter.take(len(chunk), start) if limiter is not None else 0)
+            sent[int(sent_at)] += len(chunk)
+            lag = max(lag, sent_at - chunk[0])
+            position += len(chunk)
+        run += DISPATCH_INTERVAL
+    return sent, lag
+
+
+@benchmark("shaping")
+def shaping_benchmark(sizes, stdout, window=600, rate=1000):
+    """
+    Моделирование рассылки напоминаний о size ежедневных привычках в 8:00 у size / 10 пользователей:
+    без сглаживания, со сдвигом напоминаний владельцев по окну window секунд и со сдвигом
+    и ограничением частоты rate напоминаний в секунду. Пик - наибольшее количество напоминаний,
+    отправленных в одну секунду и в одну минуту. БД не используется.
+    """
+    after = timezone.now()
+    for size in sizes:
+        owners = [User(pk=pk) for pk in range(1, max(size // 10, 1) + 1)]
+        habits = [Habit(owner=owners[index % len(owners)], action="Выпить стакан воды") for index in range(size)]
+        for name, jitter_window, limiter in (
+            ("без сглаживания", 0, None),
+            (f"сдвиг в окне {window} с", window, None),
+            (f"сдвиг в окне {window} с и {rate} напоминаний/с", window, SendRateLimiter(rate=rate, burst=500)),
+        ):
+            with override_settings(REMINDER_JITTER_WINDOW=jitter_window):
+                schedule_habits(habits, after=after)
+            if limiter is not None:
+                cache.delete(limiter.cache_key)
+            sent, lag = simulate_dispatch([habit.next_reminder_at for habit in habits], limiter)
+            minutes = Counter()
+            for second, count in sent.items():
+                minutes[second // 60] += count
+            stdout.write(
+                f"{size} привычек, {name}: пик {max(sent.values())} в секунду, {max(minutes.values())} в минуту, "
+                f"рассылка {max(sent) - min(sent) + 1} с, наибольшее отставание {lag:.0f} с"
+            )
+
+
+@benchmark("outbox")
+def outbox_benchmark(sizes, stdout, workers=(1, 2, 4)):
+    """
+    Пропускная способность очереди отправки: запись size напоминаний пачками по REMINDER_CHUNK_SIZE
+    и отправка их workers параллельными обработчиками без обращения к Telegram.
+    Данные фиксируются, чтобы их видели обработчики в других соединениях, и удаляются после замера.
+    """
+    slot = get_reminder_slot()
+    chunk_size = settings.REMINDER_CHUNK_SIZE
+
+    def send(messages):
+        return [SendResult(chat_id, True) for chat_id, _ in messages]
+
+    def drain():
+        try:
+            return drain_deliveries(send)["sent"]
+        finally:
+            connection.close()
+
+    for size in sizes:
+        owner = create_habits(size)
+        try:
+            rows = [(habit_id, slot) for habit_id in Habit.objects.filter(owner=owner).values_list("id", flat=True)]
+            for count in workers:
+                ReminderDelivery.objects.filter(habit__owner=owner).delete()
+                with timer() as written:
+                    for start in range(0, size, chunk_size):
+                        write_deliveries(rows[start:start + chunk_size])
+                # Все напоминания уходят в чат одного владельца, а отправка без Telegram не ограничена по чатам
+                with (
+                    timer() as drained,
+                    ThreadPoolExecutor(count) as executor,
+                    override_settings(TELEGRAM_CHAT_RATE_LIMIT=size),
+                ):
+                    sent = sum(executor.map(lambda _: drain(), range(count)))
+                stdout.write(
+                    f"{size} напоминаний, обработчиков {count}: запись {size / written['seconds']:.0f} в секунду, "
+                    f"отправка {sent / drained['seconds']:.0f} в секунду, отправлено {sent}"
+                )
+        finally:
+            # Владелец удаляется с SET_NULL, поэтому привычки и их напоминания удаляются явно
+            Habit.objects.filter(owner=owner).delete()
+            owner.delete()
@@ -0,0 +1,160 @@
+"""
+Хранение истории выполнений привычки битами: одна строка HabitYear на привычку и год, бит на день.
+Бит дня n года (0 - 1 января) - бит n % 8 байта n // 8, так же нумерует биты функция set_bit в PostgreSQL,
+поэтому день отмечается в БД одним UPDATE без чтения строки.
+"""
+
+from calendar import isleap
+from datetime import date, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Func, Value
+
+from habits.models import HabitYear
+
+# 366 дней високосного года
+YEAR_BYTES = 46
+
+
+def get_day_index(day):
+    return day.timetuple().tm_yday - 1
+
+
+def get_year_days(year):
+    return 366 if isleap(year) else 365
+
+
+def set_day(bits, day):
+    """ Копия битов года с отмеченным днем. """
+    bits = bytearray(bits or bytes(YEAR_BYTES))
+    index = get_day_index(day)
+    bits[index // 8] |= 1 << index % 8
+    return bytes(bits)
+
+
+def test_day(bits, day):
+    index = get_day_index(day)
+    return bool(bits) and bool(bits[index // 8] >> index % 8 & 1)
+
+
+def count_days(bits, first, last):
+    """ Количество отмеченных дней с номера first по номер last включительно. """
+    value = int.from_bytes(bits, "little") >> first
+    return (value & ((1 << (last - first + 1)) - 1)).bit_count()
+
+
+def get_trailing_run(bits, index):
+    """ Длина серии отмеченных дней, которая заканчивается днем с номером index. """
+    mask = (1 << (index + 1)) - 1
+    gaps = ~int.from_bytes(bits, "little") & mask
+    return index + 1 - gaps.bit_length()
+
+
+def get_longest_run(bits):
+    """ Самая длинная серия отмеченных дней: каждый сдвиг с AND укорачивает все серии на день. """
+    value = int.from_bytes(bits, "little")
+    longest = 0
+    while value:
+        value &= value >> 1
+        longest += 1
+    return longest
+
+
+class HabitHistory:
+    """ История выполнений привычки за несколько лет: биты по годам. """
+
+    def __init__(self, years):
+        self.years = years
+
+    def test(self, day):
+        return test_day(self.years.get(day.year), day)
+
+    def count(self, start, end):
+        """ Количество выполнений с даты start по дату end включительно. """
+        total = 0
+        for year in range(start.year, end.year + 1):
+            bits = self.years.get(year)
+            if bits:
+                first = get_day_index(start) if year == start.year else 0
+                last = get_day_index(end) if year == end.year else get_year_days(year) - 1
+                total += count_days(bits, first, last)
+        return total
+
+    def get_streak(self, day):
+        """ Серия ежедневных выполнений, которая заканчивается днем day, в том числе через границы лет. """
+        streak = 0
+        index = get_day_index(day)
+        year = day.year
+        while year in self.years:
+            run = get_trailing_run(self.years[year], index)
+            streak += run
+            if run < index + 1:
+                break
+            year -= 1
+            index = get_year_days(year) - 1
+        return streak
+
+    def get_bits(self, start, end):
+        """ Биты дней с даты start по дату end включительно одним числом, в том числе через границы лет. """
+        value = 0
+        offset = 0
+        for year in range(start.year, end.year + 1):
+            days = get_year_days(year)
+            value |= (int.from_bytes(self.years.get(year, b""), "little") & ((1 << days) - 1)) << offset
+            offset += days
+        value >>= get_day_index(start)
+        return value & ((1 << (end - start).days + 1) - 1)
+
+    def get_longest_streak(self, start=None, end=None):
+        """
+        Самая длинная серия ежедневных выполнений с даты start по дату end, по умолчанию - за всю историю.
+        Биты лет склеиваются подряд, поэтому серия через границу лет считается целиком.
+        """
+        if not self.years:
+            return 0
+        value = self.get_bits(start or date(min(self.years), 1, 1), end or date(max(self.years), 12, 31))
+        return get_longest_run(value.to_bytes((value.bit_length() + 7) // 8, "little"))
+
+    def get_days(self, start, end):
+        """ Отмеченные дни с даты start по дату end по порядку: перебираются только установленные биты. """
+        value = self.get_bits(start, end)
+        while value:
+            lowest = value & -value
+            yield start + timedelta(days=lowest.bit_length() - 1)
+            value ^= lowest
+
+
+def mark_day(habit, day):
+    """ Отметка дня в истории привычки. Строка года создается при первой отметке за год. """
+    years = HabitYear.objects.filter(habit=habit, year=day.year)
+    set_bit = Func(F("done"), Value(get_day_index(day)), Value(1), function="set_bit")
+    if years.update(done=set_bit):
+        return
+    try:
+        with transaction.atomic():
+            HabitYear.objects.create(habit=habit, year=day.year, done=set_day(None, day))
+    except IntegrityError:
+        # Строку года одновременно создала параллельная отметка
+        years.update(done=set_bit)
+
+
+def mark_days(habit_ids, day):
+    """
+    Отметка дня в истории нескольких привычек двумя запросами: недостающие строки года создаются
+    одной вставкой, день отмечается одним UPDATE.
+    """
+    HabitYear.objects.bulk_create(
+        [HabitYear(habit_id=habit_id, year=day.year, done=bytes(YEAR_BYTES)) for habit_id in habit_ids],
+        ignore_conflicts=True,
+    )
+    set_bit = Func(F("done"), Value(get_day_index(day)), Value(1), function="set_bit")
+    HabitYear.objects.filter(habit_id__in=habit_ids, year=day.year).update(done=set_bit)
+
+
+def load_history(habit, start, end):
+    """
+    История привычки по год end: одна строка на год вместо строки на каждый день. Загружаются и годы
+    до start, на которые может продолжаться серия, заканчивающаяся днем end.
+    """
+    years = HabitYear.objects.filter(habit=habit, year__lte=end.year)
+    return HabitHistory({year: bytes(bits) for year, bits in years.values_list("year", "done")})
@@ -0,0 +1,305 @@
+"""
+Обработка обновлений Telegram Bot API, принятых webhook. Webhook только сохраняет обновление в очередь
+TelegramUpdate и сразу отвечает Telegram, а периодическая задача разбирает очередь пачками:
+пользователи и привычки всей пачки загружаются несколькими запросами, привязки чатов записываются
+в конце пачки, ответы бота отправляются одной рассылкой после фиксации транзакции.
+"""
+
+import asyncio
+from weakref import WeakKeyDictionary
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+
+from habits.models import Habit, TelegramUpdate
+from habits.streaks import record_completions
+from habits.telegram import send_messages
+from users.models import User
+
+# Сколько привычек показывать в ответ на команду /habits
+TELEGRAM_HABITS_LIMIT = 20
+
+# Сколько секунд действует код привязки чата
+LINK_TOKEN_MAX_AGE = 24 * 60 * 60
+LINK_TOKEN_SALT = "habits.bot.link"
+
+DONE_COMMANDS = ("/done", "done", "готово")
+
+HELP_TEXT = (
+    "Команды: /habits - активные привычки, /done <номер> - отметить выполнение привычки, "
+    "/stop - отключить напоминания."
+)
+NOT_LINKED_TEXT = "Чат не привязан к профилю. Отправьте /start с кодом привязки из профиля."
+
+
+def get_link_token(user):
+    """ Подписанный код привязки чата к пользователю для команды /start. """
+    return signing.dumps(user.pk, salt=LINK_TOKEN_SALT)
+
+
+def get_linked_user_id(token):
+    """ id пользователя из кода привязки или None, если код неверный или устарел. """
+    try:
+        return signing.loads(token, salt=LINK_TOKEN_SALT, max_age=LINK_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return None
+
+
+def parse_update(payload):
+    """ Чат, команда и аргументы текстового сообщения обновления или None для остальных обновлений. """
+    message = payload.get("message") if isinstance(payload, dict) else None
+    if not isinstance(message, dict) or not isinstance(message.get("text"), str):
+        return None
+    chat = message.get("chat")
+    words = message["text"].split()
+    if not isinstance(chat, dict) or chat.get("id") is None or not words:
+        return None
+    return str(chat["id"]), words[0].split("@")[0].lower(), words[1:]
+
+
+def to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class UpdateBatch:
+    """
+    Разбор пачки сообщений (chat_id, команда, аргументы) по порядку. Команды видят изменения предыдущих
+    сообщений пачки: после /start с кодом в том же чате сразу можно отметить выполнение привычки.
+    """
+
+    def __init__(self, messages):
+        self.messages = messages
+        chat_ids = {chat_id for chat_id, _, _ in messages}
+        user_ids = {
+            get_linked_user_id(args[0]) for _, command, args in messages if command == "/start" and args
+        }
+        habit_ids = {
+            to_int(args[0]) for _, command, args in messages if command in DONE_COMMANDS and args
+        }
+        users = User.objects.filter(
+            Q(telegram_chat_id__in=chat_ids) | Q(pk__in=user_ids - {None}), is_active=True
+        ).only("id", "email", "telegram_chat_id")
+        self.users = {user.pk: user for user in users}
+        self.chat_users = {user.telegram_chat_id: user for user in users if user.telegram_chat_id in chat_ids}
+        self.habits = (
+            Habit.objects.filter(is_active=True)
+            .only("id", "owner_id", "action", "periodicity")
+            .in_bulk(habit_ids - {None})
+        )
+        # Новые чаты пользователей и чаты, которые отвязываются от прежних владельцев
+        self.user_chats = {}
+        self.changed_chats = set()
+        self.habit_lists = []
+        self.completions = []
+        self.replies = []
+
+    def run(self):
+        handlers = {"/start": self.start, "/stop": self.stop, "/habits": self.list_habits}
+        for chat_id, command, args in self.messages:
+            handler = self.done if command in DONE_COMMANDS else handlers.get(command)
+            self.replies.append((chat_id, handler(chat_id, args) if handler else HELP_TEXT))
+        self.send_habit_lists()
+        self.save_completions()
+        self.save_chats()
+        return self.replies
+
+    def link(self, chat_id, user):
+        previous = self.chat_users.pop(chat_id, None)
+        if previous is not None:
+            self.user_chats[previous.pk] = None
+        if user is not None:
+            self.chat_users.pop(self.user_chats.get(user.pk, user.telegram_chat_id), None)
+            self.chat_users[chat_id] = user
+            self.user_chats[user.pk] = chat_id
+        self.changed_chats.add(chat_id)
+
+    def start(self, chat_id, args):
+        user = self.users.get(get_linked_user_id(args[0])) if args else None
+        if user is None:
+            return "Чтобы получать напоминания, отправьте /start с кодом привязки из профиля."
+        self.link(chat_id, user)
+        return f"Чат привязан к профилю {user.email}. {HELP_TEXT}"
+
+    def stop(self, chat_id, args):
+        if chat_id not in self.chat_users:
+            return NOT_LINKED_TEXT
+        self.link(chat_id, None)
+        return "Напоминания отключены, чат отвязан от профиля."
+
+    def list_habits(self, chat_id, args):
+        user = self.chat_users.get(chat_id)
+        if user is None:
+            return NOT_LINKED_TEXT
+        # Списки привычек загружаются одним запросом на всю пачку
+        self.habit_lists.append((len(self.replies), user.pk))
+        return None
+
+    def done(self, chat_id, args):
+        user = self.chat_users.get(chat_id)
+        if user is None:
+            return NOT_LINKED_TEXT
+        habit_id = to_int(args[0]) if args else None
+        if habit_id is None:
+            return "Укажите номер привычки: /done <номер>. Номера привычек - в ответе на /habits."
+        habit = self.habits.get(habit_id)
+        if habit is None or habit.owner_id != user.pk:
+            return f"Привычка {habit_id} не найдена."
+        # Выполнения записываются одной пачкой после разбора всех сообщений
+        self.completions.append((len(self.replies), habit, user))
+        return None
+
+    def send_habit_lists(self):
+        """ Ответы на /habits: не больше TELEGRAM_HABITS_LIMIT активных привычек каждого пользователя. """
+        if not self.habit_lists:
+            return
+        habits = (
+            Habit.objects.filter(owner_id__in={user_id for _, user_id in self.habit_lists}, is_active=True)
+            .annotate(position=Window(RowNumber(), partition_by=F("owner_id"), order_by=F("id").asc()))
+            .filter(position__lte=TELEGRAM_HABITS_LIMIT)
+            .order_by("owner_id", "id")
+        )
+        lines = {}
+        for owner_id, habit_id, action, time_deadline in habits.values_list(
+            "owner_id", "id", "action", "time_deadline"
+        ):
+            lines.setdefault(owner_id, []).append(
+                f"{habit_id}. {action} в {time_deadline:%H:%M}" if time_deadline else f"{habit_id}. {action}"
+            )
+        for index, user_id in self.habit_lists:
+            self.set_reply(index, "\n".join(lines.get(user_id, ())) or "Активных привычек нет.")
+
+    def save_completions(self):
+        if not self.completions:
+            return
+        results = record_completions([(habit, user) for _, habit, user in self.completions])
+        for (index, habit, _), result in zip(self.completions, results):
+            if isinstance(result, ValueError):
+                self.set_reply(index, f"Выполнение привычки «{habit.action}» сегодня уже отмечено.")
+            else:
+                self.set_reply(index, f"Отмечено: {habit.action}. Серия: {result.current_streak}.")
+
+    def set_reply(self, index, text):
+        self.replies[index] = (self.replies[index][0], text)
+
+    def save_chats(self):
+        """ Запись привязок пачки: чаты отвязываются от прежних владельцев и записываются новым. """
+        if not self.user_chats:
+            return
+        User.objects.filter(
+            Q(pk__in=self.user_chats) | Q(telegram_chat_id__in=self.changed_chats)
+        ).update(telegram_chat_id=None)
+        User.objects.bulk_update(
+            [User(pk=user_id, telegram_chat_id=chat_id) for user_id, chat_id in self.user_chats.items() if chat_id],
+            ["telegram_chat_id"],
+        )
+
+
+def process_updates(payloads):
+    """ Разбор пачки обновлений. Возвращает ответы бота (chat_id, text). """
+    messages = [message for message in map(parse_update, payloads) if message]
+    return UpdateBatch(messages).run() if messages else []
+
+
+class UpdateWriter:
+    """
+    Групповая запись обновлений из одновременных запросов webhook. Запрос, заставший очередь свободной,
+    записывает свое обновление и все накопившиеся одним INSERT, остальные запросы ждут результата.
+    Обновления, пришедшие во время записи, записывает следующей пачкой первый из ожидающих запросов.
+    Так процесс держит одно обращение к БД, сколько бы соединений ни открыл Telegram.
+    """
+
+    def __init__(self):
+        self.pending = []
+        self.writing = False
+
+    def promote(self):
+        """ Передача записи первому ожидающему запросу. """
+        for _, waiting in self.pending:
+            if not waiting.done():
+                waiting.set_result(True)
+                return
+        self.writing = False
+
+    async def write(self, update):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((update, future))
+        if self.writing:
+            try:
+                if not await future:
+                    return
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled() and future.result():
+                    self.promote()
+                raise
+
+        self.writing = True
+        batch, self.pending = self.pending, []
+        try:
+            # Telegram повторяет доставку, пока не получит ответ, повторное обновление не записывается
+            await TelegramUpdate.objects.abulk_create(
+                [TelegramUpdate(update_id=item["update_id"], payload=item) for item, _ in batch],
+                ignore_conflicts=True,
+            )
+        except BaseException:
+            # Обновления остальных запросов запишет следующий запрос
+            self.pending[:0] = [item for item in batch if item[1] is not future]
+            raise
+        else:
+            for _, waiting in batch:
+                if not waiting.done():
+                    waiting.set_result(False)
+        finally:
+            self.promote()
+
+
+# Ожидание записи привязано к циклу событий, поэтому у каждого цикла своя очередь записи:
+# под WSGI каждый запрос выполняется в своем цикле и записывает обновление сам
+update_writers = WeakKeyDictionary()
+
+
+async def write_update(update):
+    """ Запись обновления в очередь TelegramUpdate вместе с обновлениями одновременных запросов. """
+    loop = asyncio.get_running_loop()
+    writer = update_writers.get(loop)
+    if writer is None:
+        writer = update_writers[loop] = UpdateWriter()
+    await writer.write(update)
+
+
+def claim_updates(limit):
+    """
+    Захват не больше limit необработанных обновлений по порядку update_id. Строки блокируются с SKIP LOCKED,
+    поэтому параллельные обработчики получают разные обновления. Вызывается внутри транзакции.
+    """
+    return list(
+        TelegramUpdate.objects.order_by("update_id")
+        .select_for_update(skip_locked=True)
+        .values_list("update_id", "payload")[:limit]
+    )
+
+
+def process_update_queue(send=send_messages, batch_size=None):
+    """
+    Разбор очереди обновлений пачками по batch_size штук, пока очередь не опустеет.
+    Обработанные обновления удаляются в транзакции пачки, ответы передаются в send после ее фиксации.
+    Возвращает количество обработанных обновлений.
+    """
+    batch_size = batch_size or settings.TELEGRAM_UPDATES_BATCH_SIZE
+
+    processed = 0
+    while True:
+        with transaction.atomic():
+            rows = claim_updates(batch_size)
+            replies = process_updates([payload for _, payload in rows])
+            TelegramUpdate.objects.filter(update_id__in=[update_id for update_id, _ in rows]).delete()
+        if replies:
+            send(replies)
+        processed += len(rows)
+        if len(rows) < batch_size:
+            return processed
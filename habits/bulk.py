@@ -0,0 +1,210 @@
+"""
+Массовое создание, редактирование и деактивация привычек.
+Все привычки пачки проверяются до записи: при ошибке хотя бы в одной ничего не сохраняется,
+а в ответ возвращаются ошибки по номерам привычек в пачке.
+"""
+
+from django.db import transaction
+from rest_framework.serializers import ValidationError, as_serializer_error
+
+from habits.cache import invalidate_public_habits
+from habits.models import Habit
+from habits.serializers import HabitSerializer, to_pk
+from habits.services import SCHEDULE_FIELDS, schedule_habits
+from habits.validators import CheckHabitValidator, validate_many
+
+# Наибольшее количество привычек в одном запросе
+BULK_MAX_ITEMS = 100
+
+
+class BulkValidationError(Exception):
+    """ Ошибки проверки пачки: список {"index": номер привычки, "errors": ошибки}. """
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def check_items(items):
+    if not isinstance(items, list) or not items:
+        raise BulkValidationError([{"index": None, "errors": ["Ожидается непустой список привычек."]}])
+    if len(items) > BULK_MAX_ITEMS:
+        raise BulkValidationError(
+            [{"index": None, "errors": [f"В одном запросе можно передать не больше {BULK_MAX_ITEMS} привычек."]}]
+        )
+
+
+def get_associated_habits(owner, items):
+    """ Связанные привычки, на которые ссылается пачка, одним запросом. Чужие привычки не загружаются. """
+    ids = {to_pk(item.get("associated_habit")) for item in items if isinstance(item, dict)}
+    ids.discard(None)
+    if not ids:
+        return {}
+    return Habit.objects.filter(owner=owner, id__in=ids).only("id", "owner_id", "is_enjoyable").in_bulk()
+
+
+def get_batch_serializer(owner, items, **kwargs):
+    """
+    Сериализатор для проверки всех привычек пачки. Поля строятся один раз, как в ListSerializer,
+    связанные привычки загружаются заранее, а валидаторы Meta запускаются после полей по всей пачке.
+    """
+    serializer = HabitSerializer(context={"associated_habits": get_associated_habits(owner, items)}, **kwargs)
+    serializer.validators = []
+    return serializer
+
+
+def validate_batch(validated, errors):
+    """ Проверка пачки валидаторами HabitSerializer, ошибки добавляются к ошибкам полей. """
+    for index, messages in validate_many(HabitSerializer.Meta.validators, validated).items():
+        errors.append({"index": index, "errors": {"non_field_errors": messages}})
+        validated.pop(index)
+
+
+def validate_associated_index(item, index, habits):
+    """
+    Связанная привычка из той же пачки, указанная полем associated_index - номером привычки в пачке.
+    Связь проверяется тем же валидатором, что и связь с уже сохраненной привычкой.
+    """
+    associated_index = item.get("associated_index")
+    if associated_index is None:
+        return None
+    # bool - подкласс int, true из JSON номером привычки не считается
+    is_number = isinstance(associated_index, int) and not isinstance(associated_index, bool)
+    if not is_number or not 0 <= associated_index < len(habits) or associated_index == index:
+        raise ValidationError({"associated_index": "Укажите номер другой привычки в пачке."})
+
+    associated_habit = habits[associated_index]
+    if associated_habit is None:
+        raise ValidationError({"associated_index": "Связанная привычка из пачки содержит ошибки."})
+
+    habit = habits[index]
+    if habit.associated_habit_id:
+        raise ValidationError("Укажите связанную привычку либо полем associated_habit, либо associated_index.")
+    CheckHabitValidator("associated_habit", "reward", "is_enjoyable")(
+        {"associated_habit": associated_habit, "reward": habit.reward, "is_enjoyable": habit.is_enjoyable}
+    )
+    return associated_habit
+
+
+def create_habits(owner, items):
+    """
+    Создание пачки привычек владельца: проверка всех привычек, расчет напоминаний за один проход
+    и запись через bulk_create. Привычки, связанные с привычками из той же пачки, записываются
+    вторым запросом, когда у связанных привычек уже есть id.
+    """
+    check_items(items)
+
+    serializer = get_batch_serializer(owner, items)
+    validated = {}
+    errors = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({"index": index, "errors": ["Ожидается объект привычки."]})
+            continue
+        try:
+            validated[index] = serializer.run_validation(
+                {key: value for key, value in item.items() if key != "associated_index"}
+            )
+        except ValidationError as error:
+            errors.append({"index": index, "errors": as_serializer_error(error)})
+    validate_batch(validated, errors)
+
+    habits = [Habit(owner=owner, **validated[index]) if index in validated else None for index in range(len(items))]
+
+    links = {}
+    for index, item in enumerate(items):
+        if habits[index] is None:
+            continue
+        try:
+            associated_habit = validate_associated_index(item, index, habits)
+        except ValidationError as error:
+            errors.append({"index": index, "errors": error.detail})
+            continue
+        if associated_habit is not None:
+            links[index] = associated_habit
+
+    if errors:
+        raise BulkValidationError(sorted(errors, key=lambda error: error["index"]))
+
+    schedule_habits(habits)
+    with transaction.atomic():
+        Habit.objects.bulk_create([habit for index, habit in enumerate(habits) if index not in links])
+        for index, associated_habit in links.items():
+            habits[index].associated_habit = associated_habit
+        if links:
+            Habit.objects.bulk_create([habits[index] for index in links])
+
+    if any(habit.is_public for habit in habits):
+        invalidate_public_habits()
+    return habits
+
+
+def update_habits(owner, items):
+    """
+    Частичное редактирование пачки привычек владельца. Каждая привычка указывается по id.
+    Привычки загружаются одним запросом и сохраняются через bulk_update, напоминания пересчитываются
+    одним проходом только у привычек, у которых изменилось расписание.
+    """
+    check_items(items)
+
+    ids = [to_pk(item.get("id")) if isinstance(item, dict) else None for item in items]
+    found = Habit.objects.in_bulk([habit_id for habit_id in ids if habit_id is not None])
+
+    serializer = get_batch_serializer(owner, items, partial=True)
+    validated = {}
+    habits = {}
+    errors = []
+    fields = set()
+    rescheduled = []
+    for index, item in enumerate(items):
+        habit = found.get(ids[index])
+        if habit is None or habit.owner_id != owner.id:
+            errors.append({"index": index, "errors": {"id": ["Привычка не найдена."]}})
+            continue
+        if ids.count(habit.id) > 1:
+            errors.append({"index": index, "errors": {"id": ["Привычка указана в пачке несколько раз."]}})
+            continue
+
+        serializer.instance = habit
+        try:
+            validated[index] = serializer.run_validation({key: value for key, value in item.items() if key != "id"})
+        except ValidationError as error:
+            errors.append({"index": index, "errors": as_serializer_error(error)})
+            continue
+        # Владелец уже загружен, его часовой пояс нужен для расчета напоминаний
+        habit.owner = owner
+        habits[index] = habit
+    validate_batch(validated, errors)
+
+    if errors:
+        raise BulkValidationError(sorted(errors, key=lambda error: error["index"]))
+
+    for index, validated_data in validated.items():
+        habit = habits[index]
+        habit.was_public = habit.is_public
+        for field, value in validated_data.items():
+            setattr(habit, field, value)
+        fields.update(validated_data)
+        if SCHEDULE_FIELDS.intersection(validated_data):
+            rescheduled.append(habit)
+    habits = list(habits.values())
+
+    if rescheduled:
+        schedule_habits(rescheduled)
+        fields.add("next_reminder_at")
+    if fields:
+        Habit.objects.bulk_update(habits, sorted(fields))
+
+    if any(habit.is_public or habit.was_public for habit in habits):
+        invalidate_public_habits()
+    return habits
+
+
+def deactivate_habits(owner, ids):
+    """ Деактивация привычек владельца одним UPDATE, напоминания о них отключаются. Возвращает количество. """
+    habits = Habit.objects.filter(owner=owner, id__in=ids, is_active=True)
+    has_public = habits.filter(is_public=True).exists()
+    deactivated = habits.update(is_active=False, next_reminder_at=None)
+    if has_public:
+        invalidate_public_habits()
+    return deactivated
@@ -0,0 +1,51 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+
+PUBLIC_HABITS_VERSION_KEY = "public_habits:version"
+
+
+def get_public_habits_version():
+    """ Текущая версия ленты публичных привычек. Версия хранится без срока действия. """
+    version = cache.get(PUBLIC_HABITS_VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        cache.add(PUBLIC_HABITS_VERSION_KEY, version, timeout=None)
+        version = cache.get(PUBLIC_HABITS_VERSION_KEY, version)
+    return version
+
+
+def invalidate_public_habits():
+    """
+    Сброс кеша ленты публичных привычек увеличением версии: страницы прежней версии больше не читаются
+    и удаляются из кеша по истечении срока. Если версия уже вытеснена из кеша, новая берется из текущего времени,
+    чтобы не совпасть ни с одной из прежних.
+    """
+    try:
+        cache.incr(PUBLIC_HABITS_VERSION_KEY)
+    except ValueError:
+        cache.set(PUBLIC_HABITS_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def get_public_page_key(request):
+    """ Ключ страницы ленты: версия ленты и полный адрес запроса вместе с параметрами пагинации. """
+    url_hash = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return f"public_habits:{get_public_habits_version()}:{url_hash}"
+
+
+def get_etag(data):
+    return f'"{hashlib.md5(JSONRenderer().render(data)).hexdigest()}"'
+
+
+def cache_public_page(key, data):
+    """
+    Сохранение страницы ленты вместе с ее ETag, возвращает ETag.
+    Ключ вычисляется до запроса к БД: если лента изменилась во время запроса, страница сохранится
+    под прежней версией и не будет прочитана.
+    """
+    etag = get_etag(data)
+    cache.set(key, (etag, data), settings.PUBLIC_HABITS_CACHE_TIMEOUT)
+    return etag
@@ -0,0 +1,164 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Value
+from django.utils import timezone
+
+from habits.models import Habit, ReminderDelivery
+from habits.services import get_next_reminder, get_reminder_jitter, get_reminder_jitter_expression
+
+# Интервал запуска рассылки в секундах: за один запуск в очередь ставится не больше напоминаний,
+# чем ограничение частоты отправки пропускает до следующего запуска
+DISPATCH_INTERVAL = 60
+
+
+def get_reminder_slot(moment=None):
+    """ Минута, к которой относится момент времени, в часовом поясе проекта. """
+    moment = timezone.localtime(moment or timezone.now())
+    return moment.replace(second=0, microsecond=0)
+
+
+def get_due_habits(slot):
+    """
+    Активные привычки, напоминание о которых нужно отправить не позже указанной минуты.
+    Выборка - один проход по частичному индексу на next_reminder_at, поэтому пропущенные
+    из-за простоя минуты досылаются на следующем запуске.
+    """
+    return Habit.objects.filter(is_active=True, next_reminder_at__lt=slot + timedelta(minutes=1))
+
+
+def advance_reminders(rows, slot):
+    """
+    Перенос next_reminder_at отправленных привычек на следующее напоминание.
+    rows - кортежи (id, owner_id, periodicity, time_deadline, date_deadline, next_reminder_at,
+    часовой пояс владельца). Привычки с одинаковым расписанием обновляются одним запросом,
+    сдвиг каждого владельца добавляется в самом запросе.
+    """
+    groups = {}
+    for habit_id, owner_id, periodicity, time_deadline, date_deadline, next_reminder_at, tz in rows:
+        # Расписание отсчитывается от момента без сдвига владельца
+        last_reminder = next_reminder_at - get_reminder_jitter(owner_id)
+        groups.setdefault((periodicity, time_deadline, date_deadline, last_reminder, tz), []).append(habit_id)
+
+    jitter = get_reminder_jitter_expression() if settings.REMINDER_JITTER_WINDOW else None
+    for (periodicity, time_deadline, date_deadline, last_reminder, tz), habit_ids in groups.items():
+        next_reminder_at = get_next_reminder(
+            periodicity, time_deadline, date_deadline, after=slot, last_reminder=last_reminder, tz=tz
+        )
+        if next_reminder_at is not None and jitter is not None:
+            next_reminder_at = Value(next_reminder_at) + jitter
+        Habit.objects.filter(id__in=habit_ids).update(next_reminder_at=next_reminder_at)
+
+
+def claim_due_reminders(slot, limit):
+    """
+    Захват не больше limit наступивших напоминаний и перенос их на следующий раз.
+    Строки привычек блокируются с SKIP LOCKED, поэтому параллельные запуски рассылки получают разные привычки,
+    а уже перенесенная привычка повторно не отбирается. Вызывается внутри транзакции.
+    Возвращает пары (id, момент напоминания) захваченных привычек по порядку моментов.
+    """
+    rows = list(
+        get_due_habits(slot)
+        .order_by("next_reminder_at", "id")
+        .select_for_update(skip_locked=True, of=("self",))
+        .values_list(
+            "id", "owner_id", "periodicity", "time_deadline", "date_deadline", "next_reminder_at", "owner__timezone"
+        )[:limit]
+    )
+    advance_reminders(rows, slot)
+    return [(row[0], row[5]) for row in rows]
+
+
+class SendRateLimiter:
+    """
+    Ограничение частоты отправки напоминаний по алгоритму ведра токенов: в среднем не больше rate напоминаний
+    в секунду, разом - не больше burst. Состояние ведра - момент, к которому оно снова наполнится, -
+    хранится в кеше и общее для всех запусков рассылки. Резервирование меняет состояние под блокировкой
+    в том же кеше, поэтому пересекающиеся запуски не теряют резервирования друг друга.
+    """
+
+    cache_key = "reminders:send_rate"
+    lock_key = "reminders:send_rate:lock"
+    # Срок блокировки в секундах: блокировка упавшего запуска снимается сама
+    lock_timeout = 5
+
+    def __init__(self, rate=None, burst=None, cache_key=None):
+        self.rate = rate or settings.REMINDER_SEND_RATE
+        self.burst = burst or settings.REMINDER_SEND_BURST
+        if cache_key:
+            self.cache_key = cache_key
+            self.lock_key = f"{cache_key}:lock"
+
+    def get_delay(self, count, now):
+        """ Через сколько секунд после now ведро пропустит еще count напоминаний. """
+        ready_at = max(cache.get(self.cache_key, 0.0), now) + count / self.rate
+        return max(ready_at - self.burst / self.rate - now, 0.0)
+
+    def take(self, count, now):
+        """ Резервирование count напоминаний. Возвращает, через сколько секунд их можно отправить. """
+        while not cache.add(self.lock_key, True, self.lock_timeout):
+            time.sleep(0.01)
+        try:
+            ready_at = max(cache.get(self.cache_key, 0.0), now) + count / self.rate
+            cache.set(self.cache_key, ready_at, None)
+        finally:
+            cache.delete(self.lock_key)
+        return max(ready_at - self.burst / self.rate - now, 0.0)
+
+
+def dispatch_reminders(slot, enqueue, chunk_size=None, limiter=None):
+    """
+    Отправка напоминаний о привычках, наступивших к указанной минуте.
+    Привычки захватываются пачками по chunk_size штук, пары (id, момент напоминания) каждой пачки и задержка
+    отправки в секундах передаются в enqueue в той же транзакции, в которой напоминания переносятся на следующий раз.
+    Пачка уходит не раньше момента первого напоминания в ней, поэтому сдвинутые напоминания расходятся
+    и внутри минуты. С ограничением limiter пачка откладывается еще и до момента, когда ее пропустит
+    ведро токенов. Когда ведро не пропустит ни одного напоминания до следующего запуска, захват
+    останавливается: остальные привычки остаются наступившими и отправляются следующими запусками,
+    самые старые - первыми.
+    Возвращает количество привычек, напоминания о которых поставлены в очередь.
+    """
+    chunk_size = chunk_size or settings.REMINDER_CHUNK_SIZE
+
+    dispatched = 0
+    while True:
+        if limiter is not None and limiter.get_delay(1, time.time()) >= DISPATCH_INTERVAL:
+            return dispatched
+        with transaction.atomic():
+            rows = claim_due_reminders(slot, chunk_size)
+            if rows:
+                now = time.time()
+                start = max(rows[0][1].timestamp(), now)
+                delay = start - now + (limiter.take(len(rows), start) if limiter is not None else 0)
+                enqueue(rows, delay)
+        dispatched += len(rows)
+        if len(rows) < chunk_size:
+            return dispatched
+
+
+def get_queue_lag(now=None):
+    """
+    Отставание рассылки в секундах: сколько ждет самое старое наступившее напоминание - еще не поставленное
+    в очередь или уже записанное в очередь отправки ReminderDelivery, но не отправленное.
+    0, если все наступившие напоминания отправлены.
+    """
+    now = now or timezone.now()
+    oldest = [
+        Habit.objects.filter(is_active=True, next_reminder_at__lte=now)
+        .order_by("next_reminder_at")
+        .values_list("next_reminder_at", flat=True)
+        .first(),
+        ReminderDelivery.objects.filter(
+            status=ReminderDelivery.PENDING,
+            available_at__lte=now,
+            attempts__lt=settings.REMINDER_DELIVERY_MAX_ATTEMPTS,
+        )
+        .order_by("available_at")
+        .values_list("available_at", flat=True)
+        .first(),
+    ]
+    oldest = min((moment for moment in oldest if moment is not None), default=None)
+    return (now - oldest).total_seconds() if oldest else 0.0
@@ -0,0 +1,65 @@
+"""
+Потоковая выгрузка привычек в NDJSON и CSV. Привычки читаются курсором на стороне сервера пачками
+по EXPORT_CHUNK_SIZE строк и сразу отдаются клиенту, поэтому память не растет с количеством привычек.
+"""
+
+import csv
+import json
+import zlib
+from itertools import islice
+
+from habits.serializers import habit_rows
+
+EXPORT_CHUNK_SIZE = 2000
+
+# Форматы выгрузки: (тип содержимого, расширение файла)
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+}
+
+
+def iter_chunks(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    """ Пачки привычек в представлении HabitSerializer. """
+    rows = queryset.values(*fields).iterator(chunk_size=chunk_size)
+    while chunk := list(islice(rows, chunk_size)):
+        yield habit_rows.to_representation(chunk, fields)
+
+
+def iter_ndjson(chunks):
+    """ Привычка на строку, одна строка текста на пачку. """
+    for chunk in chunks:
+        yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in chunk)
+
+
+class LineBuffer:
+    """ Буфер для csv.writer, который возвращает записанную строку вместо записи в файл. """
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(chunks, fields):
+    """ Заголовок с именами полей и строка на привычку. Пустые значения выгружаются пустыми ячейками. """
+    writer = csv.writer(LineBuffer())
+    yield writer.writerow(fields)
+    for chunk in chunks:
+        yield "".join(writer.writerow([row[name] for name in fields]) for row in chunk)
+
+
+def iter_gzip(parts):
+    """ Сжатие потока gzip по мере выгрузки. """
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for part in parts:
+        data = compressor.compress(part)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_habits(queryset, fields, export_format, compress=False):
+    """ Поток байтов выгрузки привычек queryset в формате export_format. """
+    chunks = iter_chunks(queryset, fields)
+    lines = iter_csv(chunks, fields) if export_format == "csv" else iter_ndjson(chunks)
+    parts = (line.encode() for line in lines)
+    return iter_gzip(parts) if compress else parts
@@ -1,5 +1,96 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
 def created_habit():
     return {
         'place': None, 'date_deadline': None, 'time_deadline': None, 'action': 'Убрать комнату', 'is_enjoyable': None,
-        'periodicity': 'Ежедневно', 'reward': None, 'time_to_complete': None, 'owner': None, 'associated_habit': None
-    }
\ No newline at end of file
+        'periodicity': 'Ежедневно', 'reward': None, 'time_to_complete': None, 'owner': None, 'associated_habit': None,
+        'next_reminder_at': None
+    }
+
+
+class QueryBudgetMixin:
+    """
+    Проверка бюджета SQL-запросов эндпоинтов в тестах.
+    query_budgets - наибольшее допустимое количество запросов по имени url.
+    """
+
+    query_budgets = {}
+
+    @contextmanager
+    def assertQueryBudget(self, url_name):
+        budget = self.query_budgets[url_name]
+        with CaptureQueriesContext(connection) as context:
+            yield context
+        queries = "\n".join(query["sql"] for query in context.captured_queries)
+        self.assertLessEqual(
+            len(context), budget, f"{url_name}: {len(context)} запросов при бюджете {budget}:\n{queries}"
+        )
+
+
+class FakeTelegramHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class FakeTelegramServer:
+    """
+    Локальный HTTP-сервер, который отвечает как Telegram Bot API.
+    Ответы (код, тело) берутся по очереди из responses, когда они заканчиваются - отвечает успехом.
+    """
+
+    def __init__(self, responses=(), delay=0):
+        self.responses = list(responses)
+        self.delay = delay
+        self.requests = []
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with server.lock:
+                    server.connections += 1
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with server.lock:
+                    server.requests.append((self.path, payload))
+                    status, body = server.responses.pop(0) if server.responses else (200, {"ok": True})
+                if server.delay:
+                    time.sleep(server.delay)
+
+                content = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = FakeTelegramHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/bot"
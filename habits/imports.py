@@ -0,0 +1,217 @@
+"""
+Загрузка привычек из файла NDJSON или CSV, например выгрузки /habits/export/.
+Файл читается построчно, привычки проверяются правилами HabitSerializer и записываются пачками
+в отдельных транзакциях, поэтому память не зависит от размера файла: между пачками хранятся
+только id привычек и ссылки на связанные привычки в массивах чисел.
+Связанная привычка указывается id привычки из того же файла и проставляется вторым проходом,
+когда все привычки файла уже записаны.
+"""
+
+import csv
+import gzip
+import json
+from array import array
+from bisect import bisect_left
+from itertools import islice
+
+from django.db import transaction
+from rest_framework.serializers import ValidationError, as_serializer_error
+
+from habits.cache import invalidate_public_habits
+from habits.models import Habit
+from habits.serializers import HabitSerializer, to_pk
+from habits.services import schedule_habits
+from habits.validators import CheckHabitValidator, validate_many
+from users.models import User
+
+IMPORT_BATCH_SIZE = 5000
+
+# Сколько ошибок хранить для отчета, остальные только считаются
+IMPORT_MAX_ERRORS = 100
+
+IMPORT_FORMATS = ("ndjson", "csv")
+
+
+def open_import_file(path):
+    """ Файл для чтения строк, сжатый gzip файл распаковывается на лету. """
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, encoding="utf-8", newline="")
+
+
+def get_import_format(path):
+    name = path.removesuffix(".gz")
+    return "csv" if name.endswith(".csv") else "ndjson"
+
+
+def read_ndjson(file):
+    """ Привычки из строк JSON с номерами строк. Строка с ошибкой JSON возвращается как None. """
+    for line_number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_number, row if isinstance(row, dict) else None
+
+
+def read_csv(file):
+    """ Привычки из строк CSV с заголовком с номерами строк. Пустая ячейка - незаполненное поле. """
+    reader = csv.DictReader(file)
+    for row in reader:
+        yield reader.line_num, {name: value for name, value in row.items() if value not in ("", None)}
+
+
+class IdMap:
+    """ Соответствие id привычек файла и id записанных привычек в двух массивах чисел. """
+
+    def __init__(self):
+        self.source_ids = array("q")
+        self.habit_ids = array("q")
+        self.is_sorted = True
+
+    def add(self, source_id, habit_id):
+        if self.source_ids and source_id <= self.source_ids[-1]:
+            self.is_sorted = False
+        self.source_ids.append(source_id)
+        self.habit_ids.append(habit_id)
+
+    def get(self, source_id):
+        if not self.is_sorted:
+            # Выгрузка упорядочена по id, сортировка нужна только для файлов, собранных вручную
+            pairs = sorted(zip(self.source_ids, self.habit_ids))
+            self.source_ids = array("q", (pair[0] for pair in pairs))
+            self.habit_ids = array("q", (pair[1] for pair in pairs))
+            self.is_sorted = True
+        index = bisect_left(self.source_ids, source_id)
+        if index < len(self.source_ids) and self.source_ids[index] == source_id:
+            return self.habit_ids[index]
+        return None
+
+
+class HabitImporter:
+    """
+    Загрузка привычек. Владелец привычки берется из поля owner строки или, если указан, из owner.
+    Строки с ошибками пропускаются. Если связанную привычку не удалось проставить, привычка
+    остается без связанной привычки. Ошибки возвращаются с номерами строк файла.
+    """
+
+    def __init__(self, owner=None, batch_size=IMPORT_BATCH_SIZE):
+        self.owner = owner
+        self.batch_size = batch_size
+        self.serializer = HabitSerializer(context={"associated_habits": {}})
+        self.serializer.validators = []
+        self.ids = IdMap()
+        # Ссылки на связанные привычки: id привычки, id связанной привычки в файле и номер строки
+        self.link_habits = array("q")
+        self.link_sources = array("q")
+        self.link_lines = array("q")
+        self.created = 0
+        self.linked = 0
+        self.error_count = 0
+        self.errors = []
+        self.has_public = False
+
+    def add_error(self, line_number, errors):
+        self.error_count += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append({"line": line_number, "errors": errors})
+
+    def run(self, rows):
+        """ Загрузка привычек из строк (номер строки, данные привычки). """
+        rows = iter(rows)
+        while batch := list(islice(rows, self.batch_size)):
+            self.import_batch(batch)
+        self.link_batches()
+        if self.has_public:
+            invalidate_public_habits()
+        return self
+
+    def get_owners(self, batch):
+        """ Владельцы пачки одним запросом. """
+        if self.owner is not None:
+            return {}
+        owner_ids = {to_pk(row.get("owner")) for _, row in batch if row}
+        owner_ids.discard(None)
+        return User.objects.only("id", "timezone").in_bulk(owner_ids)
+
+    def import_batch(self, batch):
+        owners = self.get_owners(batch)
+        validated = {}
+        rows = {}
+        for index, (line_number, row) in enumerate(batch):
+            if row is None:
+                self.add_error(line_number, ["Строка не является объектом привычки."])
+                continue
+            owner = self.owner or owners.get(to_pk(row.get("owner")))
+            if owner is None:
+                self.add_error(line_number, {"owner": ["Владелец привычки не найден."]})
+                continue
+            try:
+                validated[index] = self.serializer.run_validation(
+                    {name: value for name, value in row.items() if name != "associated_habit"}
+                )
+            except ValidationError as error:
+                self.add_error(line_number, as_serializer_error(error))
+                continue
+            validated[index]["owner"] = owner
+            rows[index] = row
+
+        for index, messages in validate_many(HabitSerializer.Meta.validators, validated).items():
+            self.add_error(batch[index][0], {"non_field_errors": messages})
+            validated.pop(index)
+
+        habits = {index: Habit(**attrs) for index, attrs in validated.items()}
+        schedule_habits(habits.values())
+        with transaction.atomic():
+            Habit.objects.bulk_create(habits.values())
+
+        for index, habit in habits.items():
+            self.created += 1
+            self.has_public = self.has_public or habit.is_public
+            source_id = to_pk(rows[index].get("id"))
+            if source_id is not None:
+                self.ids.add(source_id, habit.id)
+            associated_id = rows[index].get("associated_habit")
+            if associated_id is not None:
+                self.link_habits.append(habit.id)
+                self.link_sources.append(to_pk(associated_id) or 0)
+                self.link_lines.append(batch[index][0])
+
+    def link_batches(self):
+        """ Второй проход: связанные привычки проставляются пачками, связь проверяется как при создании. """
+        for start in range(0, len(self.link_habits), self.batch_size):
+            end = start + self.batch_size
+            links = []
+            for habit_id, source_id, line_number in zip(
+                self.link_habits[start:end], self.link_sources[start:end], self.link_lines[start:end]
+            ):
+                associated_id = self.ids.get(source_id)
+                if associated_id is None:
+                    self.add_error(line_number, {"associated_habit": ["Связанная привычка не найдена в файле."]})
+                else:
+                    links.append((habit_id, associated_id, line_number))
+
+            habits = Habit.objects.only("id", "owner_id", "reward", "is_enjoyable").in_bulk(
+                {habit_id for link in links for habit_id in link[:2]}
+            )
+            linked = []
+            for habit_id, associated_id, line_number in links:
+                habit, associated_habit = habits[habit_id], habits[associated_id]
+                try:
+                    if associated_habit.owner_id != habit.owner_id:
+                        raise ValidationError({"associated_habit": ["Связанная привычка другого владельца."]})
+                    CheckHabitValidator("associated_habit", "reward", "is_enjoyable")(
+                        {"associated_habit": associated_habit, "reward": habit.reward,
+                         "is_enjoyable": habit.is_enjoyable}
+                    )
+                except ValidationError as error:
+                    self.add_error(line_number, as_serializer_error(error))
+                    continue
+                habit.associated_habit_id = associated_id
+                linked.append(habit)
+
+            with transaction.atomic():
+                Habit.objects.bulk_update(linked, ["associated_habit"])
+            self.linked += len(linked)
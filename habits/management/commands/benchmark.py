@@ -0,0 +1,17 @@
+from django.core.management import BaseCommand
+from django.test.utils import setup_test_environment
+
+from habits.benchmarks import BENCHMARKS
+
+
+class Command(BaseCommand):
+    help = "Запуск сценария нагрузочного тестирования"
+
+    def add_arguments(self, parser):
+        parser.add_argument("scenario", choices=sorted(BENCHMARKS))
+        parser.add_argument("--sizes", nargs="+", type=int, default=[10_000, 100_000, 1_000_000])
+
+    def handle(self, *args, **options):
+        # Тестовое окружение нужно сценариям, которые обращаются к API через тестовый клиент
+        setup_test_environment()
+        BENCHMARKS[options["scenario"]](options["sizes"], self.stdout)
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management import BaseCommand, CommandError
+
+from habits.imports import (
+    IMPORT_BATCH_SIZE,
+    IMPORT_FORMATS,
+    HabitImporter,
+    get_import_format,
+    open_import_file,
+    read_csv,
+    read_ndjson,
+)
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Загрузка привычек из файла NDJSON или CSV (в том числе сжатого gzip)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=IMPORT_FORMATS, help="По умолчанию - по расширению файла")
+        parser.add_argument("--owner", help="email владельца всех привычек, по умолчанию - поле owner строки")
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        owner = None
+        if options["owner"]:
+            owner = User.objects.filter(email=options["owner"]).first()
+            if owner is None:
+                raise CommandError(f"Пользователь {options['owner']} не найден.")
+
+        path = options["path"]
+        read = read_csv if (options["format"] or get_import_format(path)) == "csv" else read_ndjson
+        start = time.perf_counter()
+        try:
+            with open_import_file(path) as file:
+                importer = HabitImporter(owner, options["batch_size"]).run(read(file))
+        except OSError as error:
+            raise CommandError(str(error))
+        seconds = time.perf_counter() - start
+
+        for error in importer.errors:
+            self.stderr.write(f"Строка {error['line']}: {error['errors']}")
+        self.stdout.write(
+            f"Загружено привычек: {importer.created}, связанных: {importer.linked}, "
+            f"ошибок: {importer.error_count}, {seconds:.1f} с ({importer.created / seconds:.0f} в секунду)"
+        )
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:27
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def delete_habit_periodic_tasks(apps, schema_editor):
+    """Напоминания рассылает общая задача, поэтому задачи отдельных привычек больше не нужны."""
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+    PeriodicTasks = apps.get_model("django_celery_beat", "PeriodicTasks")
+
+    deleted, _ = PeriodicTask.objects.filter(
+        task="habits.tasks.send_reminder_with_bot"
+    ).delete()
+    if deleted:
+        # Сигнал планировщику beat перечитать расписание
+        PeriodicTasks.objects.update_or_create(
+            ident=1, defaults={"last_update": timezone.now()}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0003_remove_habit_deadline_habit_date_deadline_and_more"),
+        ("django_celery_beat", "0019_alter_periodictasks_options"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="habit",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["periodicity"],
+                name="habit_active_periodicity_idx",
+            ),
+        ),
+        migrations.RunPython(delete_habit_periodic_tasks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,113 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:29
+
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+# Копия расписания напоминаний на момент миграции: миграция не зависит от дальнейших изменений habits.services
+REMINDER_TIME = time(8)
+
+REMINDER_HOURS_A_FEW_TIMES = {
+    "2 раза в день": (9, 17),
+    "3 раза в день": (8, 14, 19),
+}
+
+REMINDER_WEEKDAYS = {
+    "По понедельникам": 1,
+    "По вторникам": 2,
+    "По средам": 3,
+    "По четвергам": 4,
+    "По пятницам": 5,
+    "По субботам": 6,
+    "По воскресеньям": 7,
+}
+
+
+def get_reminder_times(periodicity, time_deadline=None):
+    """Время суток, в которое отправляются напоминания о привычке."""
+    hours = REMINDER_HOURS_A_FEW_TIMES.get(periodicity)
+
+    if not hours:
+        return [time_deadline or REMINDER_TIME]
+
+    first = datetime.combine(date.min, time_deadline or time(hours[0]))
+    return sorted(
+        (first + timedelta(hours=hour - hours[0])).time() for hour in hours
+    )
+
+
+def get_next_reminder(periodicity, time_deadline, date_deadline, after):
+    """Ближайший после after момент, когда нужно напомнить о привычке."""
+    weekday = REMINDER_WEEKDAYS.get(periodicity)
+
+    day = after.date()
+    if date_deadline and date_deadline > day:
+        day = date_deadline
+
+    times = get_reminder_times(periodicity, time_deadline)
+    while True:
+        if not weekday or day.isoweekday() == weekday:
+            for reminder_time in times:
+                moment = timezone.make_aware(
+                    datetime.combine(day, reminder_time), after.tzinfo
+                )
+                if moment > after:
+                    return moment
+        day += timedelta(days=1)
+
+
+def fill_next_reminder_at(apps, schema_editor):
+    """Расчет следующего напоминания для уже созданных активных привычек с владельцем."""
+    Habit = apps.get_model("habits", "Habit")
+
+    after = timezone.localtime()
+    active = Habit.objects.filter(is_active=True, owner__isnull=False)
+    schedules = active.values_list(
+        "periodicity", "time_deadline", "date_deadline"
+    ).distinct()
+    for periodicity, time_deadline, date_deadline in schedules:
+        active.filter(
+            periodicity=periodicity,
+            time_deadline=time_deadline,
+            date_deadline=date_deadline,
+        ).update(
+            next_reminder_at=get_next_reminder(
+                periodicity, time_deadline, date_deadline, after
+            )
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0004_habit_active_periodicity_idx"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="habit",
+            name="habit_active_periodicity_idx",
+        ),
+        migrations.AddField(
+            model_name="habit",
+            name="next_reminder_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="Момент отправки следующего напоминания о привычке, рассчитывается автоматически",
+                null=True,
+                verbose_name="Следующее напоминание",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="habit",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["next_reminder_at"],
+                name="habit_next_reminder_idx",
+            ),
+        ),
+        migrations.RunPython(fill_next_reminder_at, migrations.RunPython.noop),
+    ]
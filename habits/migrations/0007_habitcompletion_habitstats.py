@@ -0,0 +1,130 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0006_habit_owner_active_idx_habit_public_idx"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HabitStats",
+            fields=[
+                (
+                    "habit",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="habits.habit",
+                        verbose_name="Привычка",
+                    ),
+                ),
+                (
+                    "current_streak",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Текущая серия"
+                    ),
+                ),
+                (
+                    "longest_streak",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Самая длинная серия"
+                    ),
+                ),
+                (
+                    "total_done",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Всего выполнений"
+                    ),
+                ),
+                (
+                    "total_skipped",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Всего пропусков"
+                    ),
+                ),
+                (
+                    "last_date",
+                    models.DateField(
+                        blank=True, null=True, verbose_name="Дата последней отметки"
+                    ),
+                ),
+                (
+                    "last_done_date",
+                    models.DateField(
+                        blank=True, null=True, verbose_name="Дата последнего выполнения"
+                    ),
+                ),
+                (
+                    "recent",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Выполнения за последние дни"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Статистика привычки",
+                "verbose_name_plural": "Статистика привычек",
+            },
+        ),
+        migrations.CreateModel(
+            name="HabitCompletion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="Дата")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("done", "Выполнена"), ("skipped", "Пропущена")],
+                        default="done",
+                        max_length=7,
+                        verbose_name="Статус",
+                    ),
+                ),
+                (
+                    "habit",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="completions",
+                        to="habits.habit",
+                        verbose_name="Привычка",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Отметка о выполнении",
+                "verbose_name_plural": "Отметки о выполнении",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("habit", "date"), name="habit_completion_unique_date"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_daily_stats(apps, schema_editor):
+    """Подсчет статистики по дням для уже сделанных отметок."""
+    HabitCompletion = apps.get_model("habits", "HabitCompletion")
+    UserDailyStats = apps.get_model("habits", "UserDailyStats")
+
+    days = (
+        HabitCompletion.objects.exclude(user=None)
+        .values("user", "date")
+        .annotate(
+            done=Count("id", filter=Q(status="done")),
+            skipped=Count("id", filter=Q(status="skipped")),
+        )
+    )
+    UserDailyStats.objects.bulk_create(
+        (
+            UserDailyStats(user_id=day["user"], date=day["date"], done=day["done"], skipped=day["skipped"])
+            for day in days.iterator()
+        ),
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0007_habitcompletion_habitstats"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserDailyStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="Дата")),
+                (
+                    "done",
+                    models.PositiveIntegerField(default=0, verbose_name="Выполнено"),
+                ),
+                (
+                    "skipped",
+                    models.PositiveIntegerField(default=0, verbose_name="Пропущено"),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_stats",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Статистика пользователя за день",
+                "verbose_name_plural": "Статистика пользователей по дням",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("user", "date"), name="user_daily_stats_unique_date"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(fill_daily_stats, migrations.RunPython.noop),
+    ]
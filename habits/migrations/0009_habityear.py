@@ -0,0 +1,76 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# 366 дней високосного года, копия habits.bitmaps.YEAR_BYTES на момент миграции
+YEAR_BYTES = 46
+
+
+def fill_habit_years(apps, schema_editor):
+    """Перенос выполнений из журнала отметок в битовую историю по годам."""
+    HabitCompletion = apps.get_model("habits", "HabitCompletion")
+    HabitYear = apps.get_model("habits", "HabitYear")
+
+    years = {}
+    done = HabitCompletion.objects.filter(status="done").values_list("habit_id", "date")
+    for habit_id, day in done.iterator():
+        bits = years.setdefault((habit_id, day.year), bytearray(YEAR_BYTES))
+        # Бит дня n года (0 - 1 января) - бит n % 8 байта n // 8, как у set_bit в PostgreSQL
+        index = day.timetuple().tm_yday - 1
+        bits[index // 8] |= 1 << index % 8
+
+    HabitYear.objects.bulk_create(
+        (HabitYear(habit_id=habit_id, year=year, done=bytes(bits)) for (habit_id, year), bits in years.items()),
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0008_userdailystats"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HabitYear",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("year", models.PositiveSmallIntegerField(verbose_name="Год")),
+                (
+                    "done",
+                    models.BinaryField(
+                        max_length=46, verbose_name="Выполнения по дням"
+                    ),
+                ),
+                (
+                    "habit",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="years",
+                        to="habits.habit",
+                        verbose_name="Привычка",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Выполнения привычки за год",
+                "verbose_name_plural": "Выполнения привычек по годам",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("habit", "year"), name="habit_year_unique"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(fill_habit_years, migrations.RunPython.noop),
+    ]
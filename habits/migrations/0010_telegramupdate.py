@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0009_habityear"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TelegramUpdate",
+            fields=[
+                (
+                    "update_id",
+                    models.BigIntegerField(
+                        primary_key=True, serialize=False, verbose_name="ID обновления"
+                    ),
+                ),
+                ("payload", models.JSONField(verbose_name="Обновление")),
+                (
+                    "received_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Получено"),
+                ),
+            ],
+            options={
+                "verbose_name": "Обновление Telegram",
+                "verbose_name_plural": "Обновления Telegram",
+            },
+        ),
+    ]
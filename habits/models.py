@@ -104,10 +104,195 @@ class Habit(models.Model):
         "привычки",
     )
     is_active = models.BooleanField(verbose_name="Признак активности", default=True)
+    next_reminder_at = models.DateTimeField(
+        verbose_name="Следующее напоминание",
+        help_text="Момент отправки следующего напоминания о привычке, рассчитывается автоматически",
+        null=True,
+        blank=True,
+    )
 
     def __str__(self):
         return f"Сегодня нужно {self.action}."
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Публичность на момент загрузки нужна, чтобы заметить, что привычку сделали приватной.
+        # Если поле не загружалось, привычка считается публичной.
+        instance.was_public = instance.__dict__.get("is_public", True)
+        return instance
+
     class Meta:
         verbose_name = "Привычка"
         verbose_name_plural = "Привычки"
+        indexes = [
+            models.Index(
+                fields=["next_reminder_at"],
+                name="habit_next_reminder_idx",
+                condition=models.Q(is_active=True),
+            ),
+            # Список привычек пользователя: отбор по владельцу и сортировка по id для пагинации
+            models.Index(
+                fields=["owner", "id"],
+                name="habit_owner_active_idx",
+                condition=models.Q(is_active=True),
+            ),
+            # Лента публичных привычек, в том числе подсчет их количества без чтения таблицы
+            models.Index(
+                fields=["id"],
+                name="habit_public_idx",
+                condition=models.Q(is_public=True),
+            ),
+        ]
+
+
+class HabitCompletion(models.Model):
+    DONE = "done"
+    SKIPPED = "skipped"
+
+    STATUS_IN_CHOICES = [
+        (DONE, "Выполнена"),
+        (SKIPPED, "Пропущена"),
+    ]
+
+    habit = models.ForeignKey(
+        Habit, on_delete=models.CASCADE, related_name="completions", verbose_name="Привычка"
+    )
+    user = models.ForeignKey(
+        User, on_delete=models.SET_NULL, verbose_name="Пользователь", null=True, blank=True
+    )
+    date = models.DateField(verbose_name="Дата")
+    status = models.CharField(
+        max_length=7, choices=STATUS_IN_CHOICES, default=DONE, verbose_name="Статус"
+    )
+
+    def __str__(self):
+        return f"{self.habit_id}: {self.date} - {self.get_status_display()}"
+
+    class Meta:
+        verbose_name = "Отметка о выполнении"
+        verbose_name_plural = "Отметки о выполнении"
+        constraints = [
+            models.UniqueConstraint(fields=["habit", "date"], name="habit_completion_unique_date"),
+        ]
+
+
+class HabitStats(models.Model):
+    """
+    Статистика выполнения привычки, обновляется при каждой отметке без чтения истории.
+    recent - выполнения за последние дни битами: младший бит - день last_date, следующий - день до него.
+    """
+
+    habit = models.OneToOneField(
+        Habit, on_delete=models.CASCADE, primary_key=True, related_name="stats", verbose_name="Привычка"
+    )
+    current_streak = models.PositiveIntegerField(default=0, verbose_name="Текущая серия")
+    longest_streak = models.PositiveIntegerField(default=0, verbose_name="Самая длинная серия")
+    total_done = models.PositiveIntegerField(default=0, verbose_name="Всего выполнений")
+    total_skipped = models.PositiveIntegerField(default=0, verbose_name="Всего пропусков")
+    last_date = models.DateField(verbose_name="Дата последней отметки", null=True, blank=True)
+    last_done_date = models.DateField(verbose_name="Дата последнего выполнения", null=True, blank=True)
+    recent = models.PositiveIntegerField(default=0, verbose_name="Выполнения за последние дни")
+
+    def __str__(self):
+        return f"{self.habit_id}: серия {self.current_streak}"
+
+    class Meta:
+        verbose_name = "Статистика привычки"
+        verbose_name_plural = "Статистика привычек"
+
+
+class UserDailyStats(models.Model):
+    """ Количество отметок пользователя за день, обновляется при каждой отметке. Основа для аналитики. """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="daily_stats", verbose_name="Пользователь")
+    date = models.DateField(verbose_name="Дата")
+    done = models.PositiveIntegerField(default=0, verbose_name="Выполнено")
+    skipped = models.PositiveIntegerField(default=0, verbose_name="Пропущено")
+
+    def __str__(self):
+        return f"{self.user_id}: {self.date}"
+
+    class Meta:
+        verbose_name = "Статистика пользователя за день"
+        verbose_name_plural = "Статистика пользователей по дням"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "date"], name="user_daily_stats_unique_date"),
+        ]
+
+
+class HabitYear(models.Model):
+    """ Выполнения привычки за год: бит на каждый день года, 46 байт на год. """
+
+    habit = models.ForeignKey(Habit, on_delete=models.CASCADE, related_name="years", verbose_name="Привычка")
+    year = models.PositiveSmallIntegerField(verbose_name="Год")
+    done = models.BinaryField(max_length=46, verbose_name="Выполнения по дням")
+
+    def __str__(self):
+        return f"{self.habit_id}: {self.year}"
+
+    class Meta:
+        verbose_name = "Выполнения привычки за год"
+        verbose_name_plural = "Выполнения привычек по годам"
+        constraints = [
+            models.UniqueConstraint(fields=["habit", "year"], name="habit_year_unique"),
+        ]
+
+
+class TelegramUpdate(models.Model):
+    """ Обновление Telegram, принятое webhook и ожидающее обработки. Обработанные обновления удаляются. """
+
+    update_id = models.BigIntegerField(primary_key=True, verbose_name="ID обновления")
+    payload = models.JSONField(verbose_name="Обновление")
+    received_at = models.DateTimeField(auto_now_add=True, verbose_name="Получено")
+
+    def __str__(self):
+        return f"{self.update_id}"
+
+    class Meta:
+        verbose_name = "Обновление Telegram"
+        verbose_name_plural = "Обновления Telegram"
+
+
+class ReminderDelivery(models.Model):
+    """
+    Исходящее напоминание о привычке. Рассылка записывает напоминания пачками в одной транзакции
+    с переносом next_reminder_at, обработчики отправляют их и отмечают результат.
+    Одно напоминание о привычке в момент slot записывается один раз.
+    """
+
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+
+    STATUS_IN_CHOICES = [
+        (PENDING, "Ожидает отправки"),
+        (SENT, "Отправлено"),
+        (FAILED, "Не отправлено"),
+    ]
+
+    habit = models.ForeignKey(Habit, on_delete=models.CASCADE, related_name="deliveries", verbose_name="Привычка")
+    slot = models.DateTimeField(verbose_name="Момент напоминания")
+    status = models.CharField(max_length=7, choices=STATUS_IN_CHOICES, default=PENDING, verbose_name="Статус")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Попыток отправки")
+    available_at = models.DateTimeField(verbose_name="Следующая попытка")
+    sent_at = models.DateTimeField(verbose_name="Отправлено", null=True, blank=True)
+    error = models.CharField(max_length=255, verbose_name="Ошибка", blank=True, default="")
+
+    def __str__(self):
+        return f"{self.habit_id}: {self.slot} - {self.get_status_display()}"
+
+    class Meta:
+        verbose_name = "Отправка напоминания"
+        verbose_name_plural = "Отправки напоминаний"
+        constraints = [
+            models.UniqueConstraint(fields=["habit", "slot"], name="reminder_delivery_unique_slot"),
+        ]
+        indexes = [
+            # Очередь отправки: ожидающие напоминания по времени следующей попытки
+            models.Index(
+                fields=["available_at", "id"],
+                name="reminder_delivery_pending_idx",
+                condition=models.Q(status="pending"),
+            ),
+        ]
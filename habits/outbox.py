@@ -0,0 +1,189 @@
+"""
+Очередь исходящих напоминаний ReminderDelivery. Рассылка записывает наступившие напоминания пачками
+в транзакции, в которой переносит next_reminder_at, поэтому напоминание не теряется, даже если отправка
+не удалась. Обработчики на любом количестве узлов захватывают напоминания с SKIP LOCKED и арендой:
+захваченное напоминание недоступно другим обработчикам REMINDER_DELIVERY_LEASE секунд, а если обработчик
+упал, не отметив результат, после аренды напоминание отправляется снова - доставка не реже одного раза.
+Пачка ограничена так, чтобы с ограничениями частоты Telegram она успела отправиться за половину аренды.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from habits.models import Habit, ReminderDelivery
+from habits.telegram import send_messages
+
+
+def write_deliveries(rows, delay=0):
+    """
+    Запись пачки напоминаний (id привычки, момент напоминания), отправить которые можно через delay секунд.
+    Напоминание о привычке в тот же момент, записанное раньше, повторно не записывается.
+    """
+    available_at = timezone.now() + timedelta(seconds=delay)
+    ReminderDelivery.objects.bulk_create(
+        [ReminderDelivery(habit_id=habit_id, slot=slot, available_at=available_at) for habit_id, slot in rows],
+        ignore_conflicts=True,
+    )
+
+
+def get_send_limits():
+    """
+    Сколько сообщений всего и сколько в один чат успевает уйти за половину аренды REMINDER_DELIVERY_LEASE
+    при ограничениях частоты TELEGRAM_RATE_LIMIT и TELEGRAM_CHAT_RATE_LIMIT.
+    """
+    window = settings.REMINDER_DELIVERY_LEASE / 2
+    return (
+        max(int(window * settings.TELEGRAM_RATE_LIMIT), 1),
+        max(int(window * settings.TELEGRAM_CHAT_RATE_LIMIT), 1),
+    )
+
+
+def claim_deliveries(limit, now=None):
+    """
+    Захват не больше limit напоминаний, время попытки которых наступило. Строки блокируются с SKIP LOCKED,
+    поэтому параллельные обработчики получают разные напоминания. У захваченных увеличивается счетчик попыток,
+    а следующая попытка откладывается на срок аренды REMINDER_DELIVERY_LEASE. Напоминания, исчерпавшие
+    REMINDER_DELIVERY_MAX_ATTEMPTS попыток, не захватываются.
+    Возвращает кортежи (id, id привычки, номер попытки) захваченных напоминаний.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        rows = list(
+            ReminderDelivery.objects.filter(
+                status=ReminderDelivery.PENDING,
+                available_at__lte=now,
+                attempts__lt=settings.REMINDER_DELIVERY_MAX_ATTEMPTS,
+            )
+            .order_by("available_at", "id")
+            .select_for_update(skip_locked=True)
+            .values_list("id", "habit_id", "attempts")[:limit]
+        )
+        if rows:
+            ReminderDelivery.objects.filter(id__in=[delivery_id for delivery_id, _, _ in rows]).update(
+                attempts=F("attempts") + 1,
+                available_at=now + timedelta(seconds=settings.REMINDER_DELIVERY_LEASE),
+            )
+    return [(delivery_id, habit_id, attempts + 1) for delivery_id, habit_id, attempts in rows]
+
+
+def get_retry_at(attempts, now):
+    """ Момент следующей попытки после attempts неудачных: пауза растет экспоненциально. """
+    return now + timedelta(seconds=settings.REMINDER_DELIVERY_BACKOFF * 2 ** (attempts - 1))
+
+
+class DeliveryBatch:
+    """
+    Отправка захваченной пачки напоминаний и запись результата каждого напоминания.
+    Напоминания в один чат сверх chat_limit не отправляются и возвращаются в очередь без траты попытки.
+    """
+
+    def __init__(self, rows, chat_limit=None):
+        self.rows = rows
+        self.chat_limit = chat_limit or get_send_limits()[1]
+        self.habits = (
+            Habit.objects.filter(id__in={habit_id for _, habit_id, _ in rows}, is_active=True)
+            .select_related("owner")
+            .only("id", "action", "owner__telegram_chat_id")
+            .in_bulk()
+        )
+        self.sent = []
+        self.failed = {}
+        self.deferred = []
+
+    def run(self, send):
+        recipients = []
+        chats = {}
+        for delivery_id, habit_id, _ in self.rows:
+            habit = self.habits.get(habit_id)
+            chat_id = habit.owner.telegram_chat_id if habit and habit.owner else None
+            if habit is None:
+                self.failed[delivery_id] = ("Привычка не найдена или отключена.", False)
+            elif not chat_id:
+                self.failed[delivery_id] = ("У владельца привычки не указан телеграм ID.", False)
+            elif chats.setdefault(chat_id, 0) >= self.chat_limit:
+                self.deferred.append(delivery_id)
+            else:
+                chats[chat_id] += 1
+                recipients.append((delivery_id, chat_id, str(habit)))
+
+        results = send([(chat_id, text) for _, chat_id, text in recipients]) if recipients else []
+        for (delivery_id, _, _), result in zip(recipients, results):
+            if result.ok:
+                self.sent.append(delivery_id)
+            else:
+                self.failed[delivery_id] = (result.error, result.retryable)
+        return self.save()
+
+    def save(self):
+        """
+        Отправленные отмечаются одним запросом, неудачные откладываются до следующей попытки или снимаются,
+        неотправленные из-за ограничения на чат сразу снова доступны.
+        """
+        now = timezone.now()
+        if self.sent:
+            ReminderDelivery.objects.filter(id__in=self.sent).update(
+                status=ReminderDelivery.SENT, sent_at=now, error=""
+            )
+        if self.deferred:
+            ReminderDelivery.objects.filter(id__in=self.deferred).update(
+                attempts=F("attempts") - 1, available_at=now
+            )
+
+        failed = []
+        retried = 0
+        for delivery_id, _, attempts in self.rows:
+            if delivery_id not in self.failed:
+                continue
+            error, retryable = self.failed[delivery_id]
+            delivery = ReminderDelivery(
+                pk=delivery_id, status=ReminderDelivery.FAILED, available_at=now, error=error[:255]
+            )
+            if retryable and attempts < settings.REMINDER_DELIVERY_MAX_ATTEMPTS:
+                delivery.status = ReminderDelivery.PENDING
+                delivery.available_at = get_retry_at(attempts, now)
+                retried += 1
+            failed.append(delivery)
+        if failed:
+            ReminderDelivery.objects.bulk_update(failed, ["status", "available_at", "error"])
+
+        return {"sent": len(self.sent), "retried": retried + len(self.deferred), "failed": len(failed) - retried}
+
+
+def drain_deliveries(send=send_messages, batch_size=None):
+    """
+    Отправка наступивших напоминаний пачками по batch_size штук, пока они есть. Временные ошибки Telegram
+    повторяются с растущей паузой, не больше REMINDER_DELIVERY_MAX_ATTEMPTS попыток.
+    Возвращает отчет: количество отправленных, отложенных до следующей попытки и неотправленных напоминаний.
+    """
+    limit, chat_limit = get_send_limits()
+    batch_size = min(batch_size or settings.REMINDER_DELIVERY_BATCH_SIZE, limit)
+
+    report = {"sent": 0, "retried": 0, "failed": 0}
+    while True:
+        rows = claim_deliveries(batch_size)
+        if rows:
+            for key, count in DeliveryBatch(rows, chat_limit).run(send).items():
+                report[key] += count
+        if len(rows) < batch_size:
+            return report
+
+
+def purge_deliveries(before):
+    """
+    Удаление отправленных и неотправленных напоминаний с моментом раньше before. Напоминания, обработчики
+    которых падали на каждой из REMINDER_DELIVERY_MAX_ATTEMPTS попыток, сначала отмечаются неотправленными.
+    """
+    ReminderDelivery.objects.filter(
+        status=ReminderDelivery.PENDING,
+        available_at__lte=timezone.now(),
+        attempts__gte=settings.REMINDER_DELIVERY_MAX_ATTEMPTS,
+    ).update(status=ReminderDelivery.FAILED, error="Исчерпаны попытки отправки.")
+    return (
+        ReminderDelivery.objects.filter(slot__lt=before)
+        .exclude(status=ReminderDelivery.PENDING)
+        .delete()[0]
+    )
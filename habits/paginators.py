@@ -1,7 +1,46 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class CustomPaginator(PageNumberPagination):
     page_size = 5
     page_size_query_param = "page_size"
     max_page_size = 10
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Без сортировки страницы могут пересекаться
+        if hasattr(queryset, "ordered") and not queryset.ordered:
+            queryset = queryset.order_by("id")
+        return super().paginate_queryset(queryset, request, view)
+
+
+class CustomCursorPaginator(CursorPagination):
+    """
+    Пагинация по курсору: следующая страница выбирается условием id > последнего id предыдущей страницы,
+    поэтому время ответа не зависит от глубины страницы, а общее количество не считается.
+    """
+
+    page_size = 5
+    page_size_query_param = "page_size"
+    max_page_size = 10
+    ordering = "id"
+
+
+class HabitPaginator(CustomPaginator):
+    """
+    Пагинация, выбираемая запросом: по курсору при pagination=cursor или переданном cursor,
+    иначе по номеру страницы.
+    """
+
+    cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if params.get("pagination") == "cursor" or CustomCursorPaginator.cursor_query_param in params:
+            self.cursor_paginator = CustomCursorPaginator()
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -1,6 +1,27 @@
-from rest_framework.serializers import ModelSerializer, SerializerMethodField
+from datetime import date, timedelta
+from functools import cached_property, partial
+from operator import methodcaller
 
-from habits.models import Habit
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import ISO_8601
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.serializers import (
+    DateField,
+    DateTimeField,
+    IntegerField,
+    ListField,
+    ModelSerializer,
+    Serializer,
+    SerializerMethodField,
+    TimeField,
+    ValidationError,
+)
+from rest_framework.settings import api_settings
+
+from habits.models import Habit, HabitCompletion, HabitStats
+from habits.services import get_schedule
+from habits.streaks import get_completion_rate, get_current_streak
 from habits.validators import (
     CheckHabitValidator,
     TimeToCompleteValidator,
@@ -8,7 +29,37 @@ from habits.validators import (
 )
 
 
+def to_pk(value):
+    """ id из данных запроса или None, если значение не похоже на id. """
+    if isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class AssociatedHabitField(PrimaryKeyRelatedField):
+    """
+    Связанная привычка. При проверке пачки привычки берутся из context["associated_habits"],
+    загруженных одним запросом на всю пачку, а не запросом на каждую привычку.
+    """
+
+    def to_internal_value(self, data):
+        associated_habits = self.context.get("associated_habits")
+        if associated_habits is None:
+            return super().to_internal_value(data)
+        if to_pk(data) is None:
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            return associated_habits[to_pk(data)]
+        except KeyError:
+            self.fail("does_not_exist", pk_value=data)
+
+
 class HabitSerializer(ModelSerializer):
+    serializer_related_field = AssociatedHabitField
+
     class Meta:
         model = Habit
         fields = "__all__"
@@ -21,4 +72,167 @@ class HabitSerializer(ModelSerializer):
             TimeToCompleteValidator(time_to_complete="time_to_complete"),
             DateDeadlineValidator(date_deadline="date_deadline"),
         ]
-        extra_kwargs = {"owner": {"read_only": True}}
+        extra_kwargs = {
+            "owner": {"read_only": True},
+            "next_reminder_at": {"read_only": True},
+        }
+
+    def get_fields(self):
+        # Связать можно только привычки владельца: редактируемой привычки или автора запроса при создании
+        fields = super().get_fields()
+        owner_id = self.get_owner_id()
+        if owner_id is not None:
+            fields["associated_habit"].queryset = Habit.objects.filter(owner_id=owner_id)
+        return fields
+
+    def get_owner_id(self):
+        if isinstance(self.instance, Habit):
+            return self.instance.owner_id
+        request = self.context.get("request")
+        if request and request.user.is_authenticated:
+            return request.user.id
+        return None
+
+
+def format_datetime(value, tz):
+    """ Дата и время в ISO 8601 в часовом поясе tz, как в DateTimeField. """
+    value = value.astimezone(tz).isoformat()
+    return value[:-6] + "Z" if value.endswith("+00:00") else value
+
+
+class RowSerializer:
+    """
+    Представление строк queryset.values() для списков без построения моделей и полей сериализатора
+    на каждый объект. Поля и преобразования значений берутся из serializer_class один раз,
+    поэтому результат совпадает с serializer_class(many=True).data.
+    """
+
+    # Поля, значения которых из БД нужно преобразовать, и настройки их формата по умолчанию
+    format_settings = ((DateTimeField, "DATETIME_FORMAT"), (DateField, "DATE_FORMAT"), (TimeField, "TIME_FORMAT"))
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+
+    @cached_property
+    def readable_fields(self):
+        return [field for field in self.serializer_class().fields.values() if not field.write_only]
+
+    @cached_property
+    def fields(self):
+        """ Колонки для queryset.values(): связанные объекты читаются как id. """
+        return tuple(field.field_name for field in self.readable_fields)
+
+    @cached_property
+    def formatted_fields(self):
+        """ Поля дат и времени и их форматы. Значения остальных полей из БД уже готовы для JSON. """
+        formatted = []
+        for field in self.readable_fields:
+            for field_class, setting in self.format_settings:
+                if isinstance(field, field_class):
+                    formatted.append((field, getattr(field, "format", getattr(api_settings, setting))))
+                    break
+        return formatted
+
+    def get_converters(self):
+        """ Преобразования значений. Часовой пояс берется один раз на список, а не на каждое значение. """
+        tz = timezone.get_current_timezone() if settings.USE_TZ else None
+        converters = []
+        for field, output_format in self.formatted_fields:
+            if output_format is None or output_format.lower() != ISO_8601:
+                convert = field.to_representation
+            elif not isinstance(field, DateTimeField):
+                convert = methodcaller("isoformat")
+            elif tz is not None and not hasattr(field, "timezone"):
+                convert = partial(format_datetime, tz=tz)
+            else:
+                convert = field.to_representation
+            converters.append((field.field_name, convert))
+        return converters
+
+    def to_representation(self, rows, fields=None):
+        """
+        Строки .values() с ключами в порядке полей сериализатора, значения преобразуются на месте.
+        fields - поля, выбранные в .values(), если выбраны не все.
+        """
+        converters = self.get_converters()
+        if fields is not None:
+            converters = [(name, convert) for name, convert in converters if name in fields]
+        rows = list(rows)
+        for row in rows:
+            for name, convert in converters:
+                value = row[name]
+                if value is not None:
+                    row[name] = convert(value)
+        return rows
+
+
+habit_rows = RowSerializer(HabitSerializer)
+
+
+class HabitCompletionSerializer(ModelSerializer):
+    class Meta:
+        model = HabitCompletion
+        fields = ("date", "status")
+        extra_kwargs = {"date": {"required": False}}
+
+
+class HabitStatsSerializer(ModelSerializer):
+    """ Статистика привычки на текущую дату: серии и доля выполнений за 7 и 30 дней. """
+
+    current_streak = SerializerMethodField()
+    completion_rate_7 = SerializerMethodField()
+    completion_rate_30 = SerializerMethodField()
+
+    class Meta:
+        model = HabitStats
+        fields = (
+            "habit", "current_streak", "longest_streak", "total_done", "total_skipped", "last_date",
+            "completion_rate_7", "completion_rate_30",
+        )
+
+    def get_period_days(self, stats):
+        return get_schedule(stats.habit.periodicity).period_days
+
+    def get_current_streak(self, stats):
+        return get_current_streak(stats, timezone.localdate(), self.get_period_days(stats))
+
+    def get_completion_rate_7(self, stats):
+        return get_completion_rate(stats, timezone.localdate(), 7, self.get_period_days(stats))
+
+    def get_completion_rate_30(self, stats):
+        return get_completion_rate(stats, timezone.localdate(), 30, self.get_period_days(stats))
+
+
+# Самый длинный период истории выполнений в днях
+HISTORY_MAX_DAYS = 5 * 366
+
+
+class HabitHistoryQuerySerializer(Serializer):
+    """ Период истории выполнений, по умолчанию - последние 365 дней. Период не длиннее пяти лет. """
+
+    start = DateField(required=False)
+    end = DateField(required=False)
+
+    def validate_end(self, value):
+        if value > timezone.localdate():
+            raise ValidationError("Окончание периода не может быть позже сегодняшнего дня.")
+        return value
+
+    def validate(self, attrs):
+        attrs.setdefault("end", timezone.localdate())
+        # Без выхода за date.min, если окончание периода - первый год календаря
+        attrs.setdefault("start", max(attrs["end"], date.min + timedelta(days=364)) - timedelta(days=364))
+        if attrs["start"] > attrs["end"]:
+            raise ValidationError("Начало периода должно быть не позже его окончания.")
+        if (attrs["end"] - attrs["start"]).days >= HISTORY_MAX_DAYS:
+            raise ValidationError(f"Период не может быть длиннее {HISTORY_MAX_DAYS} дней.")
+        return attrs
+
+
+class HabitHistorySerializer(Serializer):
+    """ История выполнений привычки за период. """
+
+    done = IntegerField()
+    streak = IntegerField()
+    longest_streak = IntegerField()
+    days = ListField(child=DateField())
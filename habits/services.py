@@ -1,115 +1,210 @@
-from datetime import datetime, timedelta
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
 
-from django_celery_beat.models import IntervalSchedule, PeriodicTask, CrontabSchedule
-import json
-from config.settings import TELEGRAM_URL, TELEGRAM_BOT_TOKEN
-import requests
-from habits.models import Habit
-
-
-def need_to_send(periodicity):
-    """ Проверка, в какой день недели нужно отправлять уведомление. """
-
-    if periodicity == Habit.MONDAY:
-        return '1'
-    elif periodicity == Habit.TUESDAY:
-        return '2'
-    elif periodicity == Habit.WEDNESDAY:
-        return '3'
-    elif periodicity == Habit.THURSDAY:
-        return '4'
-    elif periodicity == Habit.FRIDAY:
-        return '5'
-    elif periodicity == Habit.SATURDAY:
-        return '6'
-    else:
-        return '0'
-
-
-def send_telegram_message(message, chat_id):
-    params = {
-        "text": message,
-        "chat_id": chat_id
-    }
-    requests.get(f'{TELEGRAM_URL}{TELEGRAM_BOT_TOKEN}/sendMessage', params=params)
-
-
-def set_schedule_every_day(habit_id, periodicity):
-
-    if periodicity == 'Ежедневно':
-        every = 1
-
-    elif periodicity == 'Еженедельно':
-        every = 7
-
-    elif periodicity == 'Каждые 2 дня':
-        every = 2
-
-    elif periodicity == 'Каждые 3 дня':
-        every = 3
+from django.conf import settings
+from django.db.models import DurationField, ExpressionWrapper, F, Value
+from django.utils import timezone
 
-    elif periodicity == 'Каждые 4 дня':
-        every = 4
-
-    schedule, created = IntervalSchedule.objects.get_or_create(
-        every=every,
-        period=IntervalSchedule.DAYS,
-    )
-
-    PeriodicTask.objects.create(
-        interval=schedule,
-        name='Habit Reminder Bot',
-        task='habits.tasks.send_reminder_with_bot',
-        args=json.dumps([habit_id]),
-        kwargs=json.dumps({}),
-        expires=datetime.utcnow() + timedelta(days=1)
+from habits.models import Habit
+from users.models import User
+
+# Поля привычки, от которых зависит расписание напоминаний
+SCHEDULE_FIELDS = {"periodicity", "time_deadline", "date_deadline", "is_active", "owner"}
+
+# Множитель мультипликативного хеширования: сдвиги соседних id владельцев равномерно расходятся по окну
+JITTER_MULTIPLIER = 2654435761
+
+
+@dataclass(frozen=True)
+class ReminderSchedule:
+    """
+    Расписание напоминаний для периодичности привычки.
+    hours - часы напоминаний в течение дня. Если у привычки указано время выполнения, первое напоминание
+    сдвигается на него, остальные - на столько же.
+    every_days - интервал в днях, отсчитывается от последнего напоминания.
+    weekday - день недели напоминания (1 - понедельник, 7 - воскресенье).
+    """
+
+    hours: tuple = (8,)
+    every_days: int = 1
+    weekday: int = None
+
+    @lru_cache(maxsize=1024)
+    def get_times(self, time_deadline=None):
+        """
+        Время суток, в которое отправляются напоминания.
+        Результат кешируется в процессе по определению расписания и времени выполнения привычки: расписание
+        неизменяемо, поэтому другое определение попадает в кеш под другим ключом и сброс кеша не нужен.
+        """
+        first = datetime.combine(date.min, time_deadline or time(self.hours[0]))
+        return tuple(sorted((first + timedelta(hours=hour - self.hours[0])).time() for hour in self.hours))
+
+    def get_next(self, after, time_deadline=None, date_deadline=None, last_reminder=None, tz=None):
+        """
+        Ближайший после after момент напоминания. Напоминания начинаются не раньше даты выполнения привычки.
+        Время напоминаний - местное время часового пояса tz, по умолчанию часового пояса проекта.
+        """
+        after = timezone.localtime(after, tz)
+        day = after.date()
+        if date_deadline and date_deadline > day:
+            day = date_deadline
+        if self.every_days > 1 and last_reminder:
+            day = max(day, timezone.localdate(last_reminder, tz) + timedelta(days=self.every_days))
+
+        times = self.get_times(time_deadline)
+        while True:
+            if not self.weekday or day.isoweekday() == self.weekday:
+                for reminder_time in times:
+                    moment = timezone.make_aware(datetime.combine(day, reminder_time), after.tzinfo)
+                    if moment > after:
+                        return moment
+            day += timedelta(days=1)
+
+    @property
+    def period_days(self):
+        """ Количество дней между выполнениями привычки. """
+        return 7 if self.weekday else self.every_days
+
+
+REMINDER_SCHEDULES = {
+    Habit.EVERY_DAY: ReminderSchedule(),
+    Habit.EVERY_TWO_DAYS: ReminderSchedule(every_days=2),
+    Habit.EVERY_THREE_DAYS: ReminderSchedule(every_days=3),
+    Habit.EVERY_FOUR_DAYS: ReminderSchedule(every_days=4),
+    Habit.EVERY_WEEK: ReminderSchedule(every_days=7),
+    Habit.MONDAY: ReminderSchedule(weekday=1),
+    Habit.TUESDAY: ReminderSchedule(weekday=2),
+    Habit.WEDNESDAY: ReminderSchedule(weekday=3),
+    Habit.THURSDAY: ReminderSchedule(weekday=4),
+    Habit.FRIDAY: ReminderSchedule(weekday=5),
+    Habit.SATURDAY: ReminderSchedule(weekday=6),
+    Habit.SUNDAY: ReminderSchedule(weekday=7),
+    Habit.TWO_TIMES_IN_DAY: ReminderSchedule(hours=(9, 17)),
+    Habit.THREE_TIMES_IN_DAY: ReminderSchedule(hours=(8, 14, 19)),
+}
+
+
+def warm_schedule_cache():
+    """ Заполнение кеша расписаний при запуске, чтобы создание привычки не тратило время на их расчет. """
+    for schedule in REMINDER_SCHEDULES.values():
+        schedule.get_times()
+
+
+def get_schedule(periodicity):
+    try:
+        return REMINDER_SCHEDULES[periodicity]
+    except KeyError:
+        raise ValueError(f"Неизвестная периодичность привычки: {periodicity}")
+
+
+def get_next_reminder(periodicity, time_deadline=None, date_deadline=None, after=None, last_reminder=None, tz=None):
+    """
+    Ближайший после after момент, когда нужно напомнить о привычке, по местному времени часового пояса tz.
+    Для привычек с интервалом в несколько дней следующее напоминание отсчитывается от последнего
+    отправленного last_reminder.
+    """
+    return get_schedule(periodicity).get_next(
+        after or timezone.now(), time_deadline, date_deadline, last_reminder, tz
     )
 
 
-def set_schedule_a_few_time(habit_id, periodicity):
-
-    if periodicity == '2 раза в день':
-        hours = '9,17'
+def get_reminder_jitter(owner_id, window=None):
+    """
+    Сдвиг напоминаний владельца от момента по расписанию: от 0 до window секунд (REMINDER_JITTER_WINDOW).
+    Сдвиг зависит только от id владельца, поэтому привычки пользователя напоминают о себе вместе,
+    а напоминания разных пользователей с одинаковым расписанием расходятся по окну.
+    """
+    window = settings.REMINDER_JITTER_WINDOW if window is None else window
+    if not window or owner_id is None:
+        return timedelta(0)
+    return timedelta(seconds=owner_id * JITTER_MULTIPLIER % window)
 
-    elif periodicity == '3 раза в день':
-        hours = '8,14,19'
 
-    schedule, _ = CrontabSchedule.objects.get_or_create(
-        minute='0',
-        hour=hours,
-        day_of_month='*',
-        month_of_year='*',
-        day_of_week='*',
-        timezone='Europe/Moscow'
+def get_reminder_jitter_expression(window=None):
+    """ Сдвиг get_reminder_jitter в виде выражения БД для массового обновления напоминаний. """
+    window = settings.REMINDER_JITTER_WINDOW if window is None else window
+    return ExpressionWrapper(
+        F("owner_id") * JITTER_MULTIPLIER % window * Value(timedelta(seconds=1)), output_field=DurationField()
     )
 
-    PeriodicTask.objects.update_or_create(
-        name=f'habit_{habit_id}_crontab',
-        crontab=schedule,
-        task='habits.tasks.send_reminder_with_bot',
-        args=json.dumps([habit_id]),
-        enabled=True,
-        one_off=False
-    )
 
-
-def set_schedule_every_weekday(habit_id, periodicity):
-    day_of_week = need_to_send(periodicity)
-
-    schedule, _ = CrontabSchedule.objects.get_or_create(
-        minute='0',
-        hour='8',
-        day_of_month='*',
-        month_of_year='*',
-        day_of_week=day_of_week,
-        timezone='Europe/Moscow'
-    )
-
-    PeriodicTask.objects.update_or_create(
-        name=f'habit_{habit_id}_crontab',
-        crontab=schedule,
-        task='habits.tasks.send_reminder_with_bot',
-        args=json.dumps([habit_id]),
-        enabled=True,
-        one_off=False
-    )
+def get_owner_timezones(habits):
+    """ Часовые пояса владельцев привычек по id: из загруженных владельцев, остальные - одним запросом. """
+    timezones = {}
+    missing = set()
+    for habit in habits:
+        if habit.owner_id is None:
+            continue
+        if Habit.owner.is_cached(habit):
+            timezones[habit.owner_id] = habit.owner.timezone
+        else:
+            missing.add(habit.owner_id)
+
+    missing.difference_update(timezones)
+    if missing:
+        timezones.update(User.objects.filter(id__in=missing).values_list("id", "timezone"))
+    return timezones
+
+
+def schedule_habits(habits, after=None):
+    """
+    Расчет момента следующего напоминания для списка привычек, привычки не сохраняются.
+    Напоминания приходят по местному времени владельца привычки.
+    У неактивной привычки или привычки без владельца напоминания отключаются.
+    Для привычек с одинаковым расписанием и часовым поясом момент рассчитывается один раз,
+    затем сдвигается на get_reminder_jitter владельца.
+    """
+    after = after or timezone.now()
+    timezones = get_owner_timezones(habits)
+    reminders = {}
+
+    for habit in habits:
+        if not habit.is_active or habit.owner_id is None:
+            habit.next_reminder_at = None
+            continue
+
+        key = (habit.periodicity, habit.time_deadline, habit.date_deadline, timezones.get(habit.owner_id))
+        if key not in reminders:
+            reminders[key] = get_next_reminder(*key[:3], after=after, tz=key[3])
+        habit.next_reminder_at = reminders[key] and reminders[key] + get_reminder_jitter(habit.owner_id)
+    return habits
+
+
+def schedule_habit(habit, after=None):
+    """ Расчет момента следующего напоминания о привычке, привычка не сохраняется. """
+    schedule_habits([habit], after)
+    return habit.next_reminder_at
+
+
+def reschedule_habit(habit, changed_fields):
+    """ Пересчет и сохранение напоминания, если изменились поля, от которых зависит расписание. """
+    if SCHEDULE_FIELDS.intersection(changed_fields):
+        schedule_habit(habit)
+        habit.save(update_fields=["next_reminder_at"])
+
+
+def reschedule_owner_habits(owner):
+    """
+    Пересчет напоминаний о привычках владельца после смены часового пояса.
+    Привычки с одинаковым расписанием обновляются одним запросом.
+    """
+    habits = Habit.objects.filter(owner=owner, is_active=True)
+    after = timezone.now()
+    jitter = get_reminder_jitter(owner.pk)
+    for key in habits.order_by().values_list("periodicity", "time_deadline", "date_deadline").distinct():
+        periodicity, time_deadline, date_deadline = key
+        next_reminder_at = get_next_reminder(*key, after=after, tz=owner.timezone)
+        habits.filter(periodicity=periodicity, time_deadline=time_deadline, date_deadline=date_deadline).update(
+            next_reminder_at=next_reminder_at and next_reminder_at + jitter
+        )
+
+
+def unschedule_habits(habits):
+    """ Отключение напоминаний о привычках из queryset одним запросом. """
+    return habits.exclude(next_reminder_at=None).update(next_reminder_at=None)
+
+
+def is_owner(user, habit):
+    """ Проверка, что пользователь - владелец привычки. Владелец сравнивается по id, без запроса к БД. """
+    return user.is_authenticated and habit.owner_id == user.id
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from habits.cache import invalidate_public_habits
+from habits.models import Habit
+
+
+@receiver(post_save, sender=Habit)
+@receiver(post_delete, sender=Habit)
+def invalidate_public_habits_feed(sender, instance, **kwargs):
+    """
+    Сброс кеша ленты, если изменилась публичная привычка или привычку сделали приватной.
+    Незагруженное поле публичности не читается из БД, привычка считается публичной.
+    """
+    is_public = instance.__dict__.get("is_public", True)
+    if is_public or getattr(instance, "was_public", False):
+        invalidate_public_habits()
+    instance.was_public = is_public
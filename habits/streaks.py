@@ -0,0 +1,163 @@
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from habits.bitmaps import mark_day, mark_days
+from habits.models import HabitCompletion, HabitStats, UserDailyStats
+from habits.services import get_schedule
+
+# Количество последних дней, выполнения за которые хранятся в HabitStats.recent
+RECENT_DAYS = 30
+RECENT_MASK = (1 << RECENT_DAYS) - 1
+
+
+def shift_recent(recent, days):
+    """ Сдвиг битов выполнений на days дней вперед, дни старше RECENT_DAYS отбрасываются. """
+    return (recent << days) & RECENT_MASK if days < RECENT_DAYS else 0
+
+
+def apply_completion(stats, day, status, period_days=1):
+    """
+    Учет отметки в статистике привычки за O(1), история отметок не читается.
+    Серия продолжается, если между выполнениями прошло не больше period_days дней, пропуск прерывает серию.
+    Отметки учитываются по порядку дат, поэтому повторная или более ранняя дата не принимается.
+    """
+    if stats.last_date and day <= stats.last_date:
+        raise ValueError("Отметка за эту или более позднюю дату уже есть.")
+
+    recent = shift_recent(stats.recent, (day - stats.last_date).days) if stats.last_date else 0
+    if status == HabitCompletion.DONE:
+        if stats.current_streak and (day - stats.last_done_date).days <= period_days:
+            stats.current_streak += 1
+        else:
+            stats.current_streak = 1
+        stats.longest_streak = max(stats.longest_streak, stats.current_streak)
+        stats.total_done += 1
+        stats.last_done_date = day
+        recent |= 1
+    else:
+        stats.current_streak = 0
+        stats.total_skipped += 1
+
+    stats.recent = recent
+    stats.last_date = day
+    return stats
+
+
+def get_current_streak(stats, today, period_days=1):
+    """ Текущая серия на дату today: серия прервана, если срок следующего выполнения уже прошел. """
+    if stats.last_done_date and (today - stats.last_done_date).days <= period_days:
+        return stats.current_streak
+    return 0
+
+
+def get_completion_rate(stats, today, days, period_days=1):
+    """ Доля выполнений привычки за последние days дней (не больше RECENT_DAYS) от ожидаемого количества. """
+    if not stats.last_date:
+        return 0.0
+    recent = shift_recent(stats.recent, (today - stats.last_date).days)
+    done = (recent & ((1 << days) - 1)).bit_count()
+    expected = -(-days // period_days)
+    return round(min(done / expected, 1.0), 3)
+
+
+def count_daily_completion(user, day, status):
+    """ Увеличение счетчика отметок пользователя за день. Строка дня создается при первой отметке. """
+    field = "done" if status == HabitCompletion.DONE else "skipped"
+    days = UserDailyStats.objects.filter(user=user, date=day)
+    if days.update(**{field: F(field) + 1}):
+        return
+    try:
+        with transaction.atomic():
+            UserDailyStats.objects.create(user=user, date=day, **{field: 1})
+    except IntegrityError:
+        # Строку дня одновременно создала параллельная отметка
+        days.update(**{field: F(field) + 1})
+
+
+def record_completion(habit, day=None, status=HabitCompletion.DONE, user=None):
+    """
+    Сохранение отметки о выполнении привычки и обновление ее статистики, битовой истории
+    и статистики пользователя за день.
+    Строка статистики блокируется, поэтому параллельные отметки одной привычки учитываются по очереди.
+    Возвращает обновленную статистику.
+    """
+    today = timezone.localdate()
+    day = day or today
+    if day > today:
+        raise ValueError("Нельзя отметить выполнение привычки будущей датой.")
+
+    with transaction.atomic():
+        stats, _ = HabitStats.objects.select_for_update().get_or_create(habit=habit)
+        apply_completion(stats, day, status, get_schedule(habit.periodicity).period_days)
+        HabitCompletion.objects.create(habit=habit, user=user, date=day, status=status)
+        stats.save()
+        if status == HabitCompletion.DONE:
+            mark_day(habit, day)
+        if user:
+            count_daily_completion(user, day, status)
+    stats.habit = habit
+    return stats
+
+
+def count_daily_completions(counts, day):
+    """ Увеличение счетчиков выполнений пользователей за день: counts - количество по id пользователя. """
+    UserDailyStats.objects.bulk_create(
+        [UserDailyStats(user_id=user_id, date=day) for user_id in counts], ignore_conflicts=True
+    )
+    groups = {}
+    for user_id, count in counts.items():
+        groups.setdefault(count, []).append(user_id)
+    for count, user_ids in groups.items():
+        UserDailyStats.objects.filter(user_id__in=user_ids, date=day).update(done=F("done") + count)
+
+
+def record_completions(completions, day=None):
+    """
+    Отметка выполнения пачки привычек за день day: completions - пары (привычка, пользователь).
+    Результат тот же, что у record_completion для каждой пары по порядку, но количество запросов
+    не зависит от размера пачки. Возвращает для каждой пары статистику привычки или ValueError,
+    если выполнение за этот день уже отмечено.
+    """
+    day = day or timezone.localdate()
+    habit_ids = {habit.id for habit, _ in completions}
+
+    with transaction.atomic():
+        HabitStats.objects.bulk_create(
+            [HabitStats(habit_id=habit_id) for habit_id in habit_ids], ignore_conflicts=True
+        )
+        # Строки блокируются по порядку id, чтобы параллельные пачки не ждали друг друга по кругу
+        stats = HabitStats.objects.select_for_update().order_by("habit_id").in_bulk(habit_ids)
+
+        results = []
+        created = []
+        daily = Counter()
+        for habit, user in completions:
+            period_days = get_schedule(habit.periodicity).period_days
+            try:
+                apply_completion(stats[habit.id], day, HabitCompletion.DONE, period_days)
+            except ValueError as error:
+                results.append(error)
+                continue
+            results.append(stats[habit.id])
+            created.append(HabitCompletion(habit=habit, user=user, date=day, status=HabitCompletion.DONE))
+            if user:
+                daily[user.pk] += 1
+
+        if created:
+            HabitCompletion.objects.bulk_create(created)
+            # Строки статистики уже есть и заблокированы, вставка с обновлением при конфликте записывает
+            # всю пачку одним запросом без построения CASE для каждой строки, как в bulk_update
+            HabitStats.objects.bulk_create(
+                {completion.habit_id: stats[completion.habit_id] for completion in created}.values(),
+                update_conflicts=True,
+                unique_fields=["habit"],
+                update_fields=[
+                    "current_streak", "longest_streak", "total_done", "last_date", "last_done_date", "recent"
+                ],
+            )
+            mark_days([completion.habit_id for completion in created], day)
+            count_daily_completions(daily, day)
+    return results
@@ -1,13 +1,55 @@
+import logging
+from datetime import timedelta
+
 from celery import shared_task
+from django.conf import settings
+from django.utils import timezone
+
+from habits.bot import process_update_queue
+from habits.dispatch import SendRateLimiter, dispatch_reminders, get_queue_lag, get_reminder_slot
+from habits.outbox import drain_deliveries, purge_deliveries, write_deliveries
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def dispatch_due_reminders():
+    """
+    Периодическая задача, запускаемая каждую минуту.
+    Отбирает привычки, по которым пора отправить напоминание, и записывает напоминания пачками в очередь
+    отправки ReminderDelivery не чаще REMINDER_SEND_RATE напоминаний в секунду.
+    Возвращает отчет: количество поставленных в очередь напоминаний и отставание рассылки в секундах.
+    """
+    dispatched = dispatch_reminders(get_reminder_slot(), write_deliveries, limiter=SendRateLimiter())
+    lag = get_queue_lag()
+    if lag > settings.REMINDER_LAG_WARNING:
+        logger.warning("Рассылка напоминаний отстает на %.0f с", lag)
+    return {"dispatched": dispatched, "lag": lag}
+
 
-from habits.models import Habit
-from habits.services import send_telegram_message
-from users.models import User
+@shared_task
+def send_due_reminders():
+    """
+    Периодическая задача, запускаемая каждые REMINDER_DELIVERY_INTERVAL секунд.
+    Отправляет наступившие напоминания из очереди ReminderDelivery. Задачи на разных узлах
+    и пересекающиеся запуски получают разные напоминания.
+    """
+    return drain_deliveries()
 
 
 @shared_task
-def send_reminder_with_bot(habit_id):
-    """ Отправка напоминания о привычке с помощью телеграм-бота. """
-    habit = Habit.objects.get(id=habit_id)
+def purge_reminder_deliveries():
+    """
+    Ежедневная задача. Удаляет из очереди отправки обработанные напоминания
+    старше REMINDER_DELIVERY_RETENTION дней.
+    """
+    return purge_deliveries(timezone.now() - timedelta(days=settings.REMINDER_DELIVERY_RETENTION))
 
-    send_telegram_message(str(habit), habit.owner.telegram_chat_id)
+
+@shared_task
+def process_telegram_updates():
+    """
+    Периодическая задача, запускаемая каждую секунду.
+    Разбирает пачками обновления Telegram, принятые webhook, и отправляет ответы бота.
+    """
+    return process_update_queue()
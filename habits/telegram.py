@@ -0,0 +1,183 @@
+"""
+Отправка сообщений через Telegram Bot API. Асинхронный клиент отправляет пачку сообщений
+конкурентно в пределах общего ограничения частоты и ограничения на один чат. Клиент один на процесс
+и живет в собственном цикле событий, поэтому соединения сохраняются между пачками, а общее ограничение
+частоты хранится в кеше и действует на все процессы сразу.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass
+
+import httpx
+from django.conf import settings
+
+from habits.dispatch import SendRateLimiter
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SendResult:
+    """ Результат отправки одного сообщения. retryable - ошибка временная, отправку можно повторить позже. """
+
+    chat_id: str
+    ok: bool
+    error: str = ""
+    retryable: bool = False
+
+
+def get_bot_url():
+    return f"{settings.TELEGRAM_URL}{settings.TELEGRAM_BOT_TOKEN}"
+
+
+def get_retry_delay(response, attempt):
+    """
+    Пауза перед повторной отправкой. При ответе 429 Telegram сам сообщает, сколько нужно подождать,
+    в остальных случаях пауза растет экспоненциально.
+    """
+    if response is not None and response.status_code == 429:
+        try:
+            return float(response.json()["parameters"]["retry_after"])
+        except (ValueError, KeyError, TypeError):
+            pass
+    return settings.TELEGRAM_BACKOFF * 2 ** attempt
+
+
+def is_retryable(response):
+    """ Повторять имеет смысл только при превышении лимита и ошибках сервера. """
+    return response.status_code == 429 or response.status_code >= 500
+
+
+def get_error(response):
+    try:
+        return response.json().get("description") or response.reason_phrase
+    except ValueError:
+        return response.reason_phrase
+
+
+class RateLimiter:
+    """
+    Ограничение частоты отправки: не больше rate сообщений в секунду всего и chat_rate сообщений в секунду
+    в один чат. Каждому сообщению резервируется ближайший момент, свободный по обоим ограничениям.
+    Общее ограничение - ведро токенов в кеше, как у рассылки напоминаний, одно на все процессы,
+    ограничение на чат действует внутри процесса.
+    """
+
+    cache_key = "telegram:send_rate"
+
+    def __init__(self, rate, chat_rate):
+        self.bucket = SendRateLimiter(rate=rate, burst=1, cache_key=self.cache_key)
+        self.chat_interval = 1 / chat_rate
+        self.chat_slots = {}
+
+    async def acquire(self, chat_id):
+        now = time.time()
+        chat_slot = max(now, self.chat_slots.get(chat_id, 0.0))
+        slot = chat_slot + self.bucket.take(1, chat_slot)
+        self.chat_slots[chat_id] = slot + self.chat_interval
+
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def forget(self, now):
+        """ Удаление прошедших моментов чатов, чтобы словарь не рос между пачками. """
+        self.chat_slots = {chat_id: slot for chat_id, slot in self.chat_slots.items() if slot > now}
+
+
+class AsyncTelegramClient:
+    """ Асинхронный клиент Telegram для конкурентной отправки пачки сообщений через одну HTTP-сессию. """
+
+    def __init__(self, base_url=None, timeout=None, max_retries=None, rate=None, chat_rate=None, concurrency=None):
+        self.max_retries = settings.TELEGRAM_MAX_RETRIES if max_retries is None else max_retries
+        self.concurrency = concurrency or settings.TELEGRAM_CONCURRENCY
+        self.limiter = RateLimiter(
+            rate or settings.TELEGRAM_RATE_LIMIT, chat_rate or settings.TELEGRAM_CHAT_RATE_LIMIT
+        )
+        self.http = httpx.AsyncClient(
+            base_url=base_url or get_bot_url(),
+            timeout=timeout or settings.TELEGRAM_TIMEOUT,
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.http.aclose()
+
+    async def send_message(self, chat_id, text):
+        error = ""
+        retryable = True
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire(chat_id)
+            response = None
+            try:
+                response = await self.http.post("/sendMessage", json={"chat_id": chat_id, "text": text})
+            except httpx.TransportError as exc:
+                error = str(exc) or exc.__class__.__name__
+            else:
+                if response.is_success:
+                    return SendResult(chat_id, True)
+                error = get_error(response)
+                retryable = is_retryable(response)
+                if not retryable:
+                    break
+
+            if attempt < self.max_retries:
+                await asyncio.sleep(get_retry_delay(response, attempt))
+
+        logger.warning("Не удалось отправить сообщение в чат %s: %s", chat_id, error)
+        return SendResult(chat_id, False, error, retryable)
+
+    async def send_many(self, messages):
+        """
+        Отправка сообщений (chat_id, text). Одновременно выполняется не больше concurrency запросов.
+        Результаты возвращаются в порядке сообщений.
+        """
+        self.limiter.forget(time.time())
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def send(chat_id, text):
+            async with semaphore:
+                return await self.send_message(chat_id, text)
+
+        return await asyncio.gather(*(send(chat_id, text) for chat_id, text in messages))
+
+
+class TelegramSender:
+    """ Асинхронный клиент Telegram в собственном цикле событий в фоновом потоке процесса. """
+
+    def __init__(self, options):
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name="telegram-sender", daemon=True).start()
+        self.client = self.run(self.create_client(options))
+
+    @staticmethod
+    async def create_client(options):
+        return AsyncTelegramClient(**options)
+
+    def run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+
+senders = {}
+
+
+def get_sender(**options):
+    """ Общий для процесса клиент. Для других параметров или настроек Telegram создается отдельный клиент. """
+    key = (
+        tuple(sorted(options.items())), get_bot_url(), settings.TELEGRAM_TIMEOUT, settings.TELEGRAM_MAX_RETRIES,
+        settings.TELEGRAM_RATE_LIMIT, settings.TELEGRAM_CHAT_RATE_LIMIT, settings.TELEGRAM_CONCURRENCY,
+    )
+    if key not in senders:
+        senders[key] = TelegramSender(options)
+    return senders[key]
+
+
+def send_messages(messages, **options):
+    """ Отправка пачки сообщений (chat_id, text) общим для процесса асинхронным клиентом из синхронного кода. """
+    sender = get_sender(**options)
+    return sender.run(sender.client.send_many(messages))
@@ -1,15 +1,66 @@
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import time as timer
+import threading
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.urls import reverse
+from django.utils import timezone
+from django_celery_beat.models import PeriodicTask
 from rest_framework import status
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.test import APITestCase, APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 from unittest.mock import patch, Mock, MagicMock
 from habits import fixtures
-from habits.models import Habit
+from habits.bot import get_link_token, process_update_queue, write_update
+from habits.bitmaps import HabitHistory, count_days, get_longest_run, load_history, mark_day, set_day, test_day
+from habits.dispatch import SendRateLimiter, dispatch_reminders, get_due_habits, get_queue_lag, get_reminder_slot
+from habits.models import (
+    Habit,
+    HabitCompletion,
+    HabitStats,
+    HabitYear,
+    ReminderDelivery,
+    TelegramUpdate,
+    UserDailyStats,
+)
+from habits.serializers import HabitSerializer
+from habits.services import (
+    REMINDER_SCHEDULES,
+    get_next_reminder,
+    get_reminder_jitter,
+    schedule_habit,
+    schedule_habits,
+)
+from habits.streaks import (
+    apply_completion,
+    get_completion_rate,
+    get_current_streak,
+    record_completion,
+    record_completions,
+)
+from habits.tasks import dispatch_due_reminders, process_telegram_updates
+from habits.outbox import DeliveryBatch, claim_deliveries, drain_deliveries, purge_deliveries, write_deliveries
+from habits.telegram import RateLimiter, SendResult, send_messages
 from habits.views import HabitListAPIView, PublicHabitListAPIView, HabitUpdateAPIView, HabitRetrieveAPIView, \
     HabitDestroyAPIView
+from config.metrics import registry
 from users.models import User
-from django.test import RequestFactory
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
 
 class HabitTestCase(APITestCase):
@@ -289,3 +340,1586 @@ class HabitTestCase(APITestCase):
             view.destroy(request)
 
         self.assertEqual(str(ex.exception), "У вас нет прав на удаление этой привычки.")
+
+
+def collect_ids(target):
+    """ enqueue для dispatch_reminders, собирающий id поставленных в очередь привычек в список target. """
+    return lambda rows, delay: target.extend(habit_id for habit_id, _ in rows)
+
+
+@override_settings(REMINDER_JITTER_WINDOW=0)
+class ReminderDispatchTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="ivanov_ivan@mail.ru", telegram_chat_id="546194525")
+        # Воскресенье, 13 июля 2025 года, 22:00
+        self.sunday_evening = timezone.make_aware(datetime(2025, 7, 13, 22, 0))
+        self.daily = self.create_habit(action="Выпить воды", periodicity=Habit.EVERY_DAY)
+        self.monday = self.create_habit(action="Бег", periodicity=Habit.MONDAY)
+        self.tuesday = self.create_habit(action="Йога", periodicity=Habit.TUESDAY)
+        self.twice = self.create_habit(action="Зарядка", periodicity=Habit.TWO_TIMES_IN_DAY)
+        self.inactive = self.create_habit(action="Чтение", periodicity=Habit.EVERY_DAY, is_active=False)
+        self.monday_morning = get_reminder_slot(timezone.make_aware(datetime(2025, 7, 14, 8, 0, 25)))
+
+    def create_habit(self, **fields):
+        habit = Habit(owner=self.user, **fields)
+        schedule_habit(habit, after=self.sunday_evening)
+        habit.save()
+        return habit
+
+    def test_next_reminder(self):
+        """ Проверка расчета момента следующего напоминания. """
+        monday = date(2025, 7, 14)
+
+        def at(day, hour, minute=0):
+            return timezone.make_aware(datetime.combine(day, time(hour, minute)))
+
+        self.assertEqual(self.daily.next_reminder_at, at(monday, 8))
+        self.assertEqual(self.tuesday.next_reminder_at, at(monday + timedelta(days=1), 8))
+        self.assertEqual(self.twice.next_reminder_at, at(monday, 9))
+        self.assertIsNone(self.inactive.next_reminder_at)
+        self.assertEqual(
+            get_next_reminder(Habit.TWO_TIMES_IN_DAY, after=at(monday, 9)), at(monday, 17)
+        )
+        self.assertEqual(
+            get_next_reminder(Habit.EVERY_DAY, time(7, 30), monday + timedelta(days=3), after=at(monday, 9)),
+            at(monday + timedelta(days=3), 7, 30),
+        )
+        self.assertEqual(
+            get_next_reminder(Habit.EVERY_THREE_DAYS, after=at(monday, 8), last_reminder=at(monday, 8)),
+            at(monday + timedelta(days=3), 8),
+        )
+
+    def test_due_habits(self):
+        """ Проверка отбора привычек, напоминание о которых нужно отправить в текущую минуту. """
+        self.assertEqual(self.monday_morning.second, 0)
+        self.assertQuerySetEqual(
+            get_due_habits(self.monday_morning).order_by("id"), [self.daily, self.monday]
+        )
+        self.assertFalse(get_due_habits(self.monday_morning.replace(minute=0) - timedelta(minutes=1)).exists())
+
+    def test_dispatch_advances_reminders(self):
+        """ Проверка переноса напоминания на следующий раз после рассылки. """
+        chunks = []
+
+        dispatch_reminders(self.monday_morning, collect_ids(chunks))
+        dispatch_reminders(self.monday_morning + timedelta(minutes=1), collect_ids(chunks))
+
+        self.assertCountEqual(chunks, [self.daily.pk, self.monday.pk])
+        self.daily.refresh_from_db()
+        self.monday.refresh_from_db()
+        self.assertEqual(self.daily.next_reminder_at, self.monday_morning + timedelta(days=1))
+        self.assertEqual(self.monday.next_reminder_at, self.monday_morning + timedelta(days=7))
+
+    def test_dispatch_in_chunks(self):
+        """ Проверка раскладки наступивших напоминаний по пачкам. """
+        for _ in range(3):
+            self.create_habit(action="Выпить воды", periodicity=Habit.EVERY_DAY)
+        chunks = []
+
+        dispatched = dispatch_reminders(self.monday_morning, lambda rows, delay: chunks.append(rows), chunk_size=2)
+
+        self.assertEqual(dispatched, 5)
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+
+    def test_create_without_periodic_task(self):
+        """ Проверка, что при создании привычки рассчитывается напоминание, а не создается периодическая задача. """
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.post(
+            reverse("habits:habit_create"), {"action": "Убрать комнату", "periodicity": Habit.MONDAY}, format="json"
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNotNone(Habit.objects.get(pk=response.json()["id"]).next_reminder_at)
+        self.assertFalse(PeriodicTask.objects.filter(task="habits.tasks.send_reminder_with_bot").exists())
+
+    def test_deactivate_disables_reminder(self):
+        """ Проверка отключения напоминаний при деактивации привычки. """
+        self.client.force_authenticate(user=self.user)
+
+        self.client.delete(reverse("habits:habit_delete", args=(self.daily.pk,)))
+
+        self.daily.refresh_from_db()
+        self.assertIsNone(self.daily.next_reminder_at)
+        self.assertNotIn(self.daily, get_due_habits(self.monday_morning))
+
+
+@override_settings(TELEGRAM_BACKOFF=0.01, TELEGRAM_BOT_TOKEN="token")
+class TelegramClientTestCase(SimpleTestCase):
+
+    def test_retry_after_rate_limit(self):
+        """ Проверка повторной отправки после ответа 429 с retry_after. """
+        too_many_requests = (429, {"ok": False, "description": "Too Many Requests", "parameters": {"retry_after": 0}})
+
+        with fixtures.FakeTelegramServer([too_many_requests, too_many_requests]) as server:
+            result = send_messages([("1", "Текст")], base_url=server.url)[0]
+
+        self.assertTrue(result.ok)
+        self.assertEqual(len(server.requests), 3)
+
+    def test_no_retry_on_client_error(self):
+        """ Проверка, что ошибки запроса не повторяются. """
+        with fixtures.FakeTelegramServer([(400, {"ok": False, "description": "chat not found"})]) as server:
+            result = send_messages([("1", "Текст")], base_url=server.url)[0]
+
+        self.assertFalse(result.ok)
+        self.assertEqual(result.error, "chat not found")
+        self.assertEqual(len(server.requests), 1)
+
+    def test_send_many_with_chat_rate_limit(self):
+        """ Проверка конкурентной отправки пачки сообщений с ограничением частоты на один чат. """
+        messages = [("1", "Первое"), ("1", "Второе"), ("1", "Третье"), ("2", "Четвертое")]
+
+        with fixtures.FakeTelegramServer([(500, {"ok": False})], delay=0.01) as server:
+            start = timer.perf_counter()
+            results = send_messages(messages, base_url=server.url, rate=1000, chat_rate=20)
+            elapsed = timer.perf_counter() - start
+
+        self.assertEqual([result.chat_id for result in results], ["1", "1", "1", "2"])
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(len(server.requests), 5)
+        self.assertGreaterEqual(elapsed, 0.1)
+
+    def test_connections_between_batches(self):
+        """ Проверка, что пачки отправляются общим для процесса клиентом через те же соединения. """
+        with fixtures.FakeTelegramServer() as server:
+            for text in ("Первое", "Второе", "Третье"):
+                self.assertTrue(send_messages([("1", text)], base_url=server.url, rate=1000)[0].ok)
+
+        self.assertEqual(server.connections, 1)
+
+    def test_shared_rate_limit(self):
+        """ Проверка, что ограничители частоты разных процессов делят одно ведро токенов в кеше. """
+        cache.delete(RateLimiter.cache_key)
+        limiters = [RateLimiter(rate=20, chat_rate=1000) for _ in range(2)]
+
+        async def acquire(limiter):
+            for chat_id in range(5):
+                await limiter.acquire(str(chat_id))
+
+        async def run():
+            await asyncio.gather(*(acquire(limiter) for limiter in limiters))
+
+        start = timer.perf_counter()
+        asyncio.run(run())
+
+        self.assertGreaterEqual(timer.perf_counter() - start, 0.45)
+
+
+class DispatchDueRemindersTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="ivanov_ivan@mail.ru", telegram_chat_id="546194525")
+        self.user_without_chat = User.objects.create(email="test@mail.ru")
+        self.habits = [Habit.objects.create(action=f"Отжаться {number} раз", owner=self.user) for number in range(3)]
+        self.habit_without_chat = Habit.objects.create(action="Выпить воды", owner=self.user_without_chat)
+
+    def test_dispatch_writes_deliveries(self):
+        """ Проверка, что периодическая задача записывает наступившие напоминания в очередь отправки. """
+        cache.clear()
+        Habit.objects.update(next_reminder_at=timezone.now() - timedelta(minutes=5))
+
+        with override_settings(REMINDER_CHUNK_SIZE=3):
+            report = dispatch_due_reminders()
+
+        # Записанные напоминания еще не отправлены, но ждут меньше секунды
+        self.assertEqual(report["dispatched"], 4)
+        self.assertLess(report["lag"], 1)
+        self.assertCountEqual(
+            ReminderDelivery.objects.filter(status=ReminderDelivery.PENDING).values_list("habit_id", flat=True),
+            [habit.pk for habit in self.habits] + [self.habit_without_chat.pk],
+        )
+
+
+@override_settings(REMINDER_JITTER_WINDOW=0)
+class HabitSchedulingTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="ivanov_ivan@mail.ru", telegram_chat_id="546194525")
+        self.client.force_authenticate(user=self.user)
+        self.moment = timezone.make_aware(datetime(2025, 7, 13, 22, 0))
+
+    def test_churn_without_orphans(self):
+        """ Проверка отсутствия лишних напоминаний после массового создания, изменения и удаления привычек. """
+        periodicities = list(REMINDER_SCHEDULES)
+        habits = Habit.objects.bulk_create(
+            schedule_habits(
+                [
+                    Habit(owner=self.user, action="Привычка", periodicity=periodicities[number % len(periodicities)])
+                    for number in range(10_000)
+                ],
+                after=self.moment,
+            )
+        )
+        for habit in habits[::3]:
+            habit.periodicity = Habit.TWO_TIMES_IN_DAY
+            habit.time_deadline = time(7, 30)
+        for habit in habits[1::3]:
+            habit.is_active = False
+        Habit.objects.bulk_update(
+            schedule_habits(habits, after=self.moment),
+            ["periodicity", "time_deadline", "is_active", "next_reminder_at"],
+            batch_size=2000,
+        )
+        Habit.objects.filter(id__in=[habit.pk for habit in habits[2::9]]).delete()
+
+        active = set(Habit.objects.filter(is_active=True).values_list("id", flat=True))
+        dispatched = []
+        slot = self.moment + timedelta(days=8)
+
+        self.assertEqual(dispatch_reminders(slot, collect_ids(dispatched)), len(active))
+        self.assertEqual(dispatch_reminders(slot, collect_ids(dispatched)), 0)
+        self.assertEqual(len(dispatched), len(set(dispatched)))
+        self.assertEqual(set(dispatched), active)
+        self.assertFalse(Habit.objects.filter(is_active=False, next_reminder_at__isnull=False).exists())
+        self.assertFalse(Habit.objects.filter(is_active=True, next_reminder_at__lte=slot).exists())
+        self.assertFalse(PeriodicTask.objects.filter(task="habits.tasks.send_reminder_with_bot").exists())
+
+    def test_reschedule_on_update(self):
+        """ Проверка пересчета напоминания при изменении периодичности и отключения при деактивации. """
+        response = self.client.post(
+            reverse("habits:habit_create"), {"action": "Зарядка", "periodicity": Habit.MONDAY}, format="json"
+        )
+        habit = Habit.objects.get(pk=response.json()["id"])
+        url = reverse("habits:habit_update", args=(habit.pk,))
+
+        self.client.patch(url, {"periodicity": Habit.TWO_TIMES_IN_DAY, "time_deadline": "06:45"}, format="json")
+        habit.refresh_from_db()
+        self.assertIn(timezone.localtime(habit.next_reminder_at).time(), [time(6, 45), time(14, 45)])
+
+        next_reminder_at = habit.next_reminder_at
+        self.client.patch(url, {"action": "Зарядка на балконе"}, format="json")
+        habit.refresh_from_db()
+        self.assertEqual(habit.next_reminder_at, next_reminder_at)
+
+        self.client.patch(url, {"is_active": False}, format="json")
+        habit.refresh_from_db()
+        self.assertIsNone(habit.next_reminder_at)
+
+    def test_create_with_single_query(self):
+        """ Проверка, что привычка вместе с расписанием создается одним запросом к БД. """
+        with self.assertNumQueries(1):
+            response = self.client.post(
+                reverse("habits:habit_create"), {"action": "Зарядка", "periodicity": Habit.FRIDAY}, format="json"
+            )
+
+        habit = Habit.objects.get(pk=response.json()["id"])
+        self.assertEqual(habit.owner, self.user)
+        self.assertEqual(timezone.localtime(habit.next_reminder_at).isoweekday(), 5)
+
+    def test_unschedule_on_user_delete(self):
+        """ Проверка отключения напоминаний о привычках удаленного пользователя. """
+        habit = Habit(owner=self.user, action="Зарядка")
+        schedule_habit(habit)
+        habit.save()
+
+        self.client.delete(reverse("users:user-delete", args=(self.user.pk,)))
+
+        habit.refresh_from_db()
+        self.assertIsNone(habit.owner)
+        self.assertIsNone(habit.next_reminder_at)
+
+    def test_owner_timezone(self):
+        """ Проверка напоминаний по местному времени владельца и пересчета после смены часового пояса. """
+        vladivostok = ZoneInfo("Asia/Vladivostok")
+        self.user.timezone = vladivostok
+        self.user.save()
+        other = User.objects.create(email="other@mail.ru")
+        habits = schedule_habits(
+            [Habit(owner_id=self.user.pk, action="Зарядка"), Habit(owner=other, action="Зарядка")], after=self.moment
+        )
+
+        self.assertEqual(habits[0].next_reminder_at, datetime(2025, 7, 14, 8, 0, tzinfo=vladivostok))
+        self.assertEqual(habits[1].next_reminder_at, timezone.make_aware(datetime(2025, 7, 14, 8, 0)))
+        Habit.objects.bulk_create(habits)
+
+        slot = get_reminder_slot(datetime(2025, 7, 14, 8, 0, tzinfo=vladivostok))
+        dispatch_reminders(slot, lambda rows, delay: None)
+        self.assertEqual(
+            Habit.objects.get(pk=habits[0].pk).next_reminder_at, datetime(2025, 7, 15, 8, 0, tzinfo=vladivostok)
+        )
+
+        response = self.client.patch(
+            reverse("users:user-update", args=(self.user.pk,)), {"timezone": "Europe/Kaliningrad"}, format="json"
+        )
+        self.assertEqual(response.json()["timezone"], "Europe/Kaliningrad")
+        next_reminder_at = Habit.objects.get(pk=habits[0].pk).next_reminder_at
+        self.assertEqual(timezone.localtime(next_reminder_at, ZoneInfo("Europe/Kaliningrad")).time(), time(8, 0))
+        self.assertEqual(Habit.objects.get(pk=habits[1].pk).next_reminder_at, habits[1].next_reminder_at)
+
+        response = self.client.patch(
+            reverse("users:user-update", args=(self.user.pk,)), {"timezone": "Марс/Олимп"}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class ConcurrentDispatchTestCase(TransactionTestCase):
+
+    def test_concurrent_dispatch(self):
+        """ Проверка, что параллельные запуски рассылки не отправляют одно напоминание дважды. """
+        user = User.objects.create(email="ivanov_ivan@mail.ru", telegram_chat_id="546194525")
+        slot = get_reminder_slot()
+        Habit.objects.bulk_create(
+            Habit(owner=user, action="Привычка", next_reminder_at=slot) for _ in range(600)
+        )
+        dispatched = []
+
+        def dispatch():
+            dispatch_reminders(slot, collect_ids(dispatched), chunk_size=50)
+            connection.close()
+
+        threads = [threading.Thread(target=dispatch) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(dispatched), 600)
+        self.assertEqual(len(set(dispatched)), 600)
+
+    def test_concurrent_drain(self):
+        """ Проверка, что параллельные обработчики очереди отправки не отправляют одно напоминание дважды. """
+        user = User.objects.create(email="ivanov_ivan@mail.ru", telegram_chat_id="546194525")
+        slot = get_reminder_slot()
+        habits = Habit.objects.bulk_create(Habit(owner=user, action=f"Привычка {number}") for number in range(600))
+        write_deliveries([(habit.pk, slot) for habit in habits])
+        sent = []
+
+        def send(messages):
+            sent.extend(text for _, text in messages)
+            timer.sleep(0.01)
+            return [SendResult(chat_id, True) for chat_id, _ in messages]
+
+        def drain():
+            drain_deliveries(send, batch_size=50)
+            connection.close()
+
+        threads = [threading.Thread(target=drain) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(sent), 600)
+        self.assertEqual(len(set(sent)), 600)
+        self.assertEqual(ReminderDelivery.objects.filter(status=ReminderDelivery.SENT, attempts=1).count(), 600)
+
+
+@override_settings(REMINDER_JITTER_WINDOW=600)
+class ReminderLoadShapingTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = User.objects.bulk_create(User(email=f"user{index}@mail.ru") for index in range(20))
+        self.habits = Habit.objects.bulk_create(
+            schedule_habits(
+                [Habit(owner=user, action="Выпить воды", periodicity=Habit.EVERY_DAY) for user in self.users],
+                after=timezone.make_aware(datetime(2025, 7, 13, 22, 0)),
+            )
+        )
+        self.morning = timezone.make_aware(datetime(2025, 7, 14, 8, 0))
+
+    def test_jitter(self):
+        """ Проверка, что напоминания владельцев расходятся по окну и сдвиг сохраняется после рассылки. """
+        offsets = [(habit.next_reminder_at - self.morning).total_seconds() for habit in self.habits]
+        self.assertTrue(all(0 <= offset < 600 for offset in offsets))
+        self.assertGreater(len(set(offsets)), 15)
+        self.assertLess(get_due_habits(self.morning).count(), len(self.habits))
+
+        dispatch_reminders(get_reminder_slot(self.morning + timedelta(minutes=10)), lambda rows, delay: None)
+
+        habits = Habit.objects.in_bulk()
+        for habit in self.habits:
+            self.assertEqual(habits[habit.pk].next_reminder_at, habit.next_reminder_at + timedelta(days=1))
+            self.assertEqual(habit.next_reminder_at - self.morning, get_reminder_jitter(habit.owner_id))
+
+    def test_send_rate_limit(self):
+        """ Проверка, что пачки откладываются по ведру токенов, а лишние напоминания ждут следующего запуска. """
+        slot = get_reminder_slot(self.morning + timedelta(minutes=10))
+        limiter = SendRateLimiter(rate=5 / 60, burst=5)
+        chunks = []
+
+        def enqueue(habit_ids, delay):
+            chunks.append((len(habit_ids), round(delay)))
+
+        self.assertEqual(dispatch_reminders(slot, enqueue, chunk_size=5, limiter=limiter), 10)
+        self.assertEqual(chunks, [(5, 0), (5, 60)])
+        self.assertEqual(dispatch_reminders(slot, enqueue, chunk_size=5, limiter=limiter), 0)
+
+        waiting = sorted(habit.next_reminder_at for habit in self.habits)[10]
+        self.assertEqual(get_queue_lag(slot), (slot - waiting).total_seconds())
+        self.assertEqual(get_queue_lag(self.morning - timedelta(minutes=1)), 0)
+
+    def test_concurrent_take(self):
+        """ Проверка, что пересекающиеся резервирования ведра токенов не теряются. """
+        limiter = SendRateLimiter(rate=1, burst=1)
+        now = timer.time()
+        delays = []
+
+        def take():
+            for _ in range(25):
+                delays.append(limiter.take(1, now))
+
+        threads = [threading.Thread(target=take) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(round(delay) for delay in delays), list(range(100)))
+        self.assertEqual(round(limiter.get_delay(1, now)), 100)
+
+
+class ReminderDeliveryTestCase(APITestCase):
+    def setUp(self):
+        self.slot = get_reminder_slot()
+        self.habits = {}
+        for chat_id in ("1", "2", "3", None):
+            user = User.objects.create(email=f"user{chat_id}@mail.ru", telegram_chat_id=chat_id)
+            self.habits[chat_id] = Habit.objects.create(owner=user, action="Выпить воды")
+        write_deliveries([(habit.pk, self.slot) for habit in self.habits.values()])
+
+    def send(self, messages):
+        """ Отправка без Telegram: в чат 2 - постоянная ошибка, в чат 3 - временная. """
+        results = {
+            "1": SendResult("1", True),
+            "2": SendResult("2", False, "chat not found"),
+            "3": SendResult("3", False, "Bad Gateway", retryable=True),
+        }
+        return [results[chat_id] for chat_id, _ in messages]
+
+    def get_delivery(self, chat_id):
+        return ReminderDelivery.objects.get(habit=self.habits[chat_id])
+
+    def test_write_deduplicates(self):
+        """ Проверка, что напоминание о привычке в тот же момент записывается один раз. """
+        write_deliveries([(habit.pk, self.slot) for habit in self.habits.values()], delay=30)
+
+        self.assertEqual(ReminderDelivery.objects.count(), 4)
+        self.assertFalse(claim_deliveries(10, now=self.slot - timedelta(minutes=1)))
+
+    def test_drain(self):
+        """ Проверка отправки: успех, постоянные ошибки и повтор временной ошибки с паузой. """
+        with self.assertNumQueries(7):
+            report = drain_deliveries(self.send)
+
+        self.assertEqual(report, {"sent": 1, "retried": 1, "failed": 2})
+        self.assertEqual(self.get_delivery("1").status, ReminderDelivery.SENT)
+        self.assertIsNotNone(self.get_delivery("1").sent_at)
+        self.assertEqual(self.get_delivery("2").status, ReminderDelivery.FAILED)
+        self.assertEqual(self.get_delivery("2").error, "chat not found")
+        self.assertEqual(self.get_delivery(None).error, "У владельца привычки не указан телеграм ID.")
+        retried = self.get_delivery("3")
+        self.assertEqual(
+            (retried.status, retried.attempts, retried.error), (ReminderDelivery.PENDING, 1, "Bad Gateway")
+        )
+        self.assertGreater(retried.available_at, timezone.now())
+
+        self.assertEqual(drain_deliveries(self.send), {"sent": 0, "retried": 0, "failed": 0})
+        with override_settings(REMINDER_DELIVERY_MAX_ATTEMPTS=2):
+            ReminderDelivery.objects.filter(pk=retried.pk).update(available_at=timezone.now())
+            self.assertEqual(drain_deliveries(self.send), {"sent": 0, "retried": 0, "failed": 1})
+        self.assertEqual(self.get_delivery("3").attempts, 2)
+
+    def test_expired_lease(self):
+        """ Проверка, что напоминание, захваченное упавшим обработчиком, отправляется после окончания аренды. """
+        self.assertEqual(len(claim_deliveries(10)), 4)
+        self.assertEqual(drain_deliveries(self.send)["sent"], 0)
+
+        ReminderDelivery.objects.update(available_at=timezone.now())
+        self.assertEqual(drain_deliveries(self.send)["sent"], 1)
+        self.assertEqual(self.get_delivery("1").attempts, 2)
+
+    def test_chat_limit(self):
+        """ Проверка, что напоминания в один чат сверх ограничения возвращаются в очередь без траты попытки. """
+        habit = Habit.objects.create(owner=self.habits["1"].owner, action="Зарядка")
+        write_deliveries([(habit.pk, self.slot)])
+
+        report = DeliveryBatch(claim_deliveries(10), chat_limit=1).run(self.send)
+
+        self.assertEqual(report, {"sent": 1, "retried": 2, "failed": 2})
+        deferred = ReminderDelivery.objects.get(habit=habit)
+        self.assertEqual((deferred.status, deferred.attempts), (ReminderDelivery.PENDING, 0))
+        self.assertEqual(drain_deliveries(self.send)["sent"], 1)
+
+    @override_settings(REMINDER_DELIVERY_LEASE=4, TELEGRAM_RATE_LIMIT=1)
+    def test_batch_fits_lease(self):
+        """ Проверка, что пачка не больше, чем успевает отправиться за половину аренды. """
+        batches = []
+
+        def send(messages):
+            batches.append(len(messages))
+            return self.send(messages)
+
+        drain_deliveries(send)
+
+        self.assertEqual(batches, [2, 1])
+
+    def test_exhausted_attempts(self):
+        """ Проверка, что напоминание с исчерпанными попытками не захватывается и удаляется при очистке. """
+        ReminderDelivery.objects.update(attempts=settings.REMINDER_DELIVERY_MAX_ATTEMPTS)
+
+        self.assertEqual(claim_deliveries(10), [])
+        self.assertEqual(get_queue_lag(), 0)
+        self.assertEqual(purge_deliveries(self.slot + timedelta(minutes=1)), 4)
+
+    def test_queue_lag(self):
+        """ Проверка, что отставание рассылки учитывает неотправленные напоминания из очереди отправки. """
+        now = timezone.now()
+        Habit.objects.update(next_reminder_at=None)
+        ReminderDelivery.objects.update(available_at=now + timedelta(minutes=1))
+        ReminderDelivery.objects.filter(habit=self.habits["2"]).update(available_at=now - timedelta(minutes=5))
+
+        self.assertEqual(get_queue_lag(now), 300)
+        drain_deliveries(self.send)
+        self.assertEqual(get_queue_lag(now), 0)
+
+    @override_settings(TELEGRAM_BOT_TOKEN="", TELEGRAM_MAX_RETRIES=0, TELEGRAM_RATE_LIMIT=1000)
+    def test_drain_with_telegram(self):
+        """ Проверка, что ответ Telegram с ошибкой сервера считается временной ошибкой. """
+        ReminderDelivery.objects.exclude(habit=self.habits["1"]).delete()
+
+        with fixtures.FakeTelegramServer([(502, {"ok": False, "description": "Bad Gateway"})]) as server:
+            with override_settings(TELEGRAM_URL=server.url):
+                report = drain_deliveries()
+
+        self.assertEqual(report, {"sent": 0, "retried": 1, "failed": 0})
+        self.assertEqual(
+            server.requests, [("/bot/sendMessage", {"chat_id": "1", "text": "Сегодня нужно Выпить воды."})]
+        )
+
+
+class PublicHabitCacheTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="ivanov_ivan@mail.ru")
+        self.habit = Habit.objects.create(action="Полить цветы", owner=self.user, is_public=True)
+        self.url = reverse("habits:public_habits_list")
+
+    def test_cached_page(self):
+        """ Проверка, что повторный запрос ленты не обращается к БД. """
+        response = self.client.get(self.url)
+
+        with self.assertNumQueries(0):
+            cached_response = self.client.get(self.url)
+
+        self.assertEqual(cached_response.status_code, 200)
+        self.assertEqual(cached_response.json(), response.json())
+        self.assertEqual(cached_response["ETag"], response["ETag"])
+
+    def test_not_modified(self):
+        """ Проверка ответа 304 при совпадении ETag. """
+        etag = self.client.get(self.url)["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_invalidate_when_made_private(self):
+        """ Проверка сброса кеша, когда привычку делают приватной. """
+        etag = self.client.get(self.url)["ETag"]
+        self.client.force_authenticate(user=self.user)
+
+        self.client.patch(reverse("habits:habit_update", args=(self.habit.pk,)), {"is_public": False}, format="json")
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["count"], 0)
+
+    def test_private_habit_keeps_cache(self):
+        """ Проверка, что изменение приватной привычки не сбрасывает кеш ленты. """
+        self.client.get(self.url)
+
+        Habit.objects.create(action="Выпить витамины", owner=self.user)
+
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+
+class HabitPaginationTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="ivanov_ivan@mail.ru")
+        Habit.objects.bulk_create(Habit(action=f"Привычка {i}", owner=self.user) for i in range(12))
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("habits:habits_list")
+
+    def test_page_number(self):
+        """ Проверка, что по умолчанию сохраняется пагинация по номеру страницы. """
+        response = self.client.get(self.url, {"page": 3})
+
+        self.assertEqual(response.json()["count"], 12)
+        self.assertEqual(len(response.json()["results"]), 2)
+
+    def test_cursor(self):
+        """ Проверка пагинации по курсору: страницы без общего количества, с переходом вперед и назад. """
+        response = self.client.get(self.url, {"pagination": "cursor"}).json()
+
+        self.assertNotIn("count", response)
+        self.assertIsNone(response["previous"])
+        self.assertEqual(len(response["results"]), 5)
+
+        next_page = self.client.get(response["next"]).json()
+        previous_page = self.client.get(next_page["previous"]).json()
+
+        self.assertEqual(previous_page["results"], response["results"])
+
+    def test_cursor_stable_on_insert(self):
+        """ Проверка, что новые привычки не сдвигают следующую страницу курсора. """
+        first_page = self.client.get(self.url, {"pagination": "cursor"}).json()
+        ids = list(Habit.objects.order_by("id").values_list("id", flat=True))
+
+        Habit.objects.create(action="Новая привычка", owner=self.user)
+        second_page = self.client.get(first_page["next"]).json()
+
+        self.assertEqual([habit["id"] for habit in first_page["results"]], ids[:5])
+        self.assertEqual([habit["id"] for habit in second_page["results"]], ids[5:10])
+
+
+class HabitIndexTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="ivanov_ivan@mail.ru")
+        Habit.objects.bulk_create(
+            Habit(action=f"Привычка {i}", owner=self.user, is_public=i % 2 == 0) for i in range(20)
+        )
+
+    def assertUsesIndex(self, queryset, index_name):
+        """ Проверка по плану запроса, что PostgreSQL читает привычки через индекс. """
+        # На маленькой таблице планировщик выбирает последовательное чтение, поэтому оно отключается
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        self.assertIn(index_name, queryset.explain())
+
+    def test_owner_list_index(self):
+        """ Проверка индекса для списка активных привычек пользователя. """
+        habits = Habit.objects.filter(owner=self.user, is_active=True).order_by("id")
+
+        self.assertUsesIndex(habits[:5], "habit_owner_active_idx")
+        self.assertUsesIndex(habits.filter(id__gt=10)[:5], "habit_owner_active_idx")
+
+    def test_public_feed_index(self):
+        """ Проверка индекса для ленты публичных привычек и подсчета их количества. """
+        habits = Habit.objects.filter(is_public=True)
+
+        self.assertUsesIndex(habits.order_by("id")[:5], "habit_public_idx")
+        self.assertUsesIndex(habits.values_list("id"), "habit_public_idx")
+
+    def test_due_reminders_index(self):
+        """ Проверка индекса для отбора наступивших напоминаний. """
+        habits = get_due_habits(get_reminder_slot()).order_by("next_reminder_at")
+
+        self.assertUsesIndex(habits, "habit_next_reminder_idx")
+
+    def test_list_query_count(self):
+        """ Проверка, что количество запросов списков не зависит от числа привычек. """
+        cache.clear()
+        self.client.force_authenticate(user=self.user)
+
+        with self.assertNumQueries(2):
+            self.client.get(reverse("habits:habits_list"))
+        with self.assertNumQueries(2):
+            self.client.get(reverse("habits:public_habits_list"))
+
+
+class HabitQueryBudgetTestCase(fixtures.QueryBudgetMixin, APITestCase):
+    query_budgets = {
+        "habits:habits_list": 2,
+        "habits:public_habits_list": 2,
+        "habits:habit_create": 1,
+        "habits:habit_detail": 1,
+        "habits:habit_update": 3,
+        "habits:habit_delete": 2,
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="ivanov_ivan@mail.ru")
+        self.habit = Habit.objects.create(action="Полить цветы", owner=self.user, is_public=True)
+        Habit.objects.bulk_create(Habit(action=f"Привычка {i}", owner=self.user) for i in range(10))
+        self.client.force_authenticate(user=self.user)
+
+    def test_list_budgets(self):
+        """ Проверка бюджета запросов списков привычек. """
+        for url_name in ("habits:habits_list", "habits:public_habits_list"):
+            with self.assertQueryBudget(url_name):
+                response = self.client.get(reverse(url_name))
+            self.assertEqual(response.status_code, 200)
+
+    def test_habit_budgets(self):
+        """ Проверка бюджета запросов создания, просмотра, редактирования и удаления привычки. """
+        with self.assertQueryBudget("habits:habit_create"):
+            response = self.client.post(reverse("habits:habit_create"), {"action": "Сделать зарядку"}, format="json")
+        self.assertEqual(response.status_code, 201)
+
+        requests = (
+            ("habits:habit_detail", self.client.get, {}),
+            ("habits:habit_update", self.client.patch, {"periodicity": Habit.MONDAY}),
+            ("habits:habit_delete", self.client.delete, {}),
+        )
+        for url_name, method, data in requests:
+            with self.assertQueryBudget(url_name):
+                response = method(reverse(url_name, args=(self.habit.pk,)), data, format="json")
+            self.assertLess(response.status_code, 300)
+
+
+class QueryMetricsTestCase(APITestCase):
+    def setUp(self):
+        registry.clear()
+        self.user = User.objects.create(email="ivanov_ivan@mail.ru")
+        self.client.force_authenticate(user=self.user)
+
+    @override_settings(DEBUG=True)
+    def test_debug_headers(self):
+        """ Проверка заголовков с количеством запросов и временем в режиме отладки. """
+        response = self.client.get(reverse("habits:habits_list"))
+
+        self.assertEqual(response["X-DB-Queries"], "1")
+        self.assertGreater(float(response["X-DB-Time"]), 0)
+        self.assertIn("X-Serialization-Time", response)
+
+    def test_no_headers_without_debug(self):
+        """ Проверка, что без режима отладки заголовки не добавляются. """
+        response = self.client.get(reverse("habits:habits_list"))
+
+        self.assertNotIn("X-DB-Queries", response)
+
+    def test_metrics_endpoint(self):
+        """ Проверка накопленных метрик, доступных только администратору. """
+        self.client.get(reverse("habits:habits_list"))
+        self.client.get(reverse("habits:habits_list"))
+
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        metrics = self.client.get(reverse("metrics")).json()
+
+        self.assertEqual(metrics["habits:habits_list"]["requests"], 2)
+        self.assertEqual(metrics["habits:habits_list"]["max_queries"], 1)
+
+
+class StreakEngineTestCase(SimpleTestCase):
+    def mark(self, stats, days, status=HabitCompletion.DONE, period_days=1):
+        for day in days:
+            apply_completion(stats, date(2025, 7, day), status, period_days)
+        return stats
+
+    def test_streaks(self):
+        """ Проверка текущей и самой длинной серии при пропусках и перерывах. """
+        stats = self.mark(HabitStats(), [1, 2, 3])
+        self.mark(stats, [4], HabitCompletion.SKIPPED)
+        self.mark(stats, [5, 6])
+
+        self.assertEqual(stats.current_streak, 2)
+        self.assertEqual(stats.longest_streak, 3)
+        self.assertEqual(stats.total_done, 5)
+        self.assertEqual(stats.total_skipped, 1)
+
+        self.mark(stats, [9])
+        self.assertEqual(stats.current_streak, 1)
+        self.assertEqual(get_current_streak(stats, date(2025, 7, 10)), 1)
+        self.assertEqual(get_current_streak(stats, date(2025, 7, 11)), 0)
+
+    def test_streak_with_period(self):
+        """ Проверка, что серия привычки раз в неделю не прерывается между выполнениями. """
+        stats = self.mark(HabitStats(), [1, 8, 15], period_days=7)
+
+        self.assertEqual(stats.current_streak, 3)
+        self.assertEqual(get_current_streak(stats, date(2025, 7, 22), 7), 3)
+        self.assertEqual(get_completion_rate(stats, date(2025, 7, 21), 21, 7), 1.0)
+
+    def test_completion_rate(self):
+        """ Проверка доли выполнений за 7 и 30 дней со сдвигом окна до текущей даты. """
+        stats = self.mark(HabitStats(), range(1, 11))
+
+        self.assertEqual(get_completion_rate(stats, date(2025, 7, 10), 7), 1.0)
+        self.assertEqual(get_completion_rate(stats, date(2025, 7, 10), 30), round(10 / 30, 3))
+        self.assertEqual(get_completion_rate(stats, date(2025, 7, 13), 7), round(4 / 7, 3))
+        self.assertEqual(get_completion_rate(stats, date(2025, 8, 30), 30), 0.0)
+
+    def test_out_of_order(self):
+        """ Проверка, что повторная или более ранняя отметка не принимается. """
+        stats = self.mark(HabitStats(), [5])
+
+        with self.assertRaises(ValueError):
+            self.mark(stats, [5])
+        with self.assertRaises(ValueError):
+            self.mark(stats, [4])
+
+
+class HabitCompletionTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="ivanov_ivan@mail.ru")
+        self.habit = Habit.objects.create(action="Полить цветы", owner=self.user)
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("habits:habit_done", args=(self.habit.pk,))
+
+    def test_mark_done(self):
+        """ Проверка отметок о выполнении и статистики в ответе. """
+        yesterday = timezone.localdate() - timedelta(days=1)
+        self.client.post(self.url, {"date": yesterday.isoformat()}, format="json")
+
+        # Первая отметка за день создает строку статистики пользователя за этот день
+        with self.assertNumQueries(11):
+            response = self.client.post(self.url, format="json")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["current_streak"], 2)
+        self.assertEqual(response.json()["completion_rate_7"], round(2 / 7, 3))
+        self.assertEqual(
+            list(self.habit.completions.values_list("date", "status", "user")),
+            [(yesterday, "done", self.user.pk), (timezone.localdate(), "done", self.user.pk)],
+        )
+
+    def test_mark_twice(self):
+        """ Проверка, что вторая отметка за ту же дату отклоняется. """
+        self.client.post(self.url, format="json")
+        response = self.client.post(self.url, {"status": HabitCompletion.SKIPPED}, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.habit.completions.count(), 1)
+        self.assertEqual(HabitStats.objects.get(habit=self.habit).total_skipped, 0)
+
+    def test_future_date(self):
+        """ Проверка, что нельзя отметить выполнение будущей датой. """
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        response = self.client.post(self.url, {"date": tomorrow.isoformat()}, format="json")
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_mark_foreign_habit(self):
+        """ Проверка, что отметить чужую привычку нельзя. """
+        self.client.force_authenticate(user=User.objects.create(email="other@mail.ru"))
+        response = self.client.post(self.url, format="json")
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_record_completions(self):
+        """ Проверка, что пакетная отметка дает тот же результат, что отметки по одной. """
+        yesterday = timezone.localdate() - timedelta(days=1)
+        habits = [self.habit] + [Habit.objects.create(action=f"Привычка {i}", owner=self.user) for i in range(3)]
+        record_completion(habits[0], yesterday, user=self.user)
+        record_completion(habits[2], yesterday, user=self.user)
+
+        with self.assertNumQueries(10):
+            results = record_completions([(habit, self.user) for habit in habits] + [(habits[1], self.user)])
+
+        self.assertEqual([stats.current_streak for stats in results[:4]], [2, 1, 2, 1])
+        self.assertIsInstance(results[4], ValueError)
+        for habit in habits:
+            stats = HabitStats.objects.get(habit=habit)
+            self.assertEqual((stats.total_done, stats.last_date), (habit.completions.count(), timezone.localdate()))
+            self.assertTrue(load_history(habit, yesterday, timezone.localdate()).test(timezone.localdate()))
+        self.assertEqual(UserDailyStats.objects.get(user=self.user, date=timezone.localdate()).done, 4)
+
+
+class HabitStatsTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="ivanov_ivan@mail.ru")
+        self.other = User.objects.create(email="other@mail.ru")
+        self.today = timezone.localdate()
+        self.habit = Habit.objects.create(action="Полить цветы", owner=self.user, is_public=True)
+        weekly = Habit.objects.create(action="Убрать комнату", owner=self.user, periodicity=Habit.EVERY_WEEK)
+        other_habit = Habit.objects.create(action="Выпить витамины", owner=self.other)
+
+        for offset in (3, 2, 1, 0):
+            record_completion(self.habit, self.today - timedelta(days=offset), user=self.user)
+        record_completion(weekly, self.today - timedelta(days=6), user=self.user)
+        record_completion(weekly, self.today, HabitCompletion.SKIPPED, user=self.user)
+        record_completion(other_habit, self.today - timedelta(days=40), user=self.other)
+        self.url = reverse("habits:habits_stats")
+
+    def test_user_stats(self):
+        """ Проверка статистики пользователя, посчитанной агрегацией в БД. """
+        self.client.force_authenticate(user=self.user)
+
+        with self.assertNumQueries(7):
+            stats = self.client.get(self.url, {"owner": self.other.pk}).json()
+
+        self.assertEqual(stats["habits"]["total"], 2)
+        self.assertEqual(stats["habits"]["public"], 1)
+        self.assertEqual(stats["periodicity"], {Habit.EVERY_DAY: 1, Habit.EVERY_WEEK: 1})
+        self.assertEqual(stats["completions"]["done"], 5)
+        self.assertEqual(stats["completions"]["skipped"], 1)
+        self.assertEqual(sum(day["done"] for day in stats["completions"]["weekdays"].values()), 5)
+        self.assertEqual(stats["completions"]["weekdays"][str(self.today.isoweekday())]["skipped"], 1)
+        self.assertEqual(len(stats["completions"]["daily"]), 30)
+        self.assertEqual(stats["completions"]["daily"][-1], {"date": self.today.isoformat(), "done": 1})
+        self.assertEqual(stats["streaks"]["distribution"]["3-6"], 1)
+        self.assertEqual(stats["streaks"]["distribution"]["0"], 1)
+        self.assertEqual(stats["streaks"]["longest"], 4)
+
+    def test_staff_stats(self):
+        """ Проверка статистики всех пользователей и выбранного пользователя для модератора. """
+        self.other.is_staff = True
+        self.other.save()
+        self.client.force_authenticate(user=self.other)
+
+        all_stats = self.client.get(self.url).json()
+        user_stats = self.client.get(self.url, {"owner": self.user.pk}).json()
+
+        self.assertEqual(all_stats["habits"]["total"], 3)
+        self.assertEqual(all_stats["completions"]["done"], 6)
+        self.assertEqual(user_stats["completions"]["done"], 5)
+        self.assertEqual(self.client.get(self.url, {"owner": "me"}).status_code, 400)
+
+    def test_stats_without_auth(self):
+        """ Проверка, что статистика недоступна без авторизации. """
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+
+class HabitBitmapTestCase(SimpleTestCase):
+    def test_days(self):
+        """ Проверка отметки дня, проверки дня и подсчета дней в диапазоне. """
+        bits = None
+        for day in (date(2024, 1, 1), date(2024, 2, 29), date(2024, 12, 31)):
+            bits = set_day(bits, day)
+
+        self.assertEqual(len(bits), 46)
+        self.assertTrue(test_day(bits, date(2024, 2, 29)))
+        self.assertFalse(test_day(bits, date(2024, 3, 1)))
+        self.assertEqual(count_days(bits, 0, 365), 3)
+        self.assertEqual(count_days(bits, 1, 364), 1)
+
+    def test_streaks(self):
+        """ Проверка серий битовыми операциями, в том числе через границу лет. """
+        history = HabitHistory({})
+        for day in [date(2024, 12, 29) + timedelta(days=offset) for offset in range(5)] + [date(2025, 1, 10)]:
+            history.years[day.year] = set_day(history.years.get(day.year), day)
+
+        self.assertEqual(history.get_streak(date(2025, 1, 2)), 5)
+        self.assertEqual(history.get_streak(date(2025, 1, 10)), 1)
+        self.assertEqual(history.get_streak(date(2025, 1, 11)), 0)
+        self.assertEqual(history.get_longest_streak(), 5)
+        self.assertEqual(history.get_longest_streak(date(2024, 12, 31), date(2025, 1, 31)), 3)
+        self.assertEqual(history.count(date(2024, 12, 30), date(2025, 1, 10)), 5)
+        self.assertEqual(get_longest_run(set_day(None, date(2025, 3, 1))), 1)
+
+    def test_longest_streak_across_years(self):
+        """ Проверка самой длинной серии, которая переходит через границу лет. """
+        history = HabitHistory({})
+        for offset in range(22):
+            day = date(2024, 12, 20) + timedelta(days=offset)
+            history.years[day.year] = set_day(history.years.get(day.year), day)
+
+        self.assertEqual(history.get_longest_streak(), 22)
+        self.assertEqual(history.get_longest_streak(date(2024, 6, 1), date(2025, 6, 1)), 22)
+        self.assertEqual(history.get_longest_streak(date(2025, 1, 1), date(2025, 6, 1)), 10)
+        self.assertEqual(HabitHistory({}).get_longest_streak(), 0)
+        self.assertEqual(
+            list(history.get_days(date(2024, 12, 30), date(2025, 1, 2))),
+            [date(2024, 12, 30), date(2024, 12, 31), date(2025, 1, 1), date(2025, 1, 2)],
+        )
+        self.assertEqual(list(history.get_days(date(2025, 1, 11), date(2026, 1, 1))), [])
+
+
+class HabitHistoryTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="ivanov_ivan@mail.ru")
+        self.habit = Habit.objects.create(action="Полить цветы", owner=self.user)
+        self.client.force_authenticate(user=self.user)
+        self.today = timezone.localdate()
+
+    def test_mark_day_in_database(self):
+        """ Проверка, что отметки дней одного года хранятся в одной строке PostgreSQL с теми же битами. """
+        days = [date(2025, 1, 1), date(2025, 1, 2), date(2025, 6, 15)]
+        for day in days:
+            mark_day(self.habit, day)
+        mark_day(self.habit, date(2025, 1, 2))
+
+        year = HabitYear.objects.get(habit=self.habit)
+        expected = None
+        for day in days:
+            expected = set_day(expected, day)
+        self.assertEqual(bytes(year.done), expected)
+
+    def test_history(self):
+        """ Проверка истории выполнений привычки за период. """
+        for offset in (10, 2, 1, 0):
+            record_completion(self.habit, self.today - timedelta(days=offset), user=self.user)
+
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("habits:habit_history", args=(self.habit.pk,)))
+
+        self.assertEqual(response.json()["done"], 4)
+        self.assertEqual(response.json()["streak"], 3)
+        self.assertEqual(response.json()["days"][-1], self.today.isoformat())
+
+    def test_history_across_years(self):
+        """ Проверка серий истории, начавшихся до периода и в предыдущем году. """
+        for offset in range(22):
+            mark_day(self.habit, date(2024, 12, 20) + timedelta(days=offset))
+
+        url = reverse("habits:habit_history", args=(self.habit.pk,))
+        response = self.client.get(url, {"start": "2025-01-05", "end": "2025-01-10"})
+
+        self.assertEqual(response.json()["done"], 6)
+        self.assertEqual(response.json()["streak"], 22)
+        self.assertEqual(response.json()["longest_streak"], 6)
+        response = self.client.get(url, {"start": "2024-06-01", "end": "2025-06-01"})
+        self.assertEqual(response.json()["longest_streak"], 22)
+
+    def test_history_period_bounds(self):
+        """ Проверка ошибок периода истории в будущем и длиннее пяти лет. """
+        url = reverse("habits:habit_history", args=(self.habit.pk,))
+        for query in ({"end": "9999-12-31"}, {"start": "0001-01-01"}):
+            response = self.client.get(url, query)
+            self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(url, {"end": "0001-01-05"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["days"], [])
+
+    def test_history_of_foreign_habit(self):
+        """ Проверка, что историю чужой непубличной привычки посмотреть нельзя. """
+        self.client.force_authenticate(user=User.objects.create(email="other@mail.ru"))
+        response = self.client.get(reverse("habits:habit_history", args=(self.habit.pk,)))
+
+        self.assertEqual(response.status_code, 403)
+
+
+class HabitBulkTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="ivanov_ivan@mail.ru")
+        self.client.force_authenticate(user=self.user)
+
+    def test_bulk_create(self):
+        """ Проверка создания пачки привычек со связью внутри пачки двумя INSERT. """
+        items = [
+            {"action": "Съесть десерт", "is_enjoyable": True},
+            {"action": "Сделать зарядку", "associated_index": 0, "periodicity": Habit.MONDAY},
+        ] + [{"action": f"Привычка {i}"} for i in range(48)]
+
+        # Два INSERT в одной транзакции
+        with self.assertNumQueries(4):
+            response = self.client.post(reverse("habits:habits_bulk_create"), items, format="json")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Habit.objects.filter(owner=self.user).count(), 50)
+        self.assertFalse(Habit.objects.filter(owner=self.user, next_reminder_at=None).exists())
+        habit = Habit.objects.get(action="Сделать зарядку")
+        self.assertEqual(habit.associated_habit.action, "Съесть десерт")
+        self.assertEqual(response.json()[1]["associated_habit"], habit.associated_habit_id)
+
+    def test_bulk_create_errors(self):
+        """ Проверка ошибок по номерам привычек: при ошибке ничего не создается. """
+        items = [
+            {"action": "Съесть десерт"},
+            {"action": "Сделать зарядку", "associated_index": 0},
+            {"action": "Выпить воды", "time_to_complete": 5},
+            {"action": "Прогулка", "associated_index": 7},
+        ]
+        response = self.client.post(reverse("habits:habits_bulk_create"), items, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error["index"] for error in response.json()["errors"]], [1, 2, 3])
+        self.assertFalse(Habit.objects.exists())
+
+    def test_bulk_boolean_numbers(self):
+        """ Проверка, что true из JSON не принимается за номер привычки в пачке или id привычки. """
+        items = [
+            {"action": "Зарядка"},
+            {"action": "Съесть десерт", "is_enjoyable": True},
+            {"action": "Прогулка", "associated_index": True},
+        ]
+        response = self.client.post(reverse("habits:habits_bulk_create"), items, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["errors"][0]["index"], 2)
+
+        habit = Habit.objects.create(action="Зарядка", owner=self.user)
+        response = self.client.post(reverse("habits:habits_bulk_deactivate"), {"ids": [True]}, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        habit.refresh_from_db()
+        self.assertTrue(habit.is_active)
+
+    def test_bulk_update(self):
+        """ Проверка редактирования пачки с пересчетом напоминаний только при изменении расписания. """
+        habits = [Habit.objects.create(action=f"Привычка {i}", owner=self.user) for i in range(3)]
+        foreign = Habit.objects.create(action="Чужая привычка", owner=User.objects.create(email="other@mail.ru"))
+        url = reverse("habits:habits_bulk_update")
+
+        response = self.client.patch(url, [{"id": foreign.pk, "action": "Моя"}], format="json")
+        self.assertEqual(response.status_code, 400)
+
+        items = [
+            {"id": habits[0].pk, "periodicity": Habit.SUNDAY},
+            {"id": habits[1].pk, "action": "Полить цветы", "is_public": True},
+        ]
+        with self.assertNumQueries(2):
+            response = self.client.patch(url, items, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        habits[0].refresh_from_db()
+        self.assertEqual(habits[0].next_reminder_at.isoweekday(), 7)
+        self.assertEqual(Habit.objects.get(pk=habits[1].pk).action, "Полить цветы")
+
+    def test_bulk_update_with_invalid_id(self):
+        """ Проверка ошибки пачки, в которой id привычки не число. """
+        items = [{"id": [1], "action": "Зарядка"}, {"id": {"a": 1}}, {"id": "abc"}]
+        response = self.client.patch(reverse("habits:habits_bulk_update"), items, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json()["errors"],
+            [{"index": index, "errors": {"id": ["Привычка не найдена."]}} for index in range(3)],
+        )
+
+    def test_bulk_deactivate(self):
+        """ Проверка деактивации пачки привычек и сброса кеша ленты публичных привычек. """
+        habits = [Habit.objects.create(action=f"Привычка {i}", owner=self.user, is_public=True) for i in range(3)]
+        feed = reverse("habits:public_habits_list")
+        etag = self.client.get(feed)["ETag"]
+
+        response = self.client.post(
+            reverse("habits:habits_bulk_deactivate"), {"ids": [habits[0].pk, habits[1].pk]}, format="json"
+        )
+
+        self.assertEqual(response.json(), {"deactivated": 2})
+        self.assertEqual(Habit.objects.filter(is_active=True).count(), 1)
+        self.assertEqual(self.client.get(feed, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class AssociatedHabitValidationTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="ivanov_ivan@mail.ru")
+        self.other = User.objects.create(email="other@mail.ru")
+        self.rewards = [
+            Habit.objects.create(action=f"Награда {i}", owner=self.user, is_enjoyable=True) for i in range(5)
+        ]
+        self.foreign = Habit.objects.create(action="Чужая награда", owner=self.other, is_enjoyable=True)
+        self.client.force_authenticate(user=self.user)
+
+    def test_create_with_foreign_habit(self):
+        """ Проверка, что нельзя связать привычку с чужой привычкой. """
+        response = self.client.post(
+            reverse("habits:habit_create"), {"action": "Зарядка", "associated_habit": self.foreign.pk}, format="json"
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("associated_habit", response.json())
+
+    def test_update_with_foreign_habit(self):
+        """ Проверка, что при редактировании нельзя указать чужую связанную привычку. """
+        habit = Habit.objects.create(action="Зарядка", owner=self.user)
+        response = self.client.patch(
+            reverse("habits:habit_update", args=(habit.pk,)), {"associated_habit": self.foreign.pk}, format="json"
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_associated_in_one_query(self):
+        """ Проверка, что связанные привычки пачки загружаются одним запросом и проверяются без обращений к БД. """
+        items = [
+            {"action": f"Привычка {i}", "associated_habit": self.rewards[i % 5].pk} for i in range(50)
+        ]
+
+        # Загрузка связанных привычек и INSERT в транзакции
+        with self.assertNumQueries(4):
+            response = self.client.post(reverse("habits:habits_bulk_create"), items, format="json")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Habit.objects.filter(associated_habit__in=self.rewards).count(), 50)
+
+    def test_bulk_errors(self):
+        """ Проверка ошибок пачки: чужая привычка, неприятная связанная привычка, время и дата выполнения. """
+        plain = Habit.objects.create(action="Обычная привычка", owner=self.user)
+        items = [
+            {"action": "Зарядка", "associated_habit": self.foreign.pk},
+            {"action": "Прогулка", "associated_habit": plain.pk},
+            {"action": "Выпить воды", "time_to_complete": 5, "date_deadline": "2020-01-01"},
+            {"action": "Чтение", "associated_habit": self.rewards[0].pk},
+        ]
+
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse("habits:habits_bulk_create"), items, format="json")
+
+        errors = {error["index"]: error["errors"] for error in response.json()["errors"]}
+        self.assertEqual(sorted(errors), [0, 1, 2])
+        self.assertIn("associated_habit", errors[0])
+        self.assertEqual(len(errors[2]["non_field_errors"]), 2)
+
+    def test_bulk_update_with_foreign_habit(self):
+        """ Проверка, что при массовом редактировании нельзя указать чужую связанную привычку. """
+        habit = Habit.objects.create(action="Зарядка", owner=self.user)
+        items = [{"id": habit.pk, "associated_habit": self.foreign.pk}]
+        response = self.client.patch(reverse("habits:habits_bulk_update"), items, format="json")
+
+        self.assertEqual(response.status_code, 400)
+
+
+class HabitRowSerializerTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="rows@mail.ru")
+        reward = Habit.objects.create(action="Съесть десерт", owner=self.user, is_enjoyable=True, is_public=True)
+        Habit.objects.create(
+            action="Пробежка", owner=self.user, place="Парк", date_deadline=date(2030, 5, 1),
+            time_deadline=time(7, 30), periodicity="По понедельникам", associated_habit=reward,
+            time_to_complete=90, is_public=True, next_reminder_at=timezone.now(),
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_rows_match_serializer(self):
+        """ Проверка, что списки привычек из .values() совпадают с HabitSerializer. """
+        expected = HabitSerializer(Habit.objects.order_by("id"), many=True).data
+
+        for url in (reverse("habits:habits_list"), reverse("habits:public_habits_list")):
+            response = self.client.get(url)
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["results"], expected)
+
+
+class HabitSparseFieldsTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="sparse@mail.ru")
+        self.habit = Habit.objects.create(
+            action="Пробежка", owner=self.user, place="Парк", time_deadline=time(7, 30), is_public=True
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_list_fields(self):
+        """ Проверка, что список возвращает и читает из БД только выбранные поля. """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("habits:habits_list"), {"fields": "id,action,time_deadline,periodicity"}
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["results"],
+            [{"id": self.habit.pk, "action": "Пробежка", "time_deadline": "07:30:00", "periodicity": "Ежедневно"}],
+        )
+        select = next(query["sql"] for query in queries if '"habits_habit"."action"' in query["sql"])
+        self.assertNotIn('"habits_habit"."place"', select)
+
+    def test_public_list_exclude(self):
+        """ Проверка исключения полей из ленты публичных привычек. """
+        response = self.client.get(reverse("habits:public_habits_list"), {"exclude": "place,reward,owner"})
+
+        self.assertEqual(response.status_code, 200)
+        habit = response.json()["results"][0]
+        self.assertEqual(habit["action"], "Пробежка")
+        self.assertFalse({"place", "reward", "owner"} & set(habit))
+
+    def test_cursor_fields(self):
+        """ Проверка пагинации по курсору, когда среди выбранных полей нет id. """
+        Habit.objects.create(action="Зарядка", owner=self.user, is_public=True)
+        for name in ("habits:habits_list", "habits:public_habits_list"):
+            response = self.client.get(reverse(name), {"pagination": "cursor", "fields": "action", "page_size": 1})
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["results"], [{"action": "Пробежка"}])
+            response = self.client.get(response.json()["next"])
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["results"], [{"action": "Зарядка"}])
+
+    def test_detail_fields(self):
+        """ Проверка выбора полей привычки: колонки для проверки прав читаются без отдельных запросов. """
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("habits:habit_detail", args=(self.habit.pk,)), {"fields": "action"})
+
+        self.assertEqual(response.json(), {"action": "Пробежка"})
+
+    def test_unknown_fields(self):
+        """ Проверка ошибки при выборе несуществующих полей. """
+        response = self.client.get(reverse("habits:habits_list"), {"fields": "action,secret"})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"fields": ["Неизвестные поля: secret."]})
+
+
+class HabitExportTestCase(APITestCase):
+    def setUp(self):
+        self.staff = User.objects.create(email="staff@mail.ru", is_staff=True)
+        self.user = User.objects.create(email="export@mail.ru")
+        Habit.objects.bulk_create(
+            Habit(action=f"Привычка, {i}", owner=self.user, time_deadline=time(8, i)) for i in range(5)
+        )
+        self.client.force_authenticate(user=self.staff)
+
+    def get_export(self, **params):
+        response = self.client.get(reverse("habits:habits_export"), params)
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content)
+
+    def test_ndjson(self):
+        """ Проверка выгрузки NDJSON: привычка на строку в представлении HabitSerializer. """
+        lines = self.get_export().decode().splitlines()
+
+        expected = HabitSerializer(Habit.objects.order_by("id"), many=True).data
+        self.assertEqual([json.loads(line) for line in lines], expected)
+
+    def test_csv_fields(self):
+        """ Проверка выгрузки CSV выбранных полей. """
+        content = self.get_export(output="csv", fields="id,action,time_deadline").decode()
+
+        rows = list(csv.reader(content.splitlines()))
+        self.assertEqual(rows[0], ["id", "time_deadline", "action"])
+        self.assertEqual(rows[1][1:], ["08:00:00", "Привычка, 0"])
+        self.assertEqual(len(rows), 6)
+
+    def test_gzip(self):
+        """ Проверка сжатия выгрузки. """
+        response = self.client.get(reverse("habits:habits_export"), HTTP_ACCEPT_ENCODING="gzip, deflate")
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        content = gzip.decompress(b"".join(response.streaming_content)).decode()
+        self.assertEqual(len(content.splitlines()), 5)
+
+    def test_export_permissions(self):
+        """ Проверка, что выгрузка недоступна обычному пользователю, и ошибки формата. """
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get(reverse("habits:habits_export")).status_code, 403)
+
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.get(reverse("habits:habits_export"), {"output": "xml"})
+        self.assertEqual(response.status_code, 400)
+
+
+class HabitImportTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="import@mail.ru")
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def import_file(self, name, content, **options):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(content)
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command("import_habits", path, stdout=stdout, stderr=stderr, **options)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_import_ndjson(self):
+        """ Проверка загрузки NDJSON: связанная привычка ниже по файлу, расписание и ошибки строк. """
+        rows = [
+            {"id": 10, "action": "Пробежка", "time_deadline": "07:30:00", "associated_habit": 12},
+            {"id": 11, "action": "Долгая привычка", "time_to_complete": 5},
+            {"id": 12, "action": "Съесть десерт", "is_enjoyable": True},
+        ]
+        content = "\n".join(json.dumps(row) for row in rows) + "\nне json\n"
+
+        stdout, stderr = self.import_file("habits.ndjson", content, owner=self.user.email, batch_size=2)
+
+        self.assertIn("Загружено привычек: 2, связанных: 1, ошибок: 2", stdout)
+        self.assertIn("Строка 2", stderr)
+        self.assertIn("Строка 4", stderr)
+        habit = Habit.objects.get(action="Пробежка")
+        self.assertEqual(habit.owner, self.user)
+        self.assertEqual(habit.associated_habit.action, "Съесть десерт")
+        self.assertIsNotNone(habit.next_reminder_at)
+
+    def test_import_export_csv(self):
+        """ Проверка загрузки CSV выгрузки: владельцы из файла, неприятная связанная привычка не проставляется. """
+        first = Habit.objects.create(action="Зарядка", owner=self.user)
+        Habit.objects.create(action="Чтение", owner=self.user, associated_habit=first, is_public=True)
+        staff = User.objects.create(email="staff@mail.ru", is_staff=True)
+        self.client.force_authenticate(user=staff)
+        response = self.client.get(reverse("habits:habits_export"), {"output": "csv"})
+        content = b"".join(response.streaming_content).decode()
+
+        stdout, stderr = self.import_file("habits.csv", content)
+
+        self.assertIn("Загружено привычек: 2, связанных: 0, ошибок: 1", stdout)
+        self.assertIn("приятной", stderr)
+        self.assertEqual(Habit.objects.filter(owner=self.user, action="Чтение", is_public=True).count(), 2)
+
+
+@override_settings(TELEGRAM_WEBHOOK_SECRET="secret")
+class HabitAsyncViewsTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="async@mail.ru", telegram_chat_id="777")
+        self.other = User.objects.create(email="other_async@mail.ru")
+        self.habits = [
+            Habit.objects.create(action=f"Привычка {i}", owner=self.user, time_deadline=time(9, i)) for i in range(7)
+        ]
+        self.private = Habit.objects.create(action="Чужая привычка", owner=self.other)
+        self.headers = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+
+    async def test_list_matches_sync(self):
+        """ Проверка, что async-список совпадает со страницами синхронного списка. """
+        for params in ({}, {"page": 2}, {"page_size": 3, "page": "last"}):
+            response = await self.async_client.get(reverse("habits:habits_list_async"), params, headers=self.headers)
+            expected = await sync_to_async(self.client.get)(
+                reverse("habits:habits_list"), params, headers=self.headers
+            )
+
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            for link in ("next", "previous"):
+                if data[link]:
+                    data[link] = data[link].replace("/async/my/", "/my/")
+            self.assertEqual(data, expected.json())
+
+        response = await self.async_client.get(reverse("habits:habits_list_async"), {"page": 5}, headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_detail_and_create(self):
+        """ Проверка просмотра и создания привычки async-представлениями. """
+        url = reverse("habits:habit_detail_async", args=(self.habits[0].pk,))
+        response = await self.async_client.get(url, headers=self.headers)
+        self.assertEqual(response.json()["action"], "Привычка 0")
+
+        url = reverse("habits:habit_detail_async", args=(self.private.pk,))
+        response = await self.async_client.get(url, headers=self.headers)
+        self.assertEqual(response.status_code, 403)
+
+        url = reverse("habits:habit_create_async")
+        response = await self.async_client.post(
+            url, {"action": "Зарядка", "time_to_complete": 5}, content_type="application/json", headers=self.headers
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("non_field_errors", response.json())
+
+        response = await self.async_client.post(
+            url, {"action": "Зарядка"}, content_type="application/json", headers=self.headers
+        )
+        self.assertEqual(response.status_code, 201)
+        habit = await Habit.objects.aget(pk=response.json()["id"])
+        self.assertEqual(habit.owner_id, self.user.pk)
+        self.assertIsNotNone(habit.next_reminder_at)
+
+    async def test_unauthenticated(self):
+        """ Проверка ответа 401 без токена. """
+        response = await self.async_client.get(reverse("habits:habits_list_async"))
+
+        self.assertEqual(response.status_code, 401)
+        self.assertIn("WWW-Authenticate", response.headers)
+
+    async def test_telegram_webhook(self):
+        """ Проверка записи обновлений webhook в очередь и проверки секрета. """
+        url = reverse("habits:telegram_webhook")
+        headers = {"X-Telegram-Bot-Api-Secret-Token": "secret"}
+
+        def send(update, **kwargs):
+            return self.async_client.post(url, update, content_type="application/json", **kwargs)
+
+        update = {"update_id": 1, "message": {"chat": {"id": 777}, "text": "/habits"}}
+        response = await send(update)
+        self.assertEqual(response.status_code, 403)
+
+        for _ in range(2):
+            response = await send(update, headers=headers)
+            self.assertEqual(response.json(), {})
+        self.assertEqual([item.payload async for item in TelegramUpdate.objects.all()], [update])
+
+        for invalid in ({"message": {}}, {"update_id": True, "message": {}}):
+            response = await send(invalid, headers=headers)
+            self.assertEqual(response.status_code, 400)
+
+
+class TelegramBotTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="bot@mail.ru")
+        self.other = User.objects.create(email="other_bot@mail.ru", telegram_chat_id="100")
+        self.habit = Habit.objects.create(action="Зарядка", owner=self.user, time_deadline=time(8, 0))
+        self.other_habit = Habit.objects.create(action="Чужая привычка", owner=self.other)
+        self.update_id = 0
+
+    def enqueue(self, chat_id=None, text=None, **payload):
+        self.update_id += 1
+        if text is not None:
+            payload["message"] = {"chat": {"id": chat_id}, "text": text}
+        TelegramUpdate.objects.create(update_id=self.update_id, payload={"update_id": self.update_id, **payload})
+
+    def process(self, batch_size=500):
+        replies = []
+        queued = TelegramUpdate.objects.count()
+        self.assertEqual(process_update_queue(replies.extend, batch_size), queued)
+        self.assertFalse(TelegramUpdate.objects.exists())
+        return [text for _, text in replies]
+
+    def test_link_done_stop(self):
+        """ Проверка привязки чата кодом, отметки выполнения и отключения напоминаний. """
+        self.enqueue(100, f"/start {get_link_token(self.user)}")
+        self.enqueue(100, "/habits")
+        self.enqueue(100, f"/done {self.habit.pk}")
+        self.enqueue(100, f"готово {self.habit.pk}")
+
+        replies = self.process(batch_size=3)
+
+        self.assertIn("bot@mail.ru", replies[0])
+        self.assertEqual(replies[1], f"{self.habit.pk}. Зарядка в 08:00")
+        self.assertEqual(replies[2], "Отмечено: Зарядка. Серия: 1.")
+        self.assertIn("уже отмечено", replies[3])
+        self.user.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual(self.user.telegram_chat_id, "100")
+        self.assertIsNone(self.other.telegram_chat_id)
+        self.assertEqual(HabitCompletion.objects.filter(habit=self.habit).count(), 1)
+
+        self.enqueue(100, "/stop")
+        self.enqueue(100, "/habits")
+
+        replies = self.process()
+
+        self.assertIn("отключены", replies[0])
+        self.assertIn("не привязан", replies[1])
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.telegram_chat_id)
+
+    def test_rejected_commands(self):
+        """ Проверка неверного кода привязки, чужой привычки и неизвестной команды. """
+        self.enqueue(200, "/start неверный")
+        self.enqueue(100, f"/done {self.habit.pk}")
+        self.enqueue(100, "/done")
+        self.enqueue(100, "привет")
+        self.enqueue(edited_message={"chat": {"id": 100}, "text": "/habits"})
+
+        replies = self.process()
+
+        self.assertIn("кодом привязки", replies[0])
+        self.assertEqual(replies[1], f"Привычка {self.habit.pk} не найдена.")
+        self.assertIn("Укажите номер", replies[2])
+        self.assertIn("/habits", replies[3])
+        self.assertEqual(len(replies), 4)
+        self.assertFalse(HabitCompletion.objects.exists())
+
+    def test_done_inactive_habit(self):
+        """ Проверка, что выполнение отключенной привычки не отмечается. """
+        Habit.objects.filter(pk=self.other_habit.pk).update(is_active=False)
+        self.enqueue(100, f"/done {self.other_habit.pk}")
+
+        replies = self.process()
+
+        self.assertEqual(replies, [f"Привычка {self.other_habit.pk} не найдена."])
+        self.assertFalse(HabitCompletion.objects.exists())
+
+    def test_batch_queries(self):
+        """ Проверка, что количество запросов на пачку не зависит от количества обновлений. """
+        for chat_id in range(300):
+            self.enqueue(chat_id, "/start")
+
+        with CaptureQueriesContext(connection) as queries:
+            process_update_queue(lambda replies: None)
+
+        # Обновления, пользователи чатов и удаление обработанных, транзакция пачки
+        self.assertEqual(len(queries), 5)
+        self.assertFalse(TelegramUpdate.objects.exists())
+
+    def test_concurrent_updates_written_together(self):
+        """ Проверка, что обновления одновременных запросов webhook записываются одной вставкой. """
+        updates = [{"update_id": update_id, "message": {}} for update_id in range(1, 51)]
+
+        async def receive():
+            await asyncio.gather(*(write_update(update) for update in updates))
+
+        with CaptureQueriesContext(connection) as queries:
+            async_to_sync(receive)()
+
+        inserts = [query for query in queries if query["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), 2)
+        self.assertEqual(TelegramUpdate.objects.count(), 50)
+
+    @override_settings(TELEGRAM_BOT_TOKEN="", TELEGRAM_RATE_LIMIT=1000)
+    def test_task_sends_replies(self):
+        """ Проверка, что задача отправляет ответы бота через Telegram. """
+        self.enqueue(100, "/habits")
+
+        with fixtures.FakeTelegramServer() as server, override_settings(TELEGRAM_URL=server.url):
+            self.assertEqual(process_telegram_updates(), 1)
+
+        message = {"chat_id": "100", "text": f"{self.other_habit.pk}. Чужая привычка"}
+        self.assertEqual(server.requests, [("/bot/sendMessage", message)])
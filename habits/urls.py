@@ -1,10 +1,18 @@
 from django.urls import path
+from .async_views import HabitCreateAsyncView, HabitDetailAsyncView, HabitListAsyncView, TelegramWebhookView
 from .views import (
+    HabitBulkCreateAPIView,
+    HabitBulkDeactivateAPIView,
+    HabitBulkUpdateAPIView,
     HabitListAPIView,
+    HabitCompleteAPIView,
     HabitCreateAPIView,
     HabitUpdateAPIView,
     HabitDestroyAPIView,
+    HabitExportAPIView,
+    HabitHistoryAPIView,
     HabitRetrieveAPIView,
+    HabitStatsAPIView,
     PublicHabitListAPIView,
 )
 from .apps import HabitsConfig
@@ -14,8 +22,19 @@ app_name = HabitsConfig.name
 urlpatterns = [
     path("public/", PublicHabitListAPIView.as_view(), name="public_habits_list"),
     path("my/", HabitListAPIView.as_view(), name="habits_list"),
+    path("stats/", HabitStatsAPIView.as_view(), name="habits_stats"),
+    path("export/", HabitExportAPIView.as_view(), name="habits_export"),
     path("create/", HabitCreateAPIView.as_view(), name="habit_create"),
+    path("async/my/", HabitListAsyncView.as_view(), name="habits_list_async"),
+    path("async/create/", HabitCreateAsyncView.as_view(), name="habit_create_async"),
+    path("async/<int:pk>/detail/", HabitDetailAsyncView.as_view(), name="habit_detail_async"),
+    path("telegram/webhook/", TelegramWebhookView.as_view(), name="telegram_webhook"),
+    path("bulk/create/", HabitBulkCreateAPIView.as_view(), name="habits_bulk_create"),
+    path("bulk/update/", HabitBulkUpdateAPIView.as_view(), name="habits_bulk_update"),
+    path("bulk/deactivate/", HabitBulkDeactivateAPIView.as_view(), name="habits_bulk_deactivate"),
     path("<int:pk>/update/", HabitUpdateAPIView.as_view(), name="habit_update"),
     path("<int:pk>/detail/", HabitRetrieveAPIView.as_view(), name="habit_detail"),
     path("<int:pk>/delete/", HabitDestroyAPIView.as_view(), name="habit_delete"),
+    path("<int:pk>/done/", HabitCompleteAPIView.as_view(), name="habit_done"),
+    path("<int:pk>/history/", HabitHistoryAPIView.as_view(), name="habit_history"),
 ]
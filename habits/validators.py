@@ -43,6 +43,8 @@ class CheckHabitValidator:
 class TimeToCompleteValidator:
     """Проверка времени на выполнение привычки."""
 
+    message = "Время выполнения должно быть не больше 2 минут."
+
     def __init__(self, time_to_complete):
         self.time_to_complete = time_to_complete
 
@@ -53,13 +55,23 @@ class TimeToCompleteValidator:
             return True
 
         if int(time_to_complete) > 2:
-            raise ValidationError("Время выполнения должно быть не больше 2 минут.")
+            raise ValidationError(self.message)
         return True
 
+    def validate_many(self, attrs_by_index):
+        """ Проверка пачки привычек за один проход, возвращает ошибки по номерам привычек. """
+        return {
+            index: self.message
+            for index, attrs in attrs_by_index.items()
+            if attrs.get(self.time_to_complete) and int(attrs[self.time_to_complete]) > 2
+        }
+
 
 class DateDeadlineValidator:
     """Проверка даты на актуальность."""
 
+    message = "Привычка не может быть выполнена задним числом."
+
     def __init__(self, date_deadline):
         self.date_deadline = date_deadline
 
@@ -69,6 +81,38 @@ class DateDeadlineValidator:
         today = date.today()
 
         if date_deadline and date_deadline < today:
-            raise ValidationError("Привычка не может быть выполнена задним числом.")
+            raise ValidationError(self.message)
 
         return True
+
+    def validate_many(self, attrs_by_index):
+        """ Проверка пачки привычек с одной текущей датой, возвращает ошибки по номерам привычек. """
+        today = date.today()
+        return {
+            index: self.message
+            for index, attrs in attrs_by_index.items()
+            if attrs.get(self.date_deadline) and attrs[self.date_deadline] < today
+        }
+
+
+def validate_many(validators, attrs_by_index):
+    """
+    Проверка пачки привычек валидаторами сериализатора после проверки отдельных полей.
+    Валидаторы с методом validate_many проверяют всю пачку за один вызов, остальные - каждую привычку.
+    Связанные привычки к этому моменту уже загружены, поэтому проверка не обращается к БД.
+    Возвращает ошибки по номерам привычек.
+    """
+    errors = {}
+    for validator in validators:
+        if hasattr(validator, "validate_many"):
+            failed = validator.validate_many(attrs_by_index)
+        else:
+            failed = {}
+            for index, attrs in attrs_by_index.items():
+                try:
+                    validator(attrs)
+                except ValidationError as error:
+                    failed[index] = error.detail
+        for index, detail in failed.items():
+            errors.setdefault(index, []).extend(detail if isinstance(detail, list) else [detail])
+    return errors
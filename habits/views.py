@@ -1,5 +1,6 @@
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.generics import (
+    GenericAPIView,
     CreateAPIView,
     UpdateAPIView,
     ListAPIView,
@@ -8,12 +9,58 @@ from rest_framework.generics import (
 )
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from config.projection import SparseFieldsMixin
+from django.core.cache import cache
+from django.http import StreamingHttpResponse
 from django.utils.decorators import method_decorator
+from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
-from habits.models import Habit
-from habits.paginators import CustomPaginator
-from habits.serializers import HabitSerializer
-from habits.services import set_schedule_every_day, set_schedule_a_few_time, set_schedule_every_weekday
+from habits.analytics import get_user_stats
+from habits.bitmaps import load_history
+from habits.bulk import BulkValidationError, create_habits, deactivate_habits, update_habits
+from habits.cache import cache_public_page, get_public_page_key
+from habits.export import EXPORT_FORMATS, export_habits
+from habits.models import Habit, HabitCompletion
+from habits.paginators import HabitPaginator
+from habits.serializers import (
+    HabitCompletionSerializer,
+    HabitHistoryQuerySerializer,
+    HabitHistorySerializer,
+    HabitSerializer,
+    HabitStatsSerializer,
+    habit_rows,
+)
+from habits.services import is_owner, reschedule_habit, schedule_habit
+from habits.streaks import record_completion
+
+
+class HabitRowsListMixin(SparseFieldsMixin):
+    """
+    Список привычек без построения моделей: из БД читаются только колонки полей HabitSerializer
+    (или полей, выбранных параметрами fields и exclude) через .values(),
+    строки страницы переводятся в ответ функцией habit_rows.
+    """
+
+    def list(self, request, *args, **kwargs):
+        fields = self.selected_fields
+        columns = fields or habit_rows.fields
+        if "id" not in columns:
+            # id - ключ сортировки пагинации по курсору, он читается всегда, а в ответ попадает, только если выбран
+            columns = ["id", *columns]
+        queryset = self.filter_queryset(self.get_queryset()).values(*columns)
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_rows(page, fields))
+        return Response(self.get_rows(queryset, fields))
+
+    def get_rows(self, rows, fields):
+        rows = habit_rows.to_representation(rows, fields)
+        if fields is None or "id" in fields:
+            return rows
+        # Строки страницы нужны пагинации по курсору для ссылок, поэтому id удаляется из копий
+        return [{name: value for name, value in row.items() if name != "id"} for row in rows]
 
 
 @method_decorator(
@@ -22,15 +69,20 @@ from habits.services import set_schedule_every_day, set_schedule_a_few_time, set
         operation_summary="Список личных привычек",
     ),
 )
-class HabitListAPIView(ListAPIView):
+class HabitListAPIView(HabitRowsListMixin, ListAPIView):
     """
     Получение списка привычек, созданных текущим пользователем. Требуются авторизация.
     Суперпользователь и модератор могут просматривать весь список привычек.
-    Реализована пагинация по 5 элементов на странице.
+    Реализована пагинация по 5 элементов на странице, с параметром pagination=cursor - пагинация по курсору.
+    Привычки читаются через .values() только нужных колонок, без построения моделей.
+    Параметрами fields и exclude можно выбрать поля ответа, например fields=id,action,time_deadline,periodicity.
+    Фильтр по next_reminder_at__lte / next_reminder_at__gte выбирает привычки, напоминание о которых наступит
+    в заданный промежуток.
     """
 
     serializer_class = HabitSerializer
-    pagination_class = CustomPaginator
+    pagination_class = HabitPaginator
+    filterset_fields = {"next_reminder_at": ["lte", "gte"]}
 
     def get_queryset(self):
         user = self.request.user
@@ -50,19 +102,84 @@ class HabitListAPIView(ListAPIView):
         operation_summary="Список публичных привычек",
     ),
 )
-class PublicHabitListAPIView(ListAPIView):
+class PublicHabitListAPIView(HabitRowsListMixin, ListAPIView):
     """
     Получение списка публичных привычек. Доступно для всех пользователей.
-    Реализована пагинация по 5 элементов на странице.
+    Реализована пагинация по 5 элементов на странице, с параметром pagination=cursor - пагинация по курсору.
+    Параметрами fields и exclude можно выбрать поля ответа.
+    Страницы кешируются до изменения публичных привычек, по заголовку If-None-Match возвращается ответ 304.
     """
 
     serializer_class = HabitSerializer
-    pagination_class = CustomPaginator
+    pagination_class = HabitPaginator
     permission_classes = (AllowAny,)
 
     def get_queryset(self):
         return Habit.objects.filter(is_public=True)
 
+    def list(self, request, *args, **kwargs):
+        key = get_public_page_key(request)
+        cached = cache.get(key)
+
+        if cached is None:
+            response = super().list(request, *args, **kwargs)
+            etag = cache_public_page(key, response.data)
+        else:
+            etag, data = cached
+            response = Response(data)
+
+        if etag in (tag.strip() for tag in request.headers.get("If-None-Match", "").split(",")):
+            return Response(status=304, headers={"ETag": etag})
+        response["ETag"] = etag
+        return response
+
+
+@method_decorator(
+    name="get",
+    decorator=swagger_auto_schema(
+        operation_summary="Выгрузка всех привычек",
+        manual_parameters=[
+            openapi.Parameter(
+                "output", openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=list(EXPORT_FORMATS),
+                description="Формат выгрузки, по умолчанию ndjson",
+            ),
+        ],
+    ),
+)
+class HabitExportAPIView(SparseFieldsMixin, GenericAPIView):
+    """
+    Выгрузка всех привычек одним ответом в формате NDJSON (привычка на строку) или CSV.
+    Доступно только модератору и суперпользователю. Параметрами fields и exclude можно выбрать поля.
+    Привычки читаются курсором на стороне сервера и отдаются потоком, при заголовке Accept-Encoding: gzip
+    ответ сжимается.
+    """
+
+    queryset = Habit.objects.order_by("id")
+    serializer_class = HabitSerializer
+    filterset_fields = {"next_reminder_at": ["lte", "gte"]}
+
+    def get(self, request):
+        user = request.user
+        if not (user.is_staff or user.is_superuser):
+            raise PermissionDenied("Выгрузка привычек доступна только модераторам.")
+
+        export_format = request.query_params.get("output", "ndjson")
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError({"output": f"Доступные форматы: {', '.join(EXPORT_FORMATS)}."})
+        content_type, extension = EXPORT_FORMATS[export_format]
+
+        compress = "gzip" in request.headers.get("Accept-Encoding", "")
+        fields = self.selected_fields or list(habit_rows.fields)
+        response = StreamingHttpResponse(
+            export_habits(self.filter_queryset(self.get_queryset()), fields, export_format, compress),
+            content_type=content_type,
+        )
+        response["Content-Disposition"] = f'attachment; filename="habits.{extension}"'
+        response["Vary"] = "Accept-Encoding"
+        if compress:
+            response["Content-Encoding"] = "gzip"
+        return response
+
 
 @method_decorator(
     name="post",
@@ -73,7 +190,8 @@ class PublicHabitListAPIView(ListAPIView):
 class HabitCreateAPIView(CreateAPIView):
     """
     Создание новой привычки. Требуются авторизация.
-    Параллельно создается периодическая задача в зависимости от указанной периодичности привычки.
+    Момент первого напоминания рассчитывается до сохранения, привычка записывается одним запросом.
+    Напоминания рассылает общая периодическая задача habits.tasks.dispatch_due_reminders.
     """
     queryset = Habit.objects.all()
     serializer_class = HabitSerializer
@@ -81,16 +199,9 @@ class HabitCreateAPIView(CreateAPIView):
     def perform_create(self, serializer):
         if not self.request.user.is_authenticated:
             raise PermissionDenied("Требуется авторизация для создания привычки.")
-        habit = serializer.save()
-        habit.owner = self.request.user
-        habit.save()
-
-        if 'Каждые' in habit.periodicity or 'Еже' in habit.periodicity:
-            set_schedule_every_day(habit.id, habit.periodicity)
-        elif 'раза' in habit.periodicity:
-            set_schedule_a_few_time(habit.id, habit.periodicity)
-        elif 'По' in habit.periodicity:
-            set_schedule_every_weekday(habit.id, habit.periodicity)
+        owner = self.request.user
+        next_reminder_at = schedule_habit(Habit(owner=owner, **serializer.validated_data))
+        serializer.save(owner=owner, next_reminder_at=next_reminder_at)
 
 
 @method_decorator(
@@ -109,17 +220,38 @@ class HabitUpdateAPIView(UpdateAPIView):
     """
     Редактирование информации о привычке.
     Доступ к конкретным привычкам есть только у создателя привычки, модератора и суперпользователя.
+    При изменении периодичности, времени, даты или активности привычки напоминание пересчитывается.
     """
     queryset = Habit.objects.all()
     serializer_class = HabitSerializer
 
     def perform_update(self, serializer):
         user = self.request.user
-        habit = self.get_object()
+        habit = serializer.instance
 
-        if not (user == habit.owner or user.is_staff or user.is_superuser):
+        if is_owner(user, habit):
+            # Часовой пояс владельца для пересчета напоминания берется у текущего пользователя без запроса
+            habit.owner = user
+        elif not (user.is_staff or user.is_superuser):
             raise PermissionDenied("У Вас нет прав редактировать эту привычку.")
         serializer.save()
+        reschedule_habit(serializer.instance, serializer.validated_data)
+
+
+class HabitViewAccessMixin:
+    """ Доступ к просмотру привычки: публичная привычка видна всем, непубличная - создателю и модераторам. """
+
+    def get_object(self):
+        obj = super().get_object()
+
+        if not (obj.is_public or
+                is_owner(self.request.user, obj) or
+                self.request.user.is_staff or
+                self.request.user.is_superuser):
+            raise PermissionDenied(
+                "У Вас нет прав просматривать информацию об этой привычке."
+            )
+        return obj
 
 
 @method_decorator(
@@ -128,26 +260,17 @@ class HabitUpdateAPIView(UpdateAPIView):
         operation_summary="Просмотр привычки",
     ),
 )
-class HabitRetrieveAPIView(RetrieveAPIView):
+class HabitRetrieveAPIView(HabitViewAccessMixin, SparseFieldsMixin, RetrieveAPIView):
     """
     Просмотр детальной информации о привычке.
     Неавторизованный пользователь может просматривать только публичные привычки.
     Непубличную привычку может просматривать только создатель, модератор и суперпользователь.
+    Параметрами fields и exclude можно выбрать поля ответа.
     """
     queryset = Habit.objects.all()
     serializer_class = HabitSerializer
-
-    def get_object(self):
-        obj = super().get_object()
-
-        if not (obj.is_public or
-                obj.owner == self.request.user or
-                self.request.user.is_staff or
-                self.request.user.is_superuser):
-            raise PermissionDenied(
-                "У Вас нет прав просматривать информацию об этой привычке."
-            )
-        return obj
+    # Поля для проверки прав на просмотр
+    projection_fields = ("owner", "is_public")
 
 
 @method_decorator(
@@ -171,9 +294,191 @@ class HabitDestroyAPIView(DestroyAPIView):
             instance.delete()
             return Response(status=204)
 
-        elif request.user != instance.owner:
+        elif not is_owner(request.user, instance):
             raise PermissionDenied("У вас нет прав на удаление этой привычки.")
 
+        instance.owner = request.user
         instance.is_active = False
-        instance.save(update_fields=['is_active'])
+        schedule_habit(instance)
+        instance.save(update_fields=['is_active', 'next_reminder_at'])
         return Response(status=204)
+
+
+@method_decorator(
+    name="post",
+    decorator=swagger_auto_schema(
+        operation_summary="Отметка о выполнении привычки",
+        responses={201: HabitStatsSerializer()},
+    ),
+)
+class HabitCompleteAPIView(GenericAPIView):
+    """
+    Отметка о выполнении или пропуске привычки. Доступно только создателю привычки.
+    По умолчанию отмечается выполнение за сегодня. В ответе - обновленная статистика привычки.
+    """
+
+    queryset = Habit.objects.all()
+    serializer_class = HabitCompletionSerializer
+
+    def post(self, request, *args, **kwargs):
+        habit = self.get_object()
+        if not is_owner(request.user, habit):
+            raise PermissionDenied("Отмечать выполнение может только создатель привычки.")
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            stats = record_completion(
+                habit,
+                serializer.validated_data.get("date"),
+                serializer.validated_data.get("status", HabitCompletion.DONE),
+                user=request.user,
+            )
+        except ValueError as error:
+            raise ValidationError(str(error))
+        return Response(HabitStatsSerializer(stats).data, status=201)
+
+
+@method_decorator(
+    name="get",
+    decorator=swagger_auto_schema(
+        operation_summary="Статистика привычек",
+        manual_parameters=[
+            openapi.Parameter(
+                "owner", openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                description="Только для модератора: id пользователя, без параметра - все пользователи",
+            ),
+        ],
+    ),
+)
+class HabitStatsAPIView(APIView):
+    """
+    Сводная статистика привычек: количество привычек и напоминаний, периодичности, отметки по дням недели
+    и за последние 30 дней, распределение серий. Пользователь видит свою статистику,
+    модератор и суперпользователь - статистику любого пользователя или всех пользователей.
+    """
+
+    def get(self, request):
+        user = request.user
+        if not user.is_authenticated:
+            raise PermissionDenied("Требуется авторизация.")
+
+        if not (user.is_staff or user.is_superuser):
+            return Response(get_user_stats(user))
+
+        owner = request.query_params.get("owner")
+        if owner is None:
+            return Response(get_user_stats())
+        if not owner.isdigit():
+            raise ValidationError({"owner": "Укажите id пользователя."})
+        return Response(get_user_stats(int(owner)))
+
+
+@method_decorator(
+    name="get",
+    decorator=swagger_auto_schema(
+        operation_summary="История выполнений привычки",
+        query_serializer=HabitHistoryQuerySerializer(),
+    ),
+)
+class HabitHistoryAPIView(HabitViewAccessMixin, RetrieveAPIView):
+    """
+    Дни выполнения привычки за период, их количество, серия, заканчивающаяся последним днем периода,
+    и самая длинная серия за период. Доступ - как к просмотру привычки.
+    История читается из битов по годам одним запросом: одна строка на год.
+    """
+
+    queryset = Habit.objects.all()
+    serializer_class = HabitHistorySerializer
+
+    def retrieve(self, request, *args, **kwargs):
+        habit = self.get_object()
+        query = HabitHistoryQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        start, end = query.validated_data["start"], query.validated_data["end"]
+
+        history = load_history(habit, start, end)
+        serializer = self.get_serializer({
+            "done": history.count(start, end),
+            "streak": history.get_streak(end),
+            "longest_streak": history.get_longest_streak(start, end),
+            "days": list(history.get_days(start, end)),
+        })
+        return Response(serializer.data)
+
+
+class HabitBulkAPIView(APIView):
+    """ Общая часть массовых операций: авторизация и ошибки проверки по номерам привычек в пачке. """
+
+    def check_permissions(self, request):
+        super().check_permissions(request)
+        if not request.user.is_authenticated:
+            raise PermissionDenied("Требуется авторизация.")
+
+    def handle_exception(self, exc):
+        if isinstance(exc, BulkValidationError):
+            return Response({"errors": exc.errors}, status=400)
+        return super().handle_exception(exc)
+
+
+@method_decorator(
+    name="post",
+    decorator=swagger_auto_schema(
+        operation_summary="Массовое создание привычек",
+        request_body=HabitSerializer(many=True),
+        responses={201: HabitSerializer(many=True)},
+    ),
+)
+class HabitBulkCreateAPIView(HabitBulkAPIView):
+    """
+    Создание списка привычек одним запросом, до 100 привычек. Требуется авторизация.
+    Связанную привычку можно указать номером привычки в этом же списке: поле associated_index.
+    Если хотя бы одна привычка содержит ошибки, ни одна не создается.
+    """
+
+    def post(self, request):
+        habits = create_habits(request.user, request.data)
+        return Response(HabitSerializer(habits, many=True).data, status=201)
+
+
+@method_decorator(
+    name="patch",
+    decorator=swagger_auto_schema(
+        operation_summary="Массовое редактирование привычек",
+        request_body=HabitSerializer(many=True),
+        responses={200: HabitSerializer(many=True)},
+    ),
+)
+class HabitBulkUpdateAPIView(HabitBulkAPIView):
+    """
+    Частичное редактирование списка своих привычек одним запросом, каждая привычка указывается по id.
+    Если хотя бы одна привычка содержит ошибки, ни одна не изменяется.
+    """
+
+    def patch(self, request):
+        habits = update_habits(request.user, request.data)
+        return Response(HabitSerializer(habits, many=True).data)
+
+
+@method_decorator(
+    name="post",
+    decorator=swagger_auto_schema(
+        operation_summary="Массовая деактивация привычек",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                "ids": openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_INTEGER)),
+            },
+        ),
+    ),
+)
+class HabitBulkDeactivateAPIView(HabitBulkAPIView):
+    """ Деактивация списка своих привычек одним запросом. В ответе - количество деактивированных привычек. """
+
+    def post(self, request):
+        ids = request.data.get("ids") if isinstance(request.data, dict) else None
+        if not isinstance(ids, list) or not all(
+            isinstance(habit_id, int) and not isinstance(habit_id, bool) for habit_id in ids
+        ):
+            raise ValidationError({"ids": "Ожидается список id привычек."})
+        return Response({"deactivated": deactivate_habits(request.user, ids)})
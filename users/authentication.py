@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+def get_user_key(user_id):
+    return f"auth_user:{user_id}"
+
+
+def invalidate_user(user_id):
+    """ Сброс закешированного пользователя после изменения или удаления. """
+    cache.delete(get_user_key(user_id))
+
+
+def invalidate_users(user_ids):
+    """ Сброс закешированных пользователей после массового изменения без сигналов. """
+    cache.delete_many([get_user_key(user_id) for user_id in user_ids])
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    Авторизация по JWT без запроса пользователя к БД на каждый запрос к API: пользователь, найденный по токену,
+    кешируется на AUTH_USER_CACHE_TIMEOUT секунд. При изменении или удалении пользователя кеш сбрасывается
+    сигналами, а при массовом изменении через User.objects.update - самим queryset, поэтому заблокированный
+    или удаленный пользователь теряет доступ сразу.
+    Для async-представлений есть асинхронный вариант aauthenticate.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+
+        key = get_user_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(validated_token)
+            cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+            return user
+
+        self.check_revoked(validated_token, user)
+        return user
+
+    def check_revoked(self, validated_token, user):
+        # Отзыв токена при смене пароля проверяется для каждого токена
+        if api_settings.CHECK_REVOKE_TOKEN and (
+            validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password)
+        ):
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+    async def aauthenticate(self, request):
+        """ Авторизация Django-запроса в async-представлении: (пользователь, токен) или None без токена. """
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        """ Пользователь по токену из кеша или из БД через асинхронный ORM, с теми же проверками, что get_user. """
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+
+        key = get_user_key(user_id)
+        user = await cache.aget(key)
+        if user is None:
+            try:
+                user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+                raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+            await cache.aset(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+
+        self.check_revoked(validated_token, user)
+        return user
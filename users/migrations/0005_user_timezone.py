@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:44
+
+import timezone_field.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0004_remove_user_telegram_id_user_telegram_chat_id"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="timezone",
+            field=timezone_field.fields.TimeZoneField(
+                blank=True,
+                help_text="Укажите часовой пояс, например Asia/Yekaterinburg. По умолчанию - часовой пояс Москвы",
+                null=True,
+                verbose_name="Часовой пояс",
+            ),
+        ),
+    ]
@@ -1,5 +1,24 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager as BaseUserManager
 from django.db import models
+from timezone_field import TimeZoneField
+
+from users.authentication import invalidate_users
+
+
+class UserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """
+        Массовое изменение пользователей. Сигналы при этом не отправляются, поэтому измененные пользователи
+        сбрасываются в кеше авторизации здесь: заблокированный через update пользователь теряет доступ сразу.
+        """
+        user_ids = list(self.values_list("pk", flat=True))
+        updated = super().update(**kwargs)
+        invalidate_users(user_ids)
+        return updated
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
+    pass
 
 
 class User(AbstractUser):
@@ -30,6 +49,12 @@ class User(AbstractUser):
         verbose_name="Аватар",
         help_text="Загрузите аватар",
     )
+    timezone = TimeZoneField(
+        null=True,
+        blank=True,
+        verbose_name="Часовой пояс",
+        help_text="Укажите часовой пояс, например Asia/Yekaterinburg. По умолчанию - часовой пояс Москвы",
+    )
     telegram_chat_id = models.CharField(
         max_length=50,
         unique=True,
@@ -42,6 +67,8 @@ class User(AbstractUser):
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = []
 
+    objects = UserManager()
+
     def __str__(self):
         return f"{self.email}"
 
@@ -1,5 +1,6 @@
 from rest_framework.serializers import ModelSerializer
 from rest_framework.validators import UniqueValidator
+from timezone_field.rest_framework import TimeZoneSerializerField
 from .models import User
 from rest_framework import serializers
 
@@ -8,7 +9,7 @@ class UserSerializer(ModelSerializer):
 
     class Meta:
         model = User
-        fields = "__all__"
+        exclude = ("password",)
 
 
 class UserCreateSerializer(ModelSerializer):
@@ -20,9 +21,11 @@ class UserCreateSerializer(ModelSerializer):
     class Meta:
         model = User
         fields = "__all__"
+        extra_kwargs = {"password": {"write_only": True}}
 
 
 class UserDetailSerializer(ModelSerializer):
+    timezone = TimeZoneSerializerField(required=False, allow_null=True)
 
     class Meta:
         model = User
@@ -34,5 +37,11 @@ class UserDetailSerializer(ModelSerializer):
             "phone",
             "city",
             "avatar",
+            "timezone",
             "telegram_chat_id",
         ]
+
+
+class TelegramLinkSerializer(serializers.Serializer):
+    token = serializers.CharField(read_only=True)
+    command = serializers.CharField(read_only=True)
@@ -1,9 +1,13 @@
 from datetime import datetime
 
+from django.core.cache import cache
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
 
+from habits.bot import get_linked_user_id
+from habits.fixtures import QueryBudgetMixin
 from habits.models import Habit
 from users.models import User
 
@@ -117,6 +121,7 @@ class UserTestCase(APITestCase):
                 'phone': None,
                 'city': 'Москва',
                 'avatar': None,
+                'timezone': None,
                 'telegram_chat_id': None
             },
         )
@@ -150,3 +155,130 @@ class UserTestCase(APITestCase):
         response = self.client.delete(url)
 
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class UserQueryBudgetTestCase(QueryBudgetMixin, APITestCase):
+    query_budgets = {
+        "users:user-list": 3,
+        "users:user-create": 6,
+        "users:user-detail": 1,
+        "users:user-update": 2,
+        "users:user-delete": 9,
+    }
+
+    def setUp(self):
+        self.user = User.objects.create(email="admin@mail.ru", is_superuser=True)
+        User.objects.bulk_create(User(email=f"user_{i}@mail.ru") for i in range(5))
+        Habit.objects.create(action="Полить цветы", owner=self.user)
+        self.client.force_authenticate(user=self.user)
+
+    def test_user_budgets(self):
+        """Тестирование бюджета запросов эндпоинтов пользователей."""
+        with self.assertQueryBudget("users:user-list"):
+            self.client.get(reverse("users:user-list"))
+        with self.assertQueryBudget("users:user-create"):
+            response = self.client.post(reverse("users:user-create"), {"email": "new@mail.ru", "password": "111111"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        requests = (
+            ("users:user-detail", self.client.get, {}),
+            ("users:user-update", self.client.patch, {"city": "Москва"}),
+            ("users:user-delete", self.client.delete, {}),
+        )
+        for url_name, method, data in requests:
+            with self.assertQueryBudget(url_name):
+                response = method(reverse(url_name, args=(self.user.pk,)), data)
+            self.assertLess(response.status_code, 300)
+
+
+class UserSparseFieldsTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(email="admin@mail.ru", is_superuser=True, password="hash")
+        self.client.force_authenticate(user=self.user)
+
+    def test_user_list_without_password(self):
+        """Тестирование, что список пользователей не содержит хеш пароля."""
+        response = self.client.get(reverse("users:user-list"))
+
+        self.assertNotIn("password", response.json()[0])
+
+    def test_user_list_fields(self):
+        """Тестирование выбора полей: без полей групп и прав их предзагрузка не выполняется."""
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("users:user-list"), {"fields": "id,email"})
+
+        self.assertEqual(response.json(), [{"id": self.user.pk, "email": "admin@mail.ru"}])
+
+    def test_user_detail_exclude(self):
+        """Тестирование исключения полей из профиля."""
+        response = self.client.get(reverse("users:user-detail", args=(self.user.pk,)), {"exclude": "phone,avatar"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            set(response.json()),
+            {"id", "email", "first_name", "last_name", "city", "timezone", "telegram_chat_id"},
+        )
+
+
+class CachedJWTAuthenticationTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="jwt@mail.ru")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+        self.url = reverse("users:user-detail", args=(self.user.pk,))
+
+    def test_user_cached(self):
+        """Тестирование, что пользователь по токену загружается из БД только при первом запросе."""
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_cache_invalidated(self):
+        """Тестирование сброса кеша при изменении и удалении пользователя."""
+        self.client.get(self.url)
+
+        self.client.patch(reverse("users:user-update", args=(self.user.pk,)), {"city": "Москва"})
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        User.objects.filter(pk=self.user.pk).update(is_active=True)
+        self.client.get(self.url)
+        self.client.delete(reverse("users:user-delete", args=(self.user.pk,)))
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cache_invalidated_by_update(self):
+        """Тестирование сброса кеша при массовом изменении пользователей без сигналов."""
+        self.client.get(self.url)
+
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class TelegramLinkTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(email="telegram@mail.ru")
+        self.url = reverse("users:telegram-link")
+
+    def test_link_token(self):
+        """Тестирование получения кода привязки чата Telegram."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(get_linked_user_id(response.json()["token"]), self.user.pk)
+        self.assertEqual(response.json()["command"], f"/start {response.json()['token']}")
+        self.assertIsNone(get_linked_user_id(response.json()["token"] + "x"))
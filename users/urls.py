@@ -7,6 +7,7 @@ from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from users.apps import UsersConfig
 
 from .views import (
+    TelegramLinkAPIView,
     UserCreateAPIView,
     UserDestroyAPIView,
     UserListAPIView,
@@ -41,6 +42,7 @@ urlpatterns = [
     path("<int:pk>/", UserRetrieveAPIView.as_view(), name="user-detail"),
     path("<int:pk>/update/", UserUpdateAPIView.as_view(), name="user-update"),
     path("<int:pk>/delete/", UserDestroyAPIView.as_view(), name="user-delete"),
+    path("telegram/link/", TelegramLinkAPIView.as_view(), name="telegram-link"),
     path(
         "token/",
         TokenObtainPairView.as_view(permission_classes=(AllowAny,)),
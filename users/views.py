@@ -1,3 +1,4 @@
+from django.contrib.auth.hashers import make_password
 from django.utils.decorators import method_decorator
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
@@ -5,13 +6,20 @@ from rest_framework.exceptions import PermissionDenied
 from rest_framework.generics import (
     CreateAPIView,
     DestroyAPIView,
+    GenericAPIView,
     ListAPIView,
     RetrieveAPIView,
     UpdateAPIView,
 )
 from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+
+from config.projection import SparseFieldsMixin
+from habits.bot import get_link_token
+from habits.models import Habit
+from habits.services import reschedule_owner_habits, unschedule_habits
 from .models import User
-from .serializers import UserDetailSerializer, UserSerializer, UserCreateSerializer
+from .serializers import TelegramLinkSerializer, UserDetailSerializer, UserSerializer, UserCreateSerializer
 
 
 @method_decorator(
@@ -27,9 +35,8 @@ class UserCreateAPIView(CreateAPIView):
     permission_classes = (AllowAny,)
 
     def perform_create(self, serializer):
-        user = serializer.save(is_active=True)
-        user.set_password(user.password)
-        user.save()
+        # Пароль хешируется до сохранения, пользователь записывается одним запросом
+        serializer.save(is_active=True, password=make_password(serializer.validated_data["password"]))
 
 
 @method_decorator(
@@ -37,12 +44,12 @@ class UserCreateAPIView(CreateAPIView):
     decorator=swagger_auto_schema(
         operation_summary="Список пользователей",
         operation_description="Вывод списка авторизованных пользователей. Требуется авторизация. Для просмотра доступны "
-        "поля: email, имя, город, аватар.",
+        "поля: email, имя, город, аватар. Параметрами fields и exclude можно выбрать поля ответа.",
         responses={200: UserSerializer(many=True)},
     ),
 )
-class UserListAPIView(ListAPIView):
-    queryset = User.objects.all()
+class UserListAPIView(SparseFieldsMixin, ListAPIView):
+    queryset = User.objects.prefetch_related("groups", "user_permissions")
 
     def get_serializer_class(self):
         user = self.request.user
@@ -58,7 +65,8 @@ class UserListAPIView(ListAPIView):
         operation_summary="Просмотр профиля",
         operation_description="Просмотр профиля пользователя. Требуется авторизация. Для владельца профиля и администратора"
         " для просмотра доступны поля: email, имя, фамилия, телефон, город, аватар, история платежей."
-        " Для других пользователей на просмотр доступны поля: email, имя, город, аватар.",
+        " Для других пользователей на просмотр доступны поля: email, имя, город, аватар."
+        " Параметрами fields и exclude можно выбрать поля ответа.",
         responses={
             200: openapi.Response(
                 description="Успешный ответ",
@@ -77,16 +85,17 @@ class UserListAPIView(ListAPIView):
         },
     ),
 )
-class UserRetrieveAPIView(RetrieveAPIView):
+class UserRetrieveAPIView(SparseFieldsMixin, RetrieveAPIView):
     queryset = User.objects.all()
     serializer_class = UserDetailSerializer
 
-    def get_serializer_class(self):
+    def get_object(self):
+        # Права проверяются на загруженном профиле, чтобы не загружать его повторно
+        requested_user = super().get_object()
         user = self.request.user
-        requested_user = self.get_object()
 
         if user.is_staff or user.is_superuser or user.id == requested_user.id:
-            return UserDetailSerializer
+            return requested_user
         raise PermissionDenied("Нет прав для просмотра информации о пользователе.")
 
 
@@ -96,7 +105,8 @@ class UserRetrieveAPIView(RetrieveAPIView):
         operation_summary="Редактирование профиля",
         operation_description="Редактирование полей профиля пользователя. Требуется авторизация. Для владельца профиля и "
         "администратора для редактирования доступны поля: email, имя, фамилия, телефон, город, "
-        "аватар, история платежей.",
+        "аватар, часовой пояс, история платежей. После смены часового пояса "
+        "напоминания о привычках приходят по новому местному времени.",
         responses={200: UserDetailSerializer(many=True)},
     ),
 )
@@ -106,21 +116,30 @@ class UserRetrieveAPIView(RetrieveAPIView):
         operation_summary="Частичное редактирование профиля",
         operation_description="Обновление отдельных полей профиля пользователя. Требуется авторизация. Для владельца "
         "профиля и администратора для обновления доступны поля: email, имя, фамилия, телефон, город, "
-        "аватар, история платежей.",
+        "аватар, часовой пояс, история платежей. После смены часового пояса "
+        "напоминания о привычках приходят по новому местному времени.",
         responses={200: UserDetailSerializer(many=True)},
     ),
 )
 class UserUpdateAPIView(UpdateAPIView):
     queryset = User.objects.all()
+    serializer_class = UserDetailSerializer
 
-    def get_serializer_class(self):
+    def get_object(self):
+        requested_user = super().get_object()
         user = self.request.user
-        requested_user = self.get_object()
 
         if user.is_staff or user.is_superuser or user.id == requested_user.id:
-            return UserDetailSerializer
+            return requested_user
         raise PermissionDenied("Нет прав для редактирования информации.")
 
+    def perform_update(self, serializer):
+        timezone = serializer.instance.timezone
+        user = serializer.save()
+        # Напоминания приходят по местному времени, после смены часового пояса они пересчитываются
+        if user.timezone != timezone:
+            reschedule_owner_habits(user)
+
 
 @method_decorator(
     name="delete",
@@ -138,3 +157,24 @@ class UserDestroyAPIView(DestroyAPIView):
         if user.is_superuser:
             return self.queryset
         return self.queryset.filter(pk=user.pk)
+
+    def perform_destroy(self, instance):
+        # Привычки остаются без владельца, напоминания о них отправлять некому
+        unschedule_habits(Habit.objects.filter(owner=instance))
+        instance.delete()
+
+
+@method_decorator(
+    name="get",
+    decorator=swagger_auto_schema(
+        operation_summary="Код привязки Telegram",
+        operation_description="Код для привязки чата Telegram к профилю текущего пользователя: команду command нужно "
+        "отправить боту. Код действует сутки. Команда /stop в боте отвязывает чат. Требуется авторизация.",
+    ),
+)
+class TelegramLinkAPIView(GenericAPIView):
+    serializer_class = TelegramLinkSerializer
+
+    def get(self, request):
+        token = get_link_token(request.user)
+        return Response(self.get_serializer({"token": token, "command": f"/start {token}"}).data)